@@ -0,0 +1,220 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from pipeline import DIAS_SEMANA, FAIXAS_ETARIAS, OUTRAS_ORIGENS
+
+# ==========================================
+# MOTOR DE AGREGAÇÃO (PASSADA ÚNICA)
+# ==========================================
+# Todos os números do painel saem de uma passada sobre as células filtradas do
+# cubo: cada série é um np.bincount sobre códigos inteiros ponderado pela medida.
+# O resultado é pequeno e independente do tamanho do dataset, então serve aos
+# gráficos, à exportação e a uma futura API.
+
+TOP_CIDADES = 10
+TOP_ESTRANGEIROS = 5
+
+# Resolução da curva de densidade dos tamanhos de grupo (pontos no intervalo observado)
+PONTOS_KDE = 200
+
+# Balde da série temporal conforme a extensão do período:
+# (rótulo, regra do resample, janela da média móvel, descrição da janela, extensão máxima em dias)
+GRANULARIDADES = (
+    ('Diária', None, '7D', '7 dias', 120),
+    ('Semanal', 'W-MON', 4, '4 semanas', 730),
+    ('Mensal', 'MS', 3, '3 meses', None),
+)
+
+@dataclass(frozen=True)
+class Tendencia:
+    granularidade: str
+    janela: str
+    serie: pd.Series             # visitantes por balde (dia, semana ou mês)
+    media_movel: pd.Series
+
+@dataclass(frozen=True)
+class Agregados:
+    total_visitantes: int
+    total_adultos: int
+    total_criancas: int
+    total_estrangeiros: int
+    tipologia: pd.Series         # adultos por Tipo_Grupo, decrescente
+    diario: pd.Series            # visitantes por Data
+    tendencia: Tendencia         # série diária reagrupada para o período selecionado
+    media_dia_semana: pd.Series  # visitantes / dias distintos, por Dia_Semana
+    top_cidades: pd.Series       # adultos por Cidade_Limpa
+    top_estrangeiros: pd.Series  # adultos por país de origem
+    calor: pd.DataFrame          # visitantes Dia_Semana x Hora
+    faixas: pd.Series            # adultos por Faixa_Etaria
+    tamanhos_grupo: pd.Series    # linhas por Total_Visitantes_Linha
+    kde_tamanhos: pd.Series      # densidade suavizada de tamanhos_grupo, na escala de contagem
+    visitantes_unicos: Optional[int] = None  # telefones distintos (estimativa); None se o motor não responde a estes filtros
+    erro_origens: int = 0        # top_cidades/top_estrangeiros podem estar até este valor abaixo do real
+    idade_mediana: Optional[float] = None    # percentis de Idade (registros com idade); None como visitantes_unicos
+    idade_p90: Optional[float] = None
+
+    @property
+    def vazio(self):
+        return self.total_adultos == 0
+
+@dataclass(frozen=True)
+class Contagens:
+    # Vetores de contagem por dimensão: tudo o que os Agregados precisam. Saem de
+    # bincounts sobre as células do cubo (contar) ou direto de um motor SQL.
+    dia0: np.datetime64
+    visitantes_dia: np.ndarray               # por dia, a partir de dia0
+    adultos_dia: np.ndarray
+    calor: np.ndarray                        # visitantes, 7 x 24 (Dia_Semana x Hora)
+    adultos_hora: np.ndarray                 # 24
+    grupos: pd.Index
+    adultos_grupo: np.ndarray
+    cidades: pd.Index
+    adultos_cidade: np.ndarray
+    adultos_estrangeiros_cidade: np.ndarray
+    adultos_faixa: np.ndarray                # na ordem de FAIXAS_ETARIAS
+    tamanhos: np.ndarray                     # linhas por Total_Visitantes_Linha
+    total_criancas: int
+    total_estrangeiros: int
+
+def _contar(codigos, pesos, n):
+    return np.bincount(codigos, weights=pesos, minlength=n).astype(np.int64)
+
+def _ranking(contagens, categorias, n):
+    ordem = np.argsort(-contagens, kind='stable')[:n]
+    ordem = ordem[contagens[ordem] > 0]
+    return pd.Series(contagens[ordem], index=pd.Index(categorias[ordem], name=categorias.name))
+
+def _tendencia(diario):
+    # Reagrupa a série diária (um ponto por dia, nunca linhas brutas): o custo
+    # depende só do número de dias do período
+    dias = (diario.index[-1] - diario.index[0]).days + 1 if len(diario) else 0
+    for granularidade, regra, janela, descricao, limite in GRANULARIDADES:
+        if limite is None or dias <= limite:
+            break
+    serie = diario if regra is None else diario.resample(regra, label='left', closed='left').sum()
+    return Tendencia(granularidade, descricao, serie, serie.rolling(janela, min_periods=1).mean())
+
+def _kde_contagens(contagens):
+    # KDE gaussiano ponderado (largura de Scott, como o gaussian_kde do seaborn) calculado
+    # por convolução FFT sobre o vetor de contagens. Os valores são inteiros, então a
+    # grade com passo 1/k contém cada observação exatamente e o resultado é o KDE exato
+    # nos pontos da grade; o custo depende só da amplitude dos tamanhos, não das linhas.
+    if len(contagens) < 2:
+        return pd.Series(dtype=float)
+    valores = contagens.index.to_numpy(dtype=float)
+    pesos = contagens.to_numpy(dtype=float)
+    total = pesos.sum()
+    if total < 2:
+        return pd.Series(dtype=float)
+    # Contagens são pesos de frequência: o KDE é o das observações repetidas, então
+    # n é o total de registros (não o n efetivo 1/Σw², que trata cada valor como uma amostra)
+    w = pesos / total
+    media = (w * valores).sum()
+    variancia = (w * (valores - media) ** 2).sum() * total / (total - 1)
+    if variancia <= 0:
+        return pd.Series(dtype=float)
+    banda = np.sqrt(variancia) * total ** (-1 / 5)
+
+    inicio, amplitude = int(valores[0]), int(valores[-1] - valores[0])
+    k = max(1, int(np.ceil(PONTOS_KDE / amplitude)))
+    n = amplitude * k + 1
+    grade = np.zeros(n)
+    grade[(valores.astype(np.int64) - inicio) * k] = w
+    raio = min(int(np.ceil(4 * banda * k)), n - 1)
+    desloc = np.arange(-raio, raio + 1) / k
+    nucleo = np.exp(-0.5 * (desloc / banda) ** 2) / (banda * np.sqrt(2 * np.pi))
+    tamanho_fft = 1 << int(np.ceil(np.log2(n + len(nucleo) - 1)))
+    densidade = np.fft.irfft(np.fft.rfft(grade, tamanho_fft) * np.fft.rfft(nucleo, tamanho_fft), tamanho_fft)[raio:raio + n]
+    # Histograma discreto: bins de largura 1, então contagem = densidade * total
+    x = inicio + np.arange(n) / k
+    return pd.Series(np.clip(densidade, 0, None) * total, index=pd.Index(x, name=contagens.index.name))
+
+def contar(celulas, celulas_grupos=None):
+    visitantes = celulas['Visitantes'].to_numpy()
+    adultos = celulas['Adultos'].to_numpy()
+    estrangeiro = celulas['Estrangeiro'].to_numpy(dtype=bool)
+
+    # Códigos inteiros das dimensões
+    datas = celulas['Data'].to_numpy().astype('datetime64[D]')
+    dia0 = datas.min() if len(datas) else np.datetime64(0, 'D')
+    cod_data = (datas - dia0).astype(np.int64)
+    n_datas = int(cod_data.max()) + 1 if len(cod_data) else 0
+    cod_semana = celulas['Dia_Semana'].cat.codes.to_numpy().astype(np.int64)
+    hora = celulas['Hora'].to_numpy()
+    cidades = celulas['Cidade_Limpa'].cat.categories
+    cod_cidade = celulas['Cidade_Limpa'].cat.codes.to_numpy()
+    grupos = celulas['Tipo_Grupo'].cat.categories
+    cod_grupo = celulas['Tipo_Grupo'].cat.codes.to_numpy()
+    cod_faixa = celulas['Faixa_Etaria'].cat.codes.to_numpy()
+
+    tamanhos = np.zeros(0, dtype=np.int64)
+    if celulas_grupos is not None and len(celulas_grupos):
+        tamanhos = _contar(celulas_grupos['Total_Visitantes_Linha'].to_numpy(), celulas_grupos['Adultos'].to_numpy(), 0)
+
+    return Contagens(
+        dia0=dia0,
+        visitantes_dia=_contar(cod_data, visitantes, n_datas),
+        adultos_dia=_contar(cod_data, adultos, n_datas),
+        calor=_contar(cod_semana * 24 + hora, visitantes, 7 * 24).reshape(7, 24),
+        adultos_hora=_contar(hora, adultos, 24),
+        grupos=grupos,
+        adultos_grupo=_contar(cod_grupo, adultos, len(grupos)),
+        cidades=cidades,
+        adultos_cidade=_contar(cod_cidade, adultos, len(cidades)),
+        adultos_estrangeiros_cidade=_contar(cod_cidade, adultos * estrangeiro, len(cidades)),
+        adultos_faixa=_contar(cod_faixa, adultos, len(FAIXAS_ETARIAS)),
+        tamanhos=tamanhos,
+        total_criancas=int(celulas['Criancas'].sum()),
+        total_estrangeiros=int(visitantes[estrangeiro].sum()),
+    )
+
+def montar(c):
+    # Tipologia
+    tipologia = _ranking(c.adultos_grupo, c.grupos.rename('Tipo_Grupo'), len(c.grupos))
+
+    # Série diária e média por dia da semana (visitantes / dias com registro)
+    presentes = np.flatnonzero(c.adultos_dia > 0)
+    diario = pd.Series(c.visitantes_dia[presentes], index=pd.DatetimeIndex(c.dia0 + presentes, name='Data'), name='Visitantes')
+    semana_presentes = ((c.dia0 + presentes).astype(np.int64) + 3) % 7  # 1970-01-01 foi quinta-feira
+    dias_distintos = np.bincount(semana_presentes, minlength=7)
+    por_semana = c.calor.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = np.where(dias_distintos > 0, por_semana / np.maximum(dias_distintos, 1), np.nan)
+    media_dia_semana = pd.Series(media, index=pd.CategoricalIndex(DIAS_SEMANA, categories=DIAS_SEMANA, ordered=True, name='Dia_Semana'))
+
+    # Rankings de origem; a soma das origens raras (cubos com cidades limitadas) não concorre
+    fora = c.cidades == OUTRAS_ORIGENS
+    top_cidades = _ranking(np.where(fora, 0, c.adultos_cidade), c.cidades.rename('Cidade_Limpa'), TOP_CIDADES)
+    top_estrangeiros = _ranking(np.where(fora, 0, c.adultos_estrangeiros_cidade), c.cidades.rename('Cidade_Limpa'), TOP_ESTRANGEIROS)
+
+    # Matriz de calor: apenas as horas com registro, como no pivot_table
+    horas = np.flatnonzero(c.adultos_hora > 0)
+    calor = pd.DataFrame(c.calor[:, horas], index=pd.Index(DIAS_SEMANA, name='Dia_Semana'), columns=pd.Index(horas, name='Hora'))
+
+    faixas = pd.Series(c.adultos_faixa, index=pd.Index(FAIXAS_ETARIAS, name='Faixa_Etaria'))
+
+    tamanhos = np.flatnonzero(c.tamanhos)
+    tamanhos_grupo = pd.Series(c.tamanhos[tamanhos], index=pd.Index(tamanhos, name='Total_Visitantes_Linha'))
+
+    return Agregados(
+        total_visitantes=int(c.visitantes_dia.sum()),
+        total_adultos=int(c.adultos_dia.sum()),
+        total_criancas=c.total_criancas,
+        total_estrangeiros=c.total_estrangeiros,
+        tipologia=tipologia,
+        diario=diario,
+        tendencia=_tendencia(diario),
+        media_dia_semana=media_dia_semana,
+        top_cidades=top_cidades,
+        top_estrangeiros=top_estrangeiros,
+        calor=calor,
+        faixas=faixas,
+        tamanhos_grupo=tamanhos_grupo,
+        kde_tamanhos=_kde_contagens(tamanhos_grupo),
+    )
+
+def agregar(celulas, celulas_grupos=None):
+    return montar(contar(celulas, celulas_grupos))
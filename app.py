@@ -1,12 +1,16 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
-import re
-import unicodedata
-from rapidfuzz import process, utils
-from functools import lru_cache
+import graficos
+import graficos_interativos
+from armazem import obter_indice
+from fidelidade import INDICE
+from filtros import Filtros
+from pipeline import OUTRAS_ORIGENS
+from ingestao import abrir_agregados, abrir_dataset, agregar, carregar, versao_arquivos
+from tarefas import CANCELADA, CONCLUIDA, ERRO, submeter
+from consultas import abrir_consultas
+from cache_graficos import chave_grafico
+from exportacao import FORMATOS, exportar
+from renderizacao import PAINEIS_ESTRATEGICOS, renderizar_paineis
 
 # ==========================================
 # CONFIGURAÇÃO E ESTILO (UI UX PRO MAX - DARK MODE)
@@ -96,16 +100,14 @@ st.markdown("""
         color: #F9FAFB;
     }
 
-    /* Tabs Styling - Dark */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 2rem;
-        background-color: transparent;
+    /* Seções (segmented control) - Dark */
+    div[data-testid="stButtonGroup"] {
         padding-bottom: 0.5rem;
         border-bottom: 1px solid #30363D;
+        margin-bottom: 1rem;
     }
 
-    .stTabs [data-baseweb="tab"] {
-        height: 3.5rem;
+    div[data-testid="stButtonGroup"] button {
         background-color: transparent;
         color: #9CA3AF;
         font-weight: 500;
@@ -114,7 +116,7 @@ st.markdown("""
         transition: color 0.2s;
     }
 
-    .stTabs [aria-selected="true"] {
+    div[data-testid="stButtonGroup"] button[kind="segmented_controlActive"] {
         color: #EAB308 !important;
         border-bottom: 3px solid #EAB308 !important;
         font-weight: 700;
@@ -177,109 +179,6 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
-# ==========================================
-# LISTA DE REFERÊNCIA (MT + CAPITAIS)
-# ==========================================
-CIDADES_REFERENCIA = [
-    "Cuiabá", "Várzea Grande", "Rondonópolis", "Sinop", "Sorriso", "Tangará da Serra", 
-    "Cáceres", "Primavera do Leste", "Lucas do Rio Verde", "Barra do Garças", 
-    "Alta Floresta", "Pontes e Lacerda", "Juína", "Guarantã do Norte", "Poconé", 
-    "Nova Mutum", "Campo Novo do Parecis", "Barra do Bugres", "Colniza", "Vila Rica", 
-    "Peixoto de Azevedo", "Água Boa", "Juara", "Colíder", "Diamantino", "Canarana", 
-    "Campo Verde", "Aripuanã", "Nova Xavantina", "Sapezal", "Poxoréu", "Jaciara", 
-    "Brasnorte", "Paranatinga", "Pedra Preta", "Guiratinga", "Nova Bandeirantes", 
-    "São José do Rio Claro", "Araputanga", "Matupá", "Nobres", "Alto Araguaia", 
-    "Vila Bela da Santíssima Trindade", "Campinápolis", "Juruena", "Porto Alegre do Norte", 
-    "Cláudia", "Comodoro", "Vera", "Denise", "Rosário Oeste", "Nossa Senhora do Livramento",
-    "São Paulo", "Rio de Janeiro", "Brasília", "Salvador", "Fortaleza", "Belo Horizonte", 
-    "Manaus", "Curitiba", "Recife", "Porto Alegre", "Belém", "Goiânia", "Guarulhos", 
-    "Campinas", "São Luís", "Maceió", "Duque de Caxias", "Campo Grande", "Natal", 
-    "Teresina", "São Bernardo do Campo", "João Pessoa", "Osasco", "Santo André", 
-    "Jaboatão dos Guararapes", "Uberlândia", "Contagem", "Sorocaba", "Ribeirão Preto", 
-    "Aracaju", "Feira de Santana", "Joinville", "Aparecida de Goiânia", 
-    "Londrina", "Ananindeua", "Porto Velho", "Serra", "Niterói", "Belford Roxo", 
-    "Caxias do Sul", "Campos dos Goytacazes", "Macapá", "Florianópolis", "Boa Vista",
-    "Rio Branco", "Vitória", "Palmas"
-]
-
-# ==========================================
-# PIPELINE DE SANITIZAÇÃO
-# ==========================================
-
-@lru_cache(maxsize=1000)
-def fuzzy_match_cidade(nome_sujo):
-    if not nome_sujo: return ""
-    result = process.extractOne(nome_sujo, CIDADES_REFERENCIA, processor=utils.default_process)
-    if result and result[1] >= 80:
-        return result[0]
-    return nome_sujo.title()
-
-def remover_acentos(texto):
-    if pd.isna(texto): return ""
-    texto = str(texto).lower().strip()
-    return ''.join(c for c in unicodedata.normalize('NFKD', texto) 
-                  if unicodedata.category(c) != 'Mn')
-
-def sanitizar_pipeline(cidade_origem):
-    if pd.isna(cidade_origem): return "Não Informado", False
-    
-    texto_raw = str(cidade_origem).strip()
-    texto_lower = texto_raw.lower()
-    
-    # STAGE 1: TRADUTOR DE ESTRANGEIROS
-    mapeamento_estrangeiro = {
-        r'\b(usa|eua|united states|texas|florida|miami|new york|orlando)\b': "Estados Unidos",
-        r'\b(france|franca|paris)\b': "França",
-        r'\b(belgium|belgica|brussels|bruxelas)\b': "Bélgica",
-        r'\b(czech|tcheca|prague)\b': "República Tcheca",
-        r'\b(argentina|buenos aires|cordoba|rosario)\b': "Argentina",
-        r'\b(bolivia|la paz|santa cruz|sucre)\b': "Bolívia",
-        r'\b(paraguay|paraguai|asuncion|assuncao)\b': "Paraguai",
-        r'\b(chile|santiago|valparaiso)\b': "Chile",
-        r'\b(uruguay|uruguai|montevideo|punta del este)\b': "Uruguai",
-        r'\b(colombia|bogota|medellin|cartagena)\b': "Colômbia",
-        r'\b(peru|lima|cusco|machu picchu)\b': "Peru",
-        r'\b(venezuela|caracas|maracaibo)\b': "Venezuela",
-        r'\b(ecuador|equador|quito|guayaquil)\b': "Equador",
-        r'\b(mexico|cancun|mexico city)\b': "México",
-        r'\b(portugal|lisboa|porto)\b': "Portugal",
-        r'\b(spain|espanha|madrid|barcelona)\b': "Espanha",
-        r'\b(italy|italia|rome|roma|milano)\b': "Itália",
-        r'\b(germany|alemanha|berlin|munich)\b': "Alemanha",
-        r'\b(japan|japao|tokyo|toquio)\b': "Japão",
-        r'\b(china|beijing|shanghai)\b': "China",
-        r'\b(uk|reino unido|london|londres|england|inglaterra)\b': "Reino Unido"
-    }
-    
-    for regex, pais in mapeamento_estrangeiro.items():
-        if re.search(regex, texto_lower):
-            return pais, True
-            
-    # STAGE 2: REGEX VASSOURA & LIMPEZA DE PONTUAÇÃO
-    c_limpa = texto_raw
-    regex_ufs = r'\b(AC|AL|AP|AM|BA|CE|DF|ES|GO|MA|MT|MS|MG|PA|PB|PR|PE|PI|RJ|RN|RS|RO|RR|SC|SP|SE|TO)\b'
-    c_limpa = re.sub(regex_ufs, ' ', c_limpa, flags=re.IGNORECASE)
-    regex_lixo = r'\b(brasil|mato grosso|cidade|estado|municipio)\b'
-    c_limpa = re.sub(regex_lixo, ' ', c_limpa, flags=re.IGNORECASE)
-    c_limpa = re.sub(r'[^a-zA-ZÀ-ÿ\s]', ' ', c_limpa)
-    c_limpa = re.sub(r'\s+', ' ', c_limpa).strip()
-    
-    if not c_limpa or len(c_limpa) < 2:
-        return "Não Informado", False
-
-    c_temp_norm = remover_acentos(c_limpa)
-    siglas = {
-        r'\bcba\b': "Cuiabá", r'\bvg\b': "Várzea Grande", r'\bsp\b': "São Paulo", r'\bbh\b': "Belo Horizonte",
-        r'\brj\b': "Rio de Janeiro", r'\bcgr\b': "Campo Grande", r'\bcur\b': "Curitiba", r'\bgyn\b': "Goiânia"
-    }
-    
-    for sigla_re, nome_oficial in siglas.items():
-        if re.search(sigla_re, c_temp_norm):
-            return nome_oficial, False
-
-    # STAGE 3: FUZZY MATCHING
-    return fuzzy_match_cidade(c_limpa), False
-
 # ==========================================
 # UPLOAD E CARREGAMENTO
 # ==========================================
@@ -289,207 +188,213 @@ uploaded_files = st.sidebar.file_uploader(
     accept_multiple_files=True,
     help="Carregue as planilhas para iniciar o processamento."
 )
+so_agregados = st.sidebar.toggle(
+    "🗄️ Só Agregados",
+    help="Para históricos maiores que a memória: lê as planilhas em blocos e guarda só os totais agregados. O painel fica completo; a exportação traz só as tabelas agregadas.",
+)
 
-if uploaded_files:
-    dataframes = []
-    
-    for f in uploaded_files:
-        try:
-            if f.name.endswith('.csv'):
-                try: df_cur = pd.read_csv(f)
-                except: df_cur = pd.read_csv(f, encoding='latin1', sep=';')
-            else:
-                df_cur = pd.read_excel(f)
-            
-            if df_cur.shape[1] >= 6:
-                df_cur = df_cur.iloc[:, 0:7]
-                df_cur.columns = ['Data_Hora', 'Nome', 'Cidade_Origem', 'Whatsapp', 'Idade', 'Qtd_Criancas', 'Obs']
-                dataframes.append(df_cur)
-        except Exception as e:
-            st.error(f"Erro no arquivo {f.name}: {e}")
+SECOES = ["📊 Visão Estratégica", "🔍 Análise Tática"]
 
-    if not dataframes:
-        st.stop()
+# Índice de filtros e motor de consultas ficam com o frame no registro compartilhado
+# (registro.py): contam no teto de memória dele e são despejados junto do dataset
+def indice_filtros(versao_dados, dataset):
+    return dataset.derivado('indice', lambda df: obter_indice(versao_dados, df))
 
-    df_raw = pd.concat(dataframes, ignore_index=True)
+def consultas_dataset(versao_dados, dataset):
+    return dataset.derivado('consultas', lambda df: abrir_consultas(df, versao_dados=versao_dados))
 
+@st.fragment
+def painel(versao_dados, dataset, consultas):
+    # Reexecutado sozinho quando um filtro ou a seção muda: CSS, cabeçalho, leitura
+    # do upload e pipeline ficam de fora; só rodam filtragem, agregação e a seção ativa.
+    # dataset é None no modo só agregados (ver parciais.py): tudo sai dos cubos
+    df = None if dataset is None else dataset.df
     try:
-        # PIPELINE DE TRATAMENTO
-        df_raw['Data_Hora'] = pd.to_datetime(df_raw['Data_Hora'], errors='coerce')
-        df = df_raw.dropna(subset=['Data_Hora']).copy()
-        
-        df['Data'] = df['Data_Hora'].dt.date
-        df['Hora'] = df['Data_Hora'].dt.hour.fillna(0).astype(int)
-        
-        mapa_dias = {'Monday': 'Segunda', 'Tuesday': 'Terça', 'Wednesday': 'Quarta', 'Thursday': 'Quinta', 'Friday': 'Sexta', 'Saturday': 'Sábado', 'Sunday': 'Domingo'}
-        df['Dia_Semana'] = df['Data_Hora'].dt.strftime('%A').map(mapa_dias)
-        df['Dia_Semana'] = pd.Categorical(df['Dia_Semana'], categories=list(mapa_dias.values()), ordered=True)
-
-        def process_criancas(val):
-            if pd.isna(val): return 0
-            s = str(val).lower().strip()
-            if any(term in s for term in ["nenhum", "nenhuma", "não", "nao", "zero"]): return 0
-            match = re.search(r'(\d+)', s)
-            return int(match.group(1)) if match else 0
-
-        df['Qtd_Criancas'] = df['Qtd_Criancas'].apply(process_criancas)
-        
-        lim_exc = 40
-        med_cr = df[df['Qtd_Criancas'] <= lim_exc]['Qtd_Criancas'].mean()
-        df.loc[df['Qtd_Criancas'] > lim_exc, 'Qtd_Criancas'] = int(round(med_cr)) if not np.isnan(med_cr) else 0
-
-        def process_idade(val):
-            if pd.isna(val): return np.nan
-            match = re.search(r'(\d+)', str(val))
-            if match:
-                idade = int(match.group(1))
-                return idade if 1 <= idade <= 120 else np.nan
-            return np.nan
-
-        df['Idade'] = df['Idade'].apply(process_idade)
-
-        def definir_faixa_etaria(idade):
-            if pd.isna(idade): return "Não Informado"
-            if idade <= 12: return "Criança (0-12)"
-            elif idade <= 17: return "Adolescente (13-17)"
-            elif idade <= 35: return "Jovem Adulto (18-35)"
-            elif idade <= 59: return "Adulto (36-59)"
-            else: return "Idoso (60+)"
-
-        df['Faixa_Etaria'] = df['Idade'].apply(definir_faixa_etaria)
-        faixas_ordem = ["Criança (0-12)", "Adolescente (13-17)", "Jovem Adulto (18-35)", "Adulto (36-59)", "Idoso (60+)", "Não Informado"]
-        df['Faixa_Etaria'] = pd.Categorical(df['Faixa_Etaria'], categories=faixas_ordem, ordered=True)
-
-        with st.spinner("Processando..."):
-            resultados = df['Cidade_Origem'].apply(sanitizar_pipeline)
-            df['Cidade_Limpa'] = [r[0] for r in resultados]
-            df['Estrangeiro'] = [r[1] for r in resultados]
-
-        df['Total_Visitantes_Linha'] = 1 + df['Qtd_Criancas']
-        df['Tipo_Grupo'] = df['Qtd_Criancas'].apply(lambda x: 'Família/Grupo' if x > 0 else 'Individual/Adultos')
-
         # FILTROS LATERAIS
         st.sidebar.markdown('<div class="sidebar-header">🛠️ Painel de Controle</div>', unsafe_allow_html=True)
-        periodo = st.sidebar.date_input("📅 Período de Análise", [df['Data'].min(), df['Data'].max()])
-        cidades_sel = st.sidebar.multiselect("📍 Origens Específicas", sorted(df['Cidade_Limpa'].unique()))
-        grupos_sel = st.sidebar.multiselect("👥 Tipologia", df['Tipo_Grupo'].unique())
+        if df is not None:
+            indice = indice_filtros(versao_dados, dataset)
+            periodo_total = [df['Data'].iloc[0], df['Data'].iloc[-1]]
+        else:
+            indice = None
+            periodo_total = list(consultas.periodo())
+        periodo = st.sidebar.date_input("📅 Período de Análise", periodo_total)
+        cidades_sel = st.sidebar.multiselect("📍 Origens Específicas", list(consultas.cidades))
+        grupos_sel = st.sidebar.multiselect("👥 Tipologia", list(consultas.grupos))
         gringos_only = st.sidebar.toggle("🌐 Apenas Estrangeiros")
+        interativo = st.sidebar.toggle("🖱️ Gráficos Interativos", help="Desenha os gráficos no navegador a partir das séries agregadas (tooltips, zoom e filtro pela legenda).")
 
-        df_f = df.copy()
-        if len(periodo) == 2:
-            df_f = df_f[(df_f['Data'] >= periodo[0]) & (df_f['Data'] <= periodo[1])]
-        if cidades_sel: df_f = df_f[df_f['Cidade_Limpa'].isin(cidades_sel)]
-        if grupos_sel: df_f = df_f[df_f['Tipo_Grupo'].isin(grupos_sel)]
-        if gringos_only: df_f = df_f[df_f['Estrangeiro']]
+        filtros = Filtros(
+            inicio=periodo[0] if len(periodo) == 2 else None,
+            fim=periodo[1] if len(periodo) == 2 else None,
+            cidades=tuple(sorted(cidades_sel)),
+            grupos=tuple(sorted(grupos_sel)),
+            apenas_estrangeiros=gringos_only,
+        )
 
-        if df_f.empty:
+        # KPIs e gráficos respondidos pelo motor de consultas (cubo pandas ou DuckDB, ver consultas.py)
+        ag = consultas.agregados(filtros)
+
+        if ag.vazio:
             st.warning("⚠️ Sem dados para estes filtros.")
         else:
-            tab1, tab2 = st.tabs(["📊 Visão Estratégica", "🔍 Análise Tática"])
+            # Navegação preguiçosa: só a seção ativa calcula e renderiza seus painéis
+            secao = st.segmented_control("Seção", SECOES, default=SECOES[0], key="secao", label_visibility="collapsed") or SECOES[0]
+
+            if secao == SECOES[0]:
+                paineis = PAINEIS_ESTRATEGICOS
+            else:
+                paineis = [('matriz_calor', graficos.matriz_calor), ('tamanho_grupo', graficos.tamanho_grupo)]
+                if ag.faixas.drop('Não Informado').sum() > 0:
+                    paineis.append(('demografia', graficos.demografia))
+            nomes_paineis = {nome for nome, _ in paineis}
+
+            if interativo:
+                # Só as séries agregadas vão ao navegador; o Vega-Lite desenha no cliente
+                def exibir(nome, alvo=st):
+                    alvo.altair_chart(graficos_interativos.PAINEIS[nome](ag), width='stretch', theme=None)
+            else:
+                # Painéis da seção renderizados de uma vez, em paralelo (servidos do cache quando os filtros se repetem)
+                pngs = renderizar_paineis(
+                    paineis, ag,
+                    lambda nome: chave_grafico(versao_dados, filtros, (graficos.TEMA, graficos.VERSAO_GRAFICOS), nome, df is None),
+                )
+                imagens = dict(zip([nome for nome, _ in paineis], pngs))
+
+                def exibir(nome, alvo=st):
+                    alvo.image(imagens[nome], width='stretch')
 
-            with tab1:
-                t_ge = int(df_f['Total_Visitantes_Linha'].sum())
-                t_ad = len(df_f)
-                t_cr = int(df_f['Qtd_Criancas'].sum())
-                t_est = int(df_f[df_f['Estrangeiro']]['Total_Visitantes_Linha'].sum())
+            if secao == SECOES[0]:
+                t_ge, t_ad, t_cr, t_est = ag.total_visitantes, ag.total_adultos, ag.total_criancas, ag.total_estrangeiros
 
-                c1, c2, c3, c4 = st.columns(4)
+                c1, c2, c3, c4, c5 = st.columns(5)
                 c1.metric("Fluxo Total", f"{t_ge:,}".replace(',','.'))
                 c2.metric("Público Adulto", f"{t_ad:,}".replace(',','.'))
                 c3.metric("Público Infantil", f"{t_cr:,}".replace(',','.'))
                 c4.metric("Internacionais", f"{t_est:,}".replace(',','.'))
+                # Telefones distintos estimados por HyperLogLog (~1% de erro, ver esbocos.py)
+                if ag.visitantes_unicos is None:
+                    c5.metric("Visitantes Únicos", "—", help="Disponível com filtro só de período")
+                else:
+                    c5.metric("Visitantes Únicos", f"≈{ag.visitantes_unicos:,}".replace(',','.'), help="Telefones distintos no período (estimativa, erro ~1%)")
                 
-                # BOTÃO DE EXPORTAÇÃO
-                csv = df_f.to_csv(index=False).encode('utf-8')
-                st.download_button("📥 Exportar Planilha Processada (.CSV)", data=csv, file_name='SIT_Visitantes.csv', mime='text/csv')
-
-                # Gráficos em Dark Mode
-                # Configuração Global de Visualização Dark
-                plt.style.use('dark_background')
-                plt.rcParams['figure.facecolor'] = '#161B22'
-                plt.rcParams['axes.facecolor'] = '#161B22'
-                plt.rcParams['text.color'] = '#F9FAFB'
-                plt.rcParams['axes.labelcolor'] = '#9CA3AF'
-                plt.rcParams['xtick.color'] = '#9CA3AF'
-                plt.rcParams['ytick.color'] = '#9CA3AF'
-                plt.rcParams['grid.color'] = '#30363D'
-                
-                sns.set_theme(style="dark", palette="muted")
-                
-                fig = plt.figure(figsize=(22, 14))
-                plt.subplots_adjust(hspace=0.4, wspace=0.3)
-
-                # 1. Composição
-                plt.subplot(2, 3, 1)
-                plt.pie([t_ad, t_cr], labels=['Adultos', 'Crianças'], autopct='%1.1f%%', colors=['#1D4ED8', '#EAB308'], startangle=90, explode=(0.05, 0))
-                plt.title('Segmentação Etária', fontweight='bold')
-
-                # 2. Perfil
-                plt.subplot(2, 3, 2)
-                df_f['Tipo_Grupo'].value_counts().plot.pie(autopct='%1.1f%%', colors=['#10B981', '#6366F1'], startangle=90)
-                plt.title('Tipologia dos Visitantes', fontweight='bold')
-                plt.ylabel('')
-
-                # 3. Evolução
-                plt.subplot(2, 3, 3)
-                df_f.groupby('Data')['Total_Visitantes_Linha'].sum().plot(marker='o', color='#EAB308', linewidth=2.5)
-                plt.title('Tendência Diária', fontweight='bold')
-                plt.grid(True, alpha=0.1)
-
-                # 4. Médias
-                plt.subplot(2, 3, 4)
-                media_op = df_f.groupby('Dia_Semana')['Total_Visitantes_Linha'].sum() / df_f.groupby('Dia_Semana')['Data'].nunique()
-                sns.barplot(x=media_op.index, y=media_op.values, palette="rocket")
-                plt.title('Média por Dia da Semana', fontweight='bold')
-
-                # 5. Top Cidades
-                plt.subplot(2, 3, 5)
-                top_10 = df_f['Cidade_Limpa'].value_counts().head(10)
-                sns.barplot(x=top_10.values, y=top_10.index, palette="mako")
-                plt.title('Top 10 Municípios de Origem', fontweight='bold')
-
-                # 6. Estrangeiros
-                plt.subplot(2, 3, 6)
-                if t_est > 0:
-                    top_es = df_f[df_f['Estrangeiro']]['Cidade_Limpa'].value_counts().head(5)
-                    sns.barplot(x=top_es.values, y=top_es.index, palette="flare")
-                    plt.title('Origens Internacionais', fontweight='bold')
+                # EXPORTAÇÃO (arquivos gerados só no clique, ver exportacao.py)
+                exp_csv, exp_outros, _ = st.columns([2, 1.3, 3])
+                if df is None:
+                    xlsx = FORMATOS['xlsx']
+                    exp_csv.download_button("📥 Exportar Resumo Agregado (.XLSX)", data=exportar('xlsx', versao_dados, None, None, filtros, ag), file_name='SIT_Resumo.xlsx', mime=xlsx.mime, on_click='ignore')
                 else:
-                    plt.text(0.5, 0.5, "Sem registros internacionais", ha='center', va='center', color='#4B5563')
-                    plt.axis('off')
-
-                st.pyplot(fig)
+                    exp_csv.download_button("📥 Exportar Planilha Processada (.CSV)", data=exportar('csv', versao_dados, df, indice, filtros, ag), file_name='SIT_Visitantes.csv', mime='text/csv', on_click='ignore')
+                    with exp_outros.popover("📦 Outros Formatos"):
+                        for formato, f in FORMATOS.items():
+                            if formato != 'csv':
+                                st.download_button(f"📥 {f.rotulo}", data=exportar(formato, versao_dados, df, indice, filtros, ag), file_name=f'SIT_Visitantes{f.extensao}', mime=f.mime, on_click='ignore')
+                        st.caption("Parquet com colunas tipadas; XLSX com os registros e as tabelas agregadas do painel.")
+
+                # Gráficos em Dark Mode: grade 2 x 3, na ordem dos painéis
+                for linha in (PAINEIS_ESTRATEGICOS[:3], PAINEIS_ESTRATEGICOS[3:]):
+                    for coluna, (nome, _) in zip(st.columns(3), linha):
+                        exibir(nome, coluna)
+                if ag.erro_origens:
+                    st.caption(f"Origens raras somadas em \"{OUTRAS_ORIGENS}\" (modo só agregados): as contagens por município podem estar até {ag.erro_origens:,} registros abaixo do real.".replace(',','.'))
 
-            with tab2:
+            else:
                 st.markdown("### ⏲️ Inteligência Operacional Dark")
+
+                # Índice de visitantes por telefone, acumulado em todas as cargas (ver fidelidade.py):
+                # é global, não segue os arquivos abertos nem os filtros, e o rótulo diz isso
+                fidelidade = INDICE.resumo()
+                if fidelidade is not None:
+                    f1, f2, f3 = st.columns(3)
+                    f1.metric("Visitantes Identificados", f"{fidelidade.visitantes:,}".replace(',','.'), help="Telefones distintos em todas as cargas")
+                    f2.metric("Taxa de Retorno", f"{fidelidade.taxa_retorno:.1%}".replace('.',','), help="Visitantes com mais de um dia de visita")
+                    f3.metric("Visitas por Visitante", f"{fidelidade.visitas_por_visitante:.2f}".replace('.',','), help="Dias distintos com registro por visitante")
+                    st.caption(f"Fidelidade do histórico de todas as cargas já processadas neste servidor ({fidelidade.primeira_visita:%d/%m/%Y} a {fidelidade.ultima_visita:%d/%m/%Y}): não segue os arquivos abertos nem os filtros.")
                 
-                heatmap_data = df_f.pivot_table(index='Dia_Semana', columns='Hora', values='Total_Visitantes_Linha', aggfunc='sum', fill_value=0)
-                heatmap_data = heatmap_data.reindex(list(mapa_dias.values()), fill_value=0)
-                
-                fig7, ax7 = plt.subplots(figsize=(20, 6))
-                # Heatmap Dark Mode: Magma ou Inferno scale funciona melhor no escuro
-                sns.heatmap(heatmap_data, cmap="inferno", annot=True, fmt='g', linewidths=.5, ax=ax7)
-                plt.title('Matriz de Calor Operacional', fontweight='bold')
-                st.pyplot(fig7)
+                exibir('matriz_calor')
                 
                 st.markdown("---")
                 
                 cola, colb = st.columns(2)
                 with cola:
-                    df_idade = df_f[df_f['Faixa_Etaria'] != 'Não Informado'] 
-                    if not df_idade.empty:
-                        fig8, ax8 = plt.subplots(figsize=(10, 6))
-                        sns.countplot(y='Faixa_Etaria', data=df_idade, palette="viridis", ax=ax8)
-                        for container in ax8.containers: ax8.bar_label(container, padding=5)
-                        plt.title('Demografia Detalhada', fontweight='bold')
-                        st.pyplot(fig8)
+                    # Percentis dos esboços diários de idade (ver esbocos.py); só com filtro de período
+                    if ag.idade_mediana is not None:
+                        m1, m2 = st.columns(2)
+                        m1.metric("Idade Mediana", f"{ag.idade_mediana:.0f} anos")
+                        m2.metric("Idade P90", f"{ag.idade_p90:.0f} anos", help="90% dos visitantes com idade informada têm até esta idade")
+                    if 'demografia' in nomes_paineis:
+                        exibir('demografia')
                 with colb:
-                    fig9, ax9 = plt.subplots(figsize=(10, 6))
-                    sns.histplot(data=df_f, x='Total_Visitantes_Linha', discrete=True, color="#1D4ED8", kde=True, ax=ax9, alpha=0.6)
-                    plt.title('Distribuição de Tamanho de Grupo', fontweight='bold')
-                    st.pyplot(fig9)
+                    exibir('tamanho_grupo')
 
     except Exception as e:
         st.error(f"🚨 Erro no processamento: {e}")
+
+@st.fragment(run_every=0.5)
+def acompanhar(tarefa):
+    # Só este trecho reexecuta enquanto a tarefa roda; ao terminar, reexecuta o app inteiro
+    if tarefa.finalizada:
+        st.rerun()
+    st.progress(tarefa.fracao, text=f"Processando... {tarefa.etapa}")
+    if st.button("✖️ Cancelar processamento"):
+        tarefa.cancelar()
+        st.rerun()
+
+if uploaded_files:
+    # Versão do dataset: hash do conteúdo dos arquivos carregados
+    arquivos = [(f.name, f.getvalue()) for f in uploaded_files]
+    versao_dados = versao_arquivos(arquivos)
+    chave = (versao_dados, so_agregados)
+
+    tarefa = st.session_state.get('tarefa')
+    if tarefa is not None and tarefa.chave != chave:
+        # Upload novo (ou troca de modo): a tarefa anterior não serve mais
+        tarefa.cancelar()
+        tarefa = st.session_state['tarefa'] = None
+
+    if so_agregados:
+        # SÓ AGREGADOS: cubos mapeados do armazém ou reduzidos bloco a bloco (ver parciais.py)
+        resultado = abrir_agregados(versao_dados)
+    else:
+        # DATASET COMPARTILHADO: conteúdo já processado por qualquer sessão ou processo é só
+        # referenciado (registro.py) ou mapeado do armazém em disco (armazem.py)
+        resultado = st.session_state.get('dataset')
+        if resultado is None or resultado.versao != versao_dados:
+            resultado = st.session_state['dataset'] = abrir_dataset(versao_dados)
+
+    if resultado is None:
+        # LEITURA + PIPELINE EM SEGUNDO PLANO (ver tarefas.py e ingestao.py)
+        if tarefa is None:
+            tarefa = st.session_state['tarefa'] = submeter(chave, agregar if so_agregados else carregar, versao_dados, arquivos)
+
+        if not tarefa.finalizada:
+            acompanhar(tarefa)
+        elif tarefa.estado == CANCELADA:
+            st.info("⏹️ Processamento cancelado.")
+            if st.button("🔄 Processar novamente"):
+                del st.session_state['tarefa']
+                st.rerun()
+        elif tarefa.estado == ERRO:
+            st.error(f"🚨 Erro no processamento: {tarefa.erro}")
+        else:
+            resultado = tarefa.resultado[0]
+            if not so_agregados:
+                st.session_state['dataset'] = resultado
+    elif tarefa is not None and not tarefa.finalizada:
+        # Outra sessão registrou o mesmo conteúdo antes desta tarefa terminar
+        tarefa.cancelar()
+
+    if tarefa is not None and tarefa.estado == CONCLUIDA:
+        for erro in tarefa.resultado[1]:
+            st.error(erro)
+    if resultado is not None:
+        if so_agregados:
+            painel(versao_dados, None, resultado)
+        else:
+            painel(versao_dados, resultado, consultas_dataset(versao_dados, resultado))
 else:
+    # Arquivos removidos: nada mais a processar
+    if st.session_state.get('tarefa') is not None:
+        st.session_state['tarefa'].cancelar()
+    st.session_state['tarefa'] = st.session_state['dataset'] = None
     st.info("⚠️ Aguardando carregamento de arquivos na barra lateral.")
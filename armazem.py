@@ -0,0 +1,231 @@
+import json
+import os
+import weakref
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import config
+from cache_graficos import despejar_lru, gravar_atomico
+from cubo import DIMENSOES, DIMENSOES_GRUPOS, construir_cubo, cubo_de_celulas
+from esbocos import IDADE_MAXIMA, REGISTRADORES_HLL, EsbocosDiarios, IdadesDiarias, UnicosDiarios, esbocos_diarios
+from filtros import IndiceFiltros, construir_indice
+from pipeline import COLUNAS_ENTRADA, _hash, impressao_etapas
+
+# ==========================================
+# ARMAZÉM DE DATASETS (ARROW IPC MAPEADO)
+# ==========================================
+# Frame processado, índice de filtros, cubos e esboços gravados como arquivos Arrow IPC
+# (Feather v2) sem compressão e abertos com memory map: as colunas numéricas e
+# de texto apontam direto para as páginas do arquivo, então vários processos do
+# Streamlit e o lote.py compartilham o mesmo page cache do sistema operacional
+# e abrir um dataset já processado custa milissegundos, qualquer que seja o
+# histórico. As chaves incluem a impressão das regras do pipeline: mudar uma
+# etapa invalida os arquivos antigos, que saem pelo despejo LRU (mtime).
+
+EXTENSAO = '.arrow'
+
+def gravar_ipc(caminho, tabela):
+    # Arquivo Arrow IPC publicado de uma vez (ver cache_graficos.gravar_atomico)
+    def escrever(temporario):
+        with pa.OSFile(temporario, 'wb') as f, pa.ipc.new_file(f, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+
+    gravar_atomico(caminho, escrever)
+
+class ArmazemDatasets:
+    def __init__(self, diretorio=None, limite_disco=0):
+        self.diretorio = diretorio
+        self.limite_disco = limite_disco
+
+    @property
+    def ativo(self):
+        return bool(self.diretorio and self.limite_disco)
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave + EXTENSAO)
+
+    def ler(self, chave):
+        # Tabela mapeada em memória, ou None se ausente/ilegível
+        if not self.ativo:
+            return None
+        caminho = self._caminho(chave)
+        try:
+            tabela = pa.ipc.open_file(pa.memory_map(caminho)).read_all()
+            os.utime(caminho)
+            return tabela
+        except (OSError, pa.ArrowInvalid):
+            return None
+
+    def gravar(self, chave, tabela):
+        # Sem compressão: o memory map só evita cópia com os buffers crus no arquivo
+        if not self.ativo or tabela.nbytes > self.limite_disco:
+            return False
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            # Processos com o arquivo antigo mapeado continuam lendo a versão deles
+            gravar_ipc(self._caminho(chave), tabela)
+            despejar_lru(self.diretorio, EXTENSAO, self.limite_disco)
+            return True
+        except OSError:
+            return False
+
+ARMAZEM = ArmazemDatasets(
+    diretorio=os.path.join(config.DIR_CACHE, 'datasets') if config.DIR_CACHE else None,
+    limite_disco=config.ARMAZEM_DATASETS_MB * 1024 * 1024,
+)
+
+def _chave(versao_dados, nome):
+    return _hash(versao_dados, nome, impressao_etapas())
+
+# Colunas em heap de cada frame aberto do armazém, por id, enquanto o frame existir
+_colunas_heap = {}
+
+def _enderecos(serie):
+    # Início dos buffers de dados da coluna; None se são objetos Python
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return [serie.cat.codes.to_numpy().ctypes.data]
+    if isinstance(serie.dtype, np.dtype):
+        return None if serie.dtype == object else [serie.to_numpy().ctypes.data]
+    partes = serie.array.__arrow_array__().chunks
+    return [b.address for parte in partes for b in parte.buffers() if b is not None and b.size]
+
+def _frame(tabela):
+    # split_blocks: cada coluna vira seu próprio bloco, sem consolidar (e copiar) por dtype
+    df = tabela.to_pandas(split_blocks=True)
+    # Colunas que a conversão copiou (booleanos, números com nulos, datas como objetos)
+    # ficam no heap; as demais apontam para o trecho mapeado do arquivo
+    buffers = [b for coluna in tabela.columns for parte in coluna.chunks for b in parte.buffers() if b is not None and b.size]
+    inicio = min((b.address for b in buffers), default=0)
+    fim = max((b.address + b.size for b in buffers), default=0)
+    copiadas = [c for c in df.columns
+                if (enderecos := _enderecos(df[c])) is None or not all(inicio <= e < fim for e in enderecos)]
+    _colunas_heap[id(df)] = copiadas
+    weakref.finalize(df, _colunas_heap.pop, id(df), None)
+    return df
+
+def bytes_em_heap(df):
+    # Memória do processo ocupada pelo frame. Colunas de um frame do armazém que apontam
+    # para o arquivo mapeado estão no page cache, que o sistema descarta e relê do disco
+    colunas = _colunas_heap.get(id(df))
+    if colunas is None:
+        return int(df.memory_usage(deep=True).sum())
+    return int(df[colunas].memory_usage(index=False, deep=True).sum())
+
+def abrir_dataset(versao_dados):
+    tabela = ARMAZEM.ler(_chave(versao_dados, 'dataset'))
+    return None if tabela is None else _frame(tabela)
+
+def guardar_dataset(versao_dados, df):
+    # Devolve o frame relido do arquivo mapeado, para o processo não manter a cópia em heap.
+    # Colunas de texto livre da planilha chegam com tipos misturados (Whatsapp digitado
+    # como número no Excel) e vão como texto; o que o Arrow ainda recusar fica em heap
+    if not ARMAZEM.ativo:
+        return df
+    chave = _chave(versao_dados, 'dataset')
+    livres = [c for c in COLUNAS_ENTRADA if c in df.columns and df[c].dtype == object]
+    try:
+        tabela = pa.Table.from_pandas(df.astype({c: 'str' for c in livres}), preserve_index=False)
+    except pa.ArrowException:
+        return df
+    if ARMAZEM.gravar(chave, tabela):
+        tabela = ARMAZEM.ler(chave)
+        if tabela is not None:
+            return _frame(tabela)
+    return df
+
+# --- índice de filtros: códigos de cidade e bitmaps de tipologia (uint8, lidos como bool sem cópia) ---
+def _tabela_indice(indice):
+    colunas = {'codigos_cidade': indice.codigos_cidade}
+    colunas.update({f'grupo_{i}': b.view('uint8') for i, b in enumerate(indice.bitmaps_grupo)})
+    return pa.table(colunas).replace_schema_metadata({
+        'cidades': json.dumps(list(indice.cidades)),
+        'grupos': json.dumps(list(indice.grupos)),
+    })
+
+def _indice_da_tabela(tabela, df):
+    metadados = tabela.schema.metadata
+    grupos = json.loads(metadados[b'grupos'])
+    estrangeiro = df['Estrangeiro'].to_numpy(dtype=bool)
+    estrangeiro.flags.writeable = False
+    return IndiceFiltros(
+        data_hora=df['Data_Hora'].to_numpy(),
+        cidades=pd.Index(json.loads(metadados[b'cidades'])),
+        codigos_cidade=tabela.column('codigos_cidade').to_numpy(),
+        grupos=pd.Index(grupos),
+        bitmaps_grupo=tuple(tabela.column(f'grupo_{i}').to_numpy().view(bool) for i in range(len(grupos))),
+        estrangeiro=estrangeiro,
+    )
+
+def obter_indice(versao_dados, df):
+    chave = _chave(versao_dados, 'indice')
+    tabela = ARMAZEM.ler(chave)
+    if tabela is not None and tabela.num_rows == len(df):
+        return _indice_da_tabela(tabela, df)
+    indice = construir_indice(df)
+    ARMAZEM.gravar(chave, _tabela_indice(indice))
+    return indice
+
+def _chave_cubo(versao_dados, dimensoes, agregados):
+    # Os cubos do modo só agregados têm as origens cortadas em CAPACIDADE_ORIGENS
+    # (ver parciais.limitar_origens): chave própria, por capacidade, para o modo
+    # completo nunca ler um cubo cortado
+    modo = ('agregados', config.CAPACIDADE_ORIGENS) if agregados else ('completo',)
+    return _chave(versao_dados, f"cubo:{dimensoes}:{modo}")
+
+def abrir_cubos(versao_dados, agregados=False):
+    # (cubo, cubo_grupos) mapeados do armazém, ou None se algum faltar
+    tabelas = [ARMAZEM.ler(_chave_cubo(versao_dados, d, agregados)) for d in (DIMENSOES, DIMENSOES_GRUPOS)]
+    if any(t is None for t in tabelas):
+        return None
+    return tuple(cubo_de_celulas(_frame(t), int(t.schema.metadata.get(b'erro_origens', 0))) for t in tabelas)
+
+def guardar_cubos(versao_dados, cubos, agregados=False):
+    for dimensoes, cubo in zip((DIMENSOES, DIMENSOES_GRUPOS), cubos):
+        tabela = pa.Table.from_pandas(cubo.celulas, preserve_index=False)
+        tabela = tabela.replace_schema_metadata({**tabela.schema.metadata, b'erro_origens': str(cubo.erro_origens)})
+        ARMAZEM.gravar(_chave_cubo(versao_dados, dimensoes, agregados), tabela)
+
+def obter_cubos(versao_dados, df):
+    # (cubo, cubo_grupos): células lidas do armazém ou agregadas agora e gravadas
+    cubos = abrir_cubos(versao_dados)
+    if cubos is None:
+        cubos = (construir_cubo(df), construir_cubo(df, DIMENSOES_GRUPOS))
+        guardar_cubos(versao_dados, cubos)
+    return cubos
+
+# --- esboços diários: cada linha da matriz dia x contador como binário de tamanho fixo, lida sem cópia ---
+def _tabela_diaria(dias, matriz):
+    largura = matriz.shape[1] * matriz.itemsize
+    linhas = pa.Array.from_buffers(pa.binary(largura), len(dias), [None, pa.py_buffer(np.ascontiguousarray(matriz))])
+    return pa.table({'Data': dias, 'linhas': linhas})
+
+def _matriz_diaria(tabela, dtype, colunas):
+    dias = tabela.column('Data').to_numpy().astype('datetime64[D]')
+    if tabela.num_rows == 0:
+        return dias, np.zeros((0, colunas), dtype=dtype)
+    linhas = tabela.column('linhas').combine_chunks()
+    matriz = np.frombuffer(linhas.buffers()[1], dtype=dtype, count=len(linhas) * colunas)
+    return dias, matriz.reshape(-1, colunas)
+
+def abrir_esbocos(versao_dados):
+    tabelas = [ARMAZEM.ler(_chave(versao_dados, nome)) for nome in ('unicos', 'idades')]
+    if any(t is None for t in tabelas):
+        return None
+    unicos, idades = tabelas
+    return EsbocosDiarios(
+        unicos=UnicosDiarios(*_matriz_diaria(unicos, np.uint8, REGISTRADORES_HLL)),
+        idades=IdadesDiarias(*_matriz_diaria(idades, np.uint32, IDADE_MAXIMA + 1)),
+    )
+
+def guardar_esbocos(versao_dados, esbocos):
+    ARMAZEM.gravar(_chave(versao_dados, 'unicos'), _tabela_diaria(esbocos.unicos.dias, esbocos.unicos.registradores))
+    ARMAZEM.gravar(_chave(versao_dados, 'idades'), _tabela_diaria(esbocos.idades.dias, esbocos.idades.contagens))
+
+def obter_esbocos(versao_dados, df):
+    esbocos = abrir_esbocos(versao_dados)
+    if esbocos is None:
+        esbocos = esbocos_diarios(df)
+        guardar_esbocos(versao_dados, esbocos)
+    return esbocos
@@ -0,0 +1,82 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from consultas import BACKENDS
+from filtros import Filtros
+from pipeline import DIAS_SEMANA, FAIXAS_ETARIAS, FAIXAS_LIMITES
+
+# ==========================================
+# BENCHMARK DOS MOTORES DE CONSULTA
+# ==========================================
+# Gera um frame já processado (mesmas colunas e tipos de pipeline.processar) com
+# N linhas sintéticas e mede, por backend, a carga do dataset e a resposta a
+# alguns estados de filtro típicos do painel.
+#   python benchmark_consultas.py 1000000 10000000
+
+CIDADES = [f'Cidade {i:02d}' for i in range(60)] + ['Argentina', 'França', 'Paraguai', 'Bolívia']
+REPETICOES = 5
+
+def dataset_sintetico(n, dias=3 * 365, semente=0):
+    r = np.random.default_rng(semente)
+    inicio = np.datetime64('2022-01-01T00:00:00', 's')
+    data_hora = np.sort(inicio + r.integers(0, dias * 86400, n).astype('timedelta64[s]')).astype('datetime64[us]')
+    cidade = pd.Series(np.array(CIDADES, dtype=object)[r.zipf(1.6, n) % len(CIDADES)], dtype='str')
+    criancas = np.minimum(r.poisson(0.8, n), 40)
+    idade = pd.Series(np.where(r.random(n) < 0.1, np.nan, r.integers(1, 91, n)))
+    faixa = pd.cut(idade, bins=FAIXAS_LIMITES, labels=FAIXAS_ETARIAS[:-1], ordered=True)
+    # Visitantes recorrentes: um terço de telefones distintos
+    telefone = pd.Series(np.char.add('+55659', np.char.zfill(r.integers(0, max(n // 3, 1), n).astype(str), 8)), dtype='str')
+    dt = pd.Series(data_hora).dt
+    return pd.DataFrame({
+        'Data_Hora': data_hora,
+        'Hora': dt.hour.astype('int64'),
+        'Dia_Semana': pd.Categorical.from_codes(dt.dayofweek, categories=DIAS_SEMANA, ordered=True),
+        'Idade': idade,
+        'Faixa_Etaria': faixa.cat.add_categories(FAIXAS_ETARIAS[-1]).fillna(FAIXAS_ETARIAS[-1]),
+        'Cidade_Limpa': cidade,
+        'Estrangeiro': cidade.isin(CIDADES[60:]).to_numpy(),
+        'Qtd_Criancas': criancas,
+        'Total_Visitantes_Linha': 1 + criancas,
+        'Tipo_Grupo': np.where(criancas > 0, 'Família/Grupo', 'Individual/Adultos'),
+        'Telefone': telefone,
+    })
+
+def filtros_tipicos(df):
+    ultimo = df['Data_Hora'].iloc[-1].date()
+    return {
+        'sem filtros': Filtros(),
+        'último mês': Filtros(inicio=ultimo - pd.Timedelta(days=30), fim=ultimo),
+        'ano + 3 cidades': Filtros(inicio=ultimo - pd.Timedelta(days=365), fim=ultimo, cidades=tuple(CIDADES[:3])),
+        'estrangeiros + tipologia': Filtros(grupos=('Família/Grupo',), apenas_estrangeiros=True),
+    }
+
+def medir(backend, df):
+    t = time.perf_counter()
+    consultas = BACKENDS[backend](df)
+    carga = time.perf_counter() - t
+    tempos = {}
+    for nome, filtros in filtros_tipicos(df).items():
+        amostras = []
+        for _ in range(REPETICOES):
+            t = time.perf_counter()
+            consultas.agregados(filtros)
+            amostras.append(time.perf_counter() - t)
+        tempos[nome] = float(np.median(amostras))
+    return carga, tempos
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('linhas', nargs='+', type=int)
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS))
+    args = parser.parse_args()
+
+    for n in args.linhas:
+        df = dataset_sintetico(n)
+        for backend in args.backends:
+            carga, tempos = medir(backend, df)
+            consultas = ' | '.join(f'{nome}: {1000 * s:.0f} ms' for nome, s in tempos.items())
+            print(f'{n:>11,} linhas | {backend:<6} | carga {carga:.2f} s | {consultas}', flush=True)
+        del df
@@ -0,0 +1,131 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import config
+from pipeline import impressao_etapas
+
+# ==========================================
+# CACHE DE GRÁFICOS RENDERIZADOS
+# ==========================================
+# PNGs indexados por hash de (versão do dataset, regras do pipeline, modo dos
+# dados, estado dos filtros, tema, gráfico): regras novas ou o modo só agregados
+# (cidades além da capacidade somadas em "Outras Origens") mudam o desenho.
+# Camada em memória (compartilhada pelas sessões do processo) e camada em disco
+# (compartilhada entre processos), cada uma com orçamento em bytes e despejo LRU.
+# Uma visão repetida é servida sem tocar no matplotlib.
+
+def chave_grafico(versao_dados, filtros, tema, grafico, so_agregados=False):
+    partes = (versao_dados, impressao_etapas(), so_agregados, filtros, tema, grafico)
+    return hashlib.sha1(repr(partes).encode('utf-8')).hexdigest()
+
+class CacheGraficos:
+    def __init__(self, diretorio=None, limite_memoria=0, limite_disco=0):
+        self.diretorio = diretorio
+        self.limite_memoria = limite_memoria
+        self.limite_disco = limite_disco
+        self._memoria = OrderedDict()
+        self._bytes_memoria = 0
+        self._lock = threading.Lock()
+
+    def ler(self, chave):
+        png = self._ler_memoria(chave)
+        if png is None:
+            png = self._ler_disco(chave)
+            if png is not None:
+                self._gravar_memoria(chave, png)
+        return png
+
+    def gravar(self, chave, png):
+        self._gravar_disco(chave, png)
+        self._gravar_memoria(chave, png)
+
+    # --- memória ---
+    def _ler_memoria(self, chave):
+        with self._lock:
+            png = self._memoria.get(chave)
+            if png is not None:
+                self._memoria.move_to_end(chave)
+            return png
+
+    def _gravar_memoria(self, chave, png):
+        if len(png) > self.limite_memoria:
+            return
+        with self._lock:
+            antigo = self._memoria.pop(chave, None)
+            if antigo is not None:
+                self._bytes_memoria -= len(antigo)
+            self._memoria[chave] = png
+            self._bytes_memoria += len(png)
+            while self._bytes_memoria > self.limite_memoria:
+                _, removido = self._memoria.popitem(last=False)
+                self._bytes_memoria -= len(removido)
+
+    # --- disco (LRU pelo mtime, atualizado a cada acerto) ---
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave + '.png')
+
+    def _ler_disco(self, chave):
+        if not self.diretorio or not self.limite_disco:
+            return None
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, 'rb') as f:
+                png = f.read()
+            os.utime(caminho)
+            return png
+        except OSError:
+            return None
+
+    def _gravar_disco(self, chave, png):
+        if not self.diretorio or len(png) > self.limite_disco:
+            return
+        def escrever(temporario):
+            with open(temporario, 'wb') as f:
+                f.write(png)
+
+        try:
+            os.makedirs(self.diretorio, exist_ok=True)
+            gravar_atomico(self._caminho(chave), escrever)
+            self._despejar_disco()
+        except OSError:
+            pass
+
+    def _despejar_disco(self):
+        despejar_lru(self.diretorio, '.png', self.limite_disco)
+
+def gravar_atomico(caminho, escrever):
+    # escrever(temporario) grava o arquivo inteiro ao lado do destino; os.replace o publica
+    # de uma vez (leitores veem o antigo ou o novo, nunca um pela metade) e, se algo
+    # falhar, o temporário é removido
+    temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        escrever(temporario)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+def despejar_lru(diretorio, extensao, limite):
+    # Remove os arquivos de mtime mais antigo até o diretório caber no orçamento
+    arquivos = []
+    for entrada in os.scandir(diretorio):
+        if entrada.name.endswith(extensao):
+            info = entrada.stat()
+            arquivos.append((info.st_mtime, info.st_size, entrada.path))
+    total = sum(a[1] for a in arquivos)
+    for _, tamanho, caminho in sorted(arquivos):
+        if total <= limite:
+            break
+        try:
+            os.remove(caminho)
+            total -= tamanho
+        except OSError:
+            pass
+
+CACHE = CacheGraficos(
+    diretorio=os.path.join(config.DIR_CACHE, 'graficos') if config.DIR_CACHE else None,
+    limite_memoria=config.CACHE_GRAFICOS_MEMORIA_MB * 1024 * 1024,
+    limite_disco=config.CACHE_GRAFICOS_DISCO_MB * 1024 * 1024,
+)
@@ -0,0 +1,48 @@
+import os
+
+# ==========================================
+# CONFIGURAÇÃO (VARIÁVEIS DE AMBIENTE SIT_*)
+# ==========================================
+
+def _env_int(nome, padrao):
+    valor = os.environ.get(nome)
+    return int(valor) if valor else padrao
+
+# Diretório base dos caches em disco; vazio desativa a camada de disco
+DIR_CACHE = os.environ.get('SIT_DIR_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'sit'))
+
+# Cache de gráficos renderizados (compartilhado entre sessões do processo e, via disco, entre processos)
+CACHE_GRAFICOS_MEMORIA_MB = _env_int('SIT_CACHE_GRAFICOS_MEMORIA_MB', 64)
+CACHE_GRAFICOS_DISCO_MB = _env_int('SIT_CACHE_GRAFICOS_DISCO_MB', 512)
+
+# Implementação do pipeline de sanitização: 'pandas' ou 'polars' (requer o pacote polars)
+PIPELINE = os.environ.get('SIT_PIPELINE', 'pandas')
+
+# Motor que responde aos filtros: 'pandas' (cubo em memória) ou 'duckdb' (requer o pacote duckdb)
+BACKEND_CONSULTAS = os.environ.get('SIT_BACKEND_CONSULTAS', 'pandas')
+
+# Arquivos exportados (gerados no clique e reaproveitados enquanto os filtros se repetem)
+CACHE_EXPORTACOES_MB = _env_int('SIT_CACHE_EXPORTACOES_MB', 1024)
+
+# Datasets, índices e cubos em Arrow IPC no disco, abertos por memory map (ver armazem.py)
+ARMAZEM_DATASETS_MB = _env_int('SIT_ARMAZEM_DATASETS_MB', 4096)
+
+# Teto de memória dos datasets processados compartilhados entre sessões (ver registro.py)
+REGISTRO_DATASETS_MB = _env_int('SIT_REGISTRO_DATASETS_MB', 2048)
+
+# Teto de memória das saídas de etapas memorizadas (ver pipeline.py); conta no teto acima
+CACHE_ETAPAS_MB = _env_int('SIT_CACHE_ETAPAS_MB', 256)
+
+# Linhas por bloco na agregação fora da memória (ver parciais.py); limita a memória do modo
+LINHAS_BLOCO_AGREGACAO = _env_int('SIT_LINHAS_BLOCO_AGREGACAO', 200_000)
+
+# Origens distintas mantidas nos cubos do modo só agregados; as menos frequentes
+# além disso são somadas em "Outras Origens" (ver parciais.limitar_origens)
+CAPACIDADE_ORIGENS = _env_int('SIT_CAPACIDADE_ORIGENS', 2000)
+
+# Threads que leem e sanitizam uploads em segundo plano (compartilhadas pelas sessões)
+WORKERS_PROCESSAMENTO = _env_int('SIT_WORKERS_PROCESSAMENTO', 2)
+
+# Processos para renderizar painéis em paralelo; 0 renderiza na própria thread da sessão
+_CPUS = os.cpu_count() or 1
+WORKERS_GRAFICOS = _env_int('SIT_WORKERS_GRAFICOS', min(_CPUS, 9) if _CPUS > 1 else 0)
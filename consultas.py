@@ -0,0 +1,215 @@
+import threading
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+
+import config
+from agregacao import Contagens, agregar, montar
+from armazem import bytes_em_heap, obter_cubos, obter_esbocos
+from cubo import DIMENSOES_GRUPOS, construir_cubo
+from esbocos import PERCENTIS_IDADE, esbocos_diarios
+from filtros import bytes_proprios
+from pipeline import FAIXAS_ETARIAS
+
+# ==========================================
+# MOTOR DE CONSULTAS (PANDAS OU DUCKDB)
+# ==========================================
+# O painel só pergunta "quais os Agregados para estes filtros?". Duas respostas
+# intercambiáveis, escolhidas por SIT_BACKEND_CONSULTAS:
+#   pandas: cubo pré-agregado em memória (cubo.py), filtrado por índice;
+#   duckdb: tabela colunar no DuckDB embarcado, ordenada por Data_Hora (os zone
+#           maps descartam os row groups fora do período); filtros e todas as
+#           contagens saem de uma varredura SQL vetorizada e multi-thread com
+#           GROUPING SETS, e só os vetores de contagem voltam ao Python.
+# Nos dois casos os Agregados são montados pelo mesmo agregacao.montar.
+# Visitantes únicos e percentis de idade: no pandas, esboços diários
+# (esbocos.py), que só respondem a filtros de período; no DuckDB, count(DISTINCT)
+# e quantile_cont exatos na mesma seleção dos demais números.
+
+class ConsultasPandas:
+    def __init__(self, df, versao_dados=None, cubos=None, esbocos=None):
+        if cubos is not None:
+            # Cubos e esboços prontos, sem registros (ex.: agregação fora da memória, ver parciais.py)
+            self.cubo, self.cubo_grupos = cubos
+            self.esbocos = esbocos
+        elif versao_dados is not None:
+            # Células do armazém em disco (mapeadas) quando o dataset já foi agregado
+            self.cubo, self.cubo_grupos = obter_cubos(versao_dados, df)
+            self.esbocos = obter_esbocos(versao_dados, df)
+        else:
+            self.cubo = construir_cubo(df)
+            self.cubo_grupos = construir_cubo(df, DIMENSOES_GRUPOS)
+            self.esbocos = esbocos_diarios(df)
+
+    @property
+    def cidades(self):
+        return self.cubo.indice.cidades
+
+    @property
+    def grupos(self):
+        return self.cubo.indice.grupos
+
+    def bytes_em_heap(self):
+        # Memória do processo (ver registro.py): células e índices dos cubos, matrizes dos esboços
+        total = sum(bytes_em_heap(c.celulas) + c.indice.bytes_em_heap() for c in (self.cubo, self.cubo_grupos))
+        if self.esbocos is not None:
+            unicos, idades = self.esbocos.unicos, self.esbocos.idades
+            total += bytes_proprios(unicos.dias, unicos.registradores, idades.dias, idades.contagens)
+        return total
+
+    def periodo(self):
+        datas = self.cubo.indice.data_hora
+        return pd.Timestamp(datas[0]).date(), pd.Timestamp(datas[-1]).date()
+
+    def agregados(self, filtros):
+        ag = replace(agregar(self.cubo.filtrar(filtros), self.cubo_grupos.filtrar(filtros)), erro_origens=self.cubo.erro_origens)
+        # Os esboços são por dia: com cidade, tipologia ou estrangeiros os campos ficam None
+        if self.esbocos is None or filtros.cidades or filtros.grupos or filtros.apenas_estrangeiros:
+            return ag
+        mediana, p90 = self.esbocos.idades.percentis(PERCENTIS_IDADE, filtros.inicio, filtros.fim)
+        return replace(
+            ag,
+            visitantes_unicos=self.esbocos.unicos.estimar(filtros.inicio, filtros.fim),
+            idade_mediana=mediana,
+            idade_p90=p90,
+        )
+
+# Uma varredura: cada conjunto de agrupamento alimenta um grupo de vetores de Contagens
+_CONJUNTOS = (
+    ('Data',),
+    ('Dia_Semana', 'Hora'),
+    ('Cidade_Limpa', 'Estrangeiro'),
+    ('Tipo_Grupo',),
+    ('Faixa_Etaria',),
+    ('Total_Visitantes_Linha',),
+)
+_COLUNAS = tuple(dict.fromkeys(c for conjunto in _CONJUNTOS for c in conjunto))
+
+_SQL_CONTAGENS = f"""
+    SELECT grouping({', '.join(_COLUNAS)}) AS conjunto, {', '.join(_COLUNAS)},
+           sum(Total_Visitantes_Linha) AS Visitantes, count(*) AS Adultos, sum(Qtd_Criancas) AS Criancas
+    FROM (SELECT *, CAST(Data_Hora AS DATE) AS Data FROM visitantes {{onde}})
+    GROUP BY GROUPING SETS ({', '.join('(' + ', '.join(c) + ')' for c in _CONJUNTOS)})
+"""
+
+# Únicos e percentis exatos nas mesmas linhas filtradas: o approx_count_distinct
+# do DuckDB usa poucos registradores e erra bem mais que o 1% dos esboços diários
+_SQL_ESBOCOS = f"""
+    SELECT count(DISTINCT Telefone) AS unicos, quantile_cont(Idade, {list(PERCENTIS_IDADE)}) AS idades
+    FROM visitantes {{onde}}
+"""
+
+def _mascara(conjunto):
+    # Valor de grouping(): bit 1 para cada coluna fora do conjunto, a primeira no bit mais alto
+    return sum(1 << (len(_COLUNAS) - 1 - i) for i, c in enumerate(_COLUNAS) if c not in conjunto)
+
+def _vetor(codigos, pesos, n):
+    validos = codigos >= 0
+    return np.bincount(codigos[validos], weights=pesos[validos], minlength=n).astype(np.int64)
+
+def _onde(filtros):
+    condicoes, parametros = [], []
+    if filtros.inicio is not None:
+        condicoes.append("Data_Hora >= ?")
+        parametros.append(pd.Timestamp(filtros.inicio))
+    if filtros.fim is not None:
+        condicoes.append("Data_Hora < ?")
+        parametros.append(pd.Timestamp(filtros.fim) + pd.Timedelta(days=1))
+    if filtros.cidades:
+        condicoes.append("list_contains(?, Cidade_Limpa)")
+        parametros.append(list(filtros.cidades))
+    if filtros.grupos:
+        condicoes.append("list_contains(?, Tipo_Grupo)")
+        parametros.append(list(filtros.grupos))
+    if filtros.apenas_estrangeiros:
+        condicoes.append("Estrangeiro")
+    return ("WHERE " + " AND ".join(condicoes)) if condicoes else "", parametros
+
+class ConsultasDuckDB:
+    def __init__(self, df, versao_dados=None):
+        import duckdb
+
+        self._con = duckdb.connect()
+        self._lock = threading.Lock()
+        # Categóricas com categorias fixas vão como códigos inteiros
+        origem = df[['Data_Hora', 'Hora', 'Cidade_Limpa', 'Tipo_Grupo', 'Estrangeiro', 'Total_Visitantes_Linha', 'Qtd_Criancas', 'Telefone', 'Idade']].assign(
+            Dia_Semana=df['Dia_Semana'].cat.codes,
+            Faixa_Etaria=df['Faixa_Etaria'].cat.codes,
+        )
+        self._con.register('origem', origem)
+        self._con.execute("CREATE TABLE visitantes AS SELECT * FROM origem ORDER BY Data_Hora")
+        self._con.unregister('origem')
+        self.cidades = pd.Index(sorted(df['Cidade_Limpa'].dropna().unique()))
+        self.grupos = pd.Index(sorted(df['Tipo_Grupo'].dropna().unique()))
+
+    def bytes_em_heap(self):
+        # A tabela é uma cópia das colunas dentro do DuckDB, fora dos frames do pandas
+        with self._lock:
+            return int(self._con.execute("SELECT sum(memory_usage_bytes) FROM duckdb_memory()").fetchone()[0] or 0)
+
+    def _consultar(self, sql, filtros):
+        onde, parametros = _onde(filtros)
+        with self._lock:
+            cursor = self._con.cursor()
+        try:
+            return cursor.execute(sql.format(onde=onde), parametros).df()
+        finally:
+            cursor.close()
+
+    def agregados(self, filtros):
+        resultado = self._consultar(_SQL_CONTAGENS, filtros)
+        por = {conjunto: resultado[resultado['conjunto'] == _mascara(conjunto)] for conjunto in _CONJUNTOS}
+
+        dias = por[('Data',)]
+        datas = dias['Data'].to_numpy().astype('datetime64[D]')
+        dia0 = datas.min() if len(datas) else np.datetime64(0, 'D')
+        cod_data = (datas - dia0).astype(np.int64)
+        n_datas = int(cod_data.max()) + 1 if len(cod_data) else 0
+
+        semana_hora = por[('Dia_Semana', 'Hora')]
+        horas = semana_hora['Hora'].to_numpy(dtype=np.int64)
+        cod_calor = semana_hora['Dia_Semana'].to_numpy(dtype=np.int64) * 24 + horas
+
+        origem = por[('Cidade_Limpa', 'Estrangeiro')]
+        cod_cidade = self.cidades.get_indexer(origem['Cidade_Limpa'])
+        estrangeiro = origem['Estrangeiro'].to_numpy(dtype=bool)
+
+        grupos = por[('Tipo_Grupo',)]
+        faixas = por[('Faixa_Etaria',)]
+        tamanhos = por[('Total_Visitantes_Linha',)]
+
+        def medida(quadro, coluna):
+            return quadro[coluna].to_numpy(dtype=np.int64)
+
+        ag = montar(Contagens(
+            dia0=dia0,
+            visitantes_dia=_vetor(cod_data, medida(dias, 'Visitantes'), n_datas),
+            adultos_dia=_vetor(cod_data, medida(dias, 'Adultos'), n_datas),
+            calor=_vetor(cod_calor, medida(semana_hora, 'Visitantes'), 7 * 24).reshape(7, 24),
+            adultos_hora=_vetor(horas, medida(semana_hora, 'Adultos'), 24),
+            grupos=self.grupos,
+            adultos_grupo=_vetor(self.grupos.get_indexer(grupos['Tipo_Grupo']), medida(grupos, 'Adultos'), len(self.grupos)),
+            cidades=self.cidades,
+            adultos_cidade=_vetor(cod_cidade, medida(origem, 'Adultos'), len(self.cidades)),
+            adultos_estrangeiros_cidade=_vetor(cod_cidade, medida(origem, 'Adultos') * estrangeiro, len(self.cidades)),
+            adultos_faixa=_vetor(medida(faixas, 'Faixa_Etaria'), medida(faixas, 'Adultos'), len(FAIXAS_ETARIAS)),
+            tamanhos=_vetor(medida(tamanhos, 'Total_Visitantes_Linha'), medida(tamanhos, 'Adultos'), 0),
+            total_criancas=int(grupos['Criancas'].sum()),
+            total_estrangeiros=int(medida(origem, 'Visitantes')[estrangeiro].sum()),
+        ))
+        esbocos = self._consultar(_SQL_ESBOCOS, filtros).iloc[0]
+        # Sem idades na seleção o quantile_cont devolve NULL
+        mediana, p90 = (float(v) for v in esbocos['idades']) if pd.api.types.is_list_like(esbocos['idades']) else (None, None)
+        return replace(ag, visitantes_unicos=int(esbocos['unicos']), idade_mediana=mediana, idade_p90=p90)
+
+BACKENDS = {
+    'pandas': ConsultasPandas,
+    'duckdb': ConsultasDuckDB,
+}
+
+def abrir_consultas(df, backend=None, versao_dados=None):
+    backend = backend or config.BACKEND_CONSULTAS
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de consultas desconhecido: {backend} (opções: {', '.join(BACKENDS)})")
+    return BACKENDS[backend](df, versao_dados)
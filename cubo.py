@@ -0,0 +1,63 @@
+from dataclasses import dataclass
+
+import pandas as pd
+
+from filtros import IndiceFiltros, aplicar_filtros, construir_indice
+
+# ==========================================
+# CUBO PRÉ-AGREGADO (OLAP)
+# ==========================================
+# Calculado uma vez por dataset. O tamanho é limitado pelo número de combinações
+# das dimensões, não pelo número de visitantes; filtros, KPIs e gráficos são
+# respondidos a partir das células. Dia_Semana é atributo de Data (não altera o grão).
+
+DIMENSOES = ('Data', 'Dia_Semana', 'Hora', 'Cidade_Limpa', 'Tipo_Grupo', 'Estrangeiro', 'Faixa_Etaria')
+
+# Tamanho do grupo não é recuperável das células acima: cubo auxiliar com as
+# dimensões filtráveis + Total_Visitantes_Linha, para a distribuição de grupos
+DIMENSOES_GRUPOS = ('Data', 'Cidade_Limpa', 'Tipo_Grupo', 'Estrangeiro', 'Total_Visitantes_Linha')
+
+@dataclass(frozen=True)
+class Cubo:
+    celulas: pd.DataFrame
+    indice: IndiceFiltros
+    # Quanto a contagem de adultos de uma cidade pode estar abaixo da real, se
+    # origens raras foram somadas em OUTRAS_ORIGENS (ver parciais.limitar_origens)
+    erro_origens: int = 0
+
+    def __len__(self):
+        return len(self.celulas)
+
+    def filtrar(self, filtros):
+        return aplicar_filtros(self.celulas, self.indice, filtros)
+
+MEDIDAS = ['Visitantes', 'Adultos', 'Criancas']
+
+def agregar_celulas(df, dimensoes=DIMENSOES):
+    chaves = df.assign(
+        Data=df['Data_Hora'].dt.normalize(),
+        Cidade_Limpa=df['Cidade_Limpa'].astype('category'),
+        Tipo_Grupo=df['Tipo_Grupo'].astype('category'),
+    )
+    celulas = (
+        chaves.groupby(list(dimensoes), observed=True, sort=True)
+        .agg(
+            Visitantes=('Total_Visitantes_Linha', 'sum'),
+            Adultos=('Total_Visitantes_Linha', 'size'),
+            Criancas=('Qtd_Criancas', 'sum'),
+        )
+        .reset_index()
+    )
+    celulas[MEDIDAS] = celulas[MEDIDAS].astype('int64')
+    return celulas
+
+def somar_celulas(celulas, dimensoes):
+    # Reagrupa células (ex.: concatenação de parciais): as medidas são somas, então a operação é associativa
+    return celulas.groupby(list(dimensoes), observed=True, sort=True)[MEDIDAS].sum().reset_index()
+
+def construir_cubo(df, dimensoes=DIMENSOES):
+    return cubo_de_celulas(agregar_celulas(df, dimensoes))
+
+def cubo_de_celulas(celulas, erro_origens=0):
+    # Células já agregadas (ex.: lidas do armazém) -> Cubo com o índice de filtros
+    return Cubo(celulas, construir_indice(celulas, coluna_tempo='Data'), erro_origens)
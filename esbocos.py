@@ -0,0 +1,184 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# ESBOÇOS DIÁRIOS (HYPERLOGLOG E HISTOGRAMA DE IDADES)
+# ==========================================
+# Números que o cubo não soma: visitantes únicos e percentis de idade. Cada dia
+# guarda um esboço de tamanho fixo, e esboços se combinam elemento a elemento,
+# então qualquer período sai da combinação dos dias selecionados, em tempo
+# proporcional ao número de dias, e blocos lidos em partes (parciais.py)
+# somam-se da mesma forma. Como o grão é o dia, respondem a filtros de período.
+#
+# Únicos = telefones distintos: um HyperLogLog de 2^PRECISAO_HLL registradores
+# de 1 byte (16 KiB), com erro relativo típico de 1,04 / sqrt(2^PRECISAO_HLL)
+# ≈ 0,8%; combina pelo máximo registrador a registrador.
+#
+# Idades: o pipeline só aceita inteiros de 1 a IDADE_MAXIMA, então o resumo
+# combinável exato é o histograma por idade (121 contadores por dia), menor que
+# um t-digest ou KLL de precisão útil e sem erro; combina pela soma, e os
+# percentis interpolam como o Series.quantile do pandas.
+
+PRECISAO_HLL = 14
+REGISTRADORES_HLL = 1 << PRECISAO_HLL
+
+# 2^0 ... 2^63: bit_length(x) = quantas potências são <= x (exato, sem passar por float)
+_POTENCIAS = np.left_shift(np.uint64(1), np.arange(64, dtype=np.uint64))
+
+def _posicoes(telefones):
+    # (registrador, posto) de cada telefone: os PRECISAO_HLL bits altos do hash
+    # escolhem o registrador; o posto é 1 + zeros à esquerda dos bits restantes
+    h = pd.util.hash_array(np.asarray(telefones, dtype=object))
+    registrador = (h >> np.uint64(64 - PRECISAO_HLL)).astype(np.intp)
+    resto = h << np.uint64(PRECISAO_HLL)
+    bits = np.searchsorted(_POTENCIAS, resto, side='right')
+    posto = np.minimum(64 - bits + 1, 64 - PRECISAO_HLL + 1).astype(np.uint8)
+    return registrador, posto
+
+def _sigma(x):
+    if x == 1:
+        return np.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        anterior, z = z, z + x * y
+        y += y
+        if z == anterior:
+            return z
+
+def _tau(x):
+    if x in (0, 1):
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = np.sqrt(x)
+        anterior = z
+        y *= 0.5
+        z -= (1 - x) ** 2 * y
+        if z == anterior:
+            return z / 3
+
+def estimar_hll(registradores):
+    # Estimador de Ertl (2017) sobre o histograma dos registradores: sem viés em toda a
+    # faixa, inclusive na transição em que o estimador original troca de fórmula
+    m, q = REGISTRADORES_HLL, 64 - PRECISAO_HLL
+    c = np.bincount(registradores, minlength=q + 2)
+    z = m * _tau(1 - c[q + 1] / m)
+    for k in range(q, 0, -1):
+        z = 0.5 * (z + c[k])
+    z += m * _sigma(c[0] / m)
+    return int(round(m * m / (2 * np.log(2) * z)))
+
+def _fatia(dias, inicio, fim):
+    # Posições dos dias entre inicio e fim (datas inclusivas; None = sem limite)
+    ini = 0 if inicio is None else int(np.searchsorted(dias, np.datetime64(inicio, 'D'), side='left'))
+    fim = len(dias) if fim is None else int(np.searchsorted(dias, np.datetime64(fim, 'D'), side='right'))
+    return slice(ini, max(ini, fim))
+
+def _por_dia(data_hora, validos):
+    datas = data_hora.to_numpy()[validos].astype('datetime64[D]')
+    return np.unique(datas, return_inverse=True)
+
+def _combinar_dias(a_dias, a, b_dias, b, juntar):
+    # Matrizes dia x contador sobre a união dos dias; juntar combina os dias em comum
+    dias = np.union1d(a_dias, b_dias)
+    matriz = np.zeros((len(dias),) + a.shape[1:], dtype=a.dtype)
+    for parte_dias, parte in ((a_dias, a), (b_dias, b)):
+        posicoes = np.searchsorted(dias, parte_dias)
+        matriz[posicoes] = juntar(matriz[posicoes], parte)
+    return dias, matriz
+
+# --- visitantes únicos ---
+@dataclass(frozen=True)
+class UnicosDiarios:
+    dias: np.ndarray           # datetime64[D], crescente
+    registradores: np.ndarray  # uint8, dias x REGISTRADORES_HLL
+
+    def __len__(self):
+        return len(self.dias)
+
+    def estimar(self, inicio=None, fim=None):
+        # Telefones distintos entre inicio e fim
+        selecao = self.registradores[_fatia(self.dias, inicio, fim)]
+        return estimar_hll(selecao.max(axis=0)) if len(selecao) else 0
+
+def unicos_vazios():
+    return UnicosDiarios(np.array([], dtype='datetime64[D]'), np.zeros((0, REGISTRADORES_HLL), dtype=np.uint8))
+
+def unicos_diarios(data_hora, telefones):
+    # Um esboço por dia com registro; telefones ausentes ou vazios não contam
+    validos = (telefones.notna() & (telefones != '')).to_numpy()
+    if not validos.any():
+        return unicos_vazios()
+    dias, cod_dia = _por_dia(data_hora, validos)
+    registrador, posto = _posicoes(telefones.to_numpy()[validos])
+    registradores = np.zeros((len(dias), REGISTRADORES_HLL), dtype=np.uint8)
+    np.maximum.at(registradores, (cod_dia, registrador), posto)
+    return UnicosDiarios(dias, registradores)
+
+def combinar_unicos(a, b):
+    return UnicosDiarios(*_combinar_dias(a.dias, a.registradores, b.dias, b.registradores, np.maximum))
+
+# --- idades ---
+IDADE_MAXIMA = 120  # limite de pipeline.process_idade
+PERCENTIS_IDADE = (0.5, 0.9)
+
+def percentis_histograma(contagens, quantis):
+    # Interpolação linear entre as posições vizinhas, como Series.quantile; None sem idades
+    acumulado = np.cumsum(contagens)
+    n = int(acumulado[-1]) if len(acumulado) else 0
+    if n == 0:
+        return tuple(None for _ in quantis)
+    resultado = []
+    for q in quantis:
+        h = (n - 1) * q
+        k = int(np.floor(h))
+        # Valor do k-ésimo registro (a partir de 0) na ordem: primeira idade com acumulado > k
+        baixo = int(np.searchsorted(acumulado, k, side='right'))
+        alto = int(np.searchsorted(acumulado, min(k + 1, n - 1), side='right'))
+        resultado.append(float(baixo + (h - k) * (alto - baixo)))
+    return tuple(resultado)
+
+@dataclass(frozen=True)
+class IdadesDiarias:
+    dias: np.ndarray       # datetime64[D], crescente
+    contagens: np.ndarray  # uint32, dias x (IDADE_MAXIMA + 1): registros por idade
+
+    def __len__(self):
+        return len(self.dias)
+
+    def percentis(self, quantis=PERCENTIS_IDADE, inicio=None, fim=None):
+        return percentis_histograma(self.contagens[_fatia(self.dias, inicio, fim)].sum(axis=0), quantis)
+
+def idades_vazias():
+    return IdadesDiarias(np.array([], dtype='datetime64[D]'), np.zeros((0, IDADE_MAXIMA + 1), dtype=np.uint32))
+
+def idades_diarias(data_hora, idades):
+    # Histograma por dia; idade ausente não conta
+    validos = idades.notna().to_numpy()
+    if not validos.any():
+        return idades_vazias()
+    dias, cod_dia = _por_dia(data_hora, validos)
+    posicoes = cod_dia * (IDADE_MAXIMA + 1) + idades.to_numpy()[validos].astype(np.int64)
+    contagens = np.bincount(posicoes, minlength=len(dias) * (IDADE_MAXIMA + 1)).astype(np.uint32)
+    return IdadesDiarias(dias, contagens.reshape(len(dias), IDADE_MAXIMA + 1))
+
+def combinar_idades(a, b):
+    return IdadesDiarias(*_combinar_dias(a.dias, a.contagens, b.dias, b.contagens, np.add))
+
+# --- conjunto guardado por dataset ---
+@dataclass(frozen=True)
+class EsbocosDiarios:
+    unicos: UnicosDiarios
+    idades: IdadesDiarias
+
+def esbocos_diarios(df):
+    return EsbocosDiarios(
+        unicos=unicos_diarios(df['Data_Hora'], df['Telefone']),
+        idades=idades_diarias(df['Data_Hora'], df['Idade']),
+    )
+
+def combinar_esbocos(a, b):
+    return EsbocosDiarios(combinar_unicos(a.unicos, b.unicos), combinar_idades(a.idades, b.idades))
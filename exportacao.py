@@ -0,0 +1,204 @@
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Callable
+
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import config
+from cache_graficos import despejar_lru, gravar_atomico
+from filtros import selecionar
+from pipeline import impressao_etapas
+
+# ==========================================
+# EXPORTAÇÃO SOB DEMANDA
+# ==========================================
+# Nada é serializado enquanto ninguém pede: o botão de download recebe uma função
+# que gera o arquivo no clique. As linhas filtradas são escritas em blocos direto
+# no arquivo, sem montar o frame filtrado nem a string inteira em memória, e o
+# arquivo fica no disco indexado pelo estado dos filtros (despejo LRU por mtime).
+
+LINHAS_POR_BLOCO = 100_000
+
+# Linhas de dados por aba no XLSX (o Excel aceita 1.048.576 contando o cabeçalho)
+LIMITE_LINHAS_XLSX = 1_048_575
+
+# Incrementar ao mudar o conteúdo dos arquivos (colunas, abas): invalida os já gravados
+VERSAO_EXPORTACAO = 3
+
+def chave_exportacao(versao_dados, filtros, formato):
+    # Regras do pipeline na chave: a mesma planilha sanitizada com regras novas é outro arquivo
+    partes = (versao_dados, impressao_etapas(), filtros, formato, VERSAO_EXPORTACAO)
+    return hashlib.sha1(repr(partes).encode('utf-8')).hexdigest()
+
+def blocos(df, indice, filtros):
+    # Linhas selecionadas em blocos de até LINHAS_POR_BLOCO, na ordem do frame
+    selecao = selecionar(indice, filtros)
+    if isinstance(selecao, slice):
+        for ini in range(selecao.start, selecao.stop, LINHAS_POR_BLOCO):
+            yield df.iloc[ini:min(ini + LINHAS_POR_BLOCO, selecao.stop)]
+    else:
+        for ini in range(0, len(selecao), LINHAS_POR_BLOCO):
+            yield df.iloc[selecao[ini:ini + LINHAS_POR_BLOCO]]
+
+def _csv_em_blocos(df, indice, filtros, saida):
+    vazio = True
+    for bloco in blocos(df, indice, filtros):
+        saida.write(bloco.to_csv(index=False, header=vazio).encode('utf-8'))
+        vazio = False
+    if vazio:
+        saida.write(df.iloc[:0].to_csv(index=False).encode('utf-8'))
+
+def escrever_csv(df, indice, filtros, ag, arquivo):
+    _csv_em_blocos(df, indice, filtros, arquivo)
+
+def escrever_csv_gzip(df, indice, filtros, ag, arquivo):
+    with gzip.GzipFile(fileobj=arquivo, mode='wb') as saida:
+        _csv_em_blocos(df, indice, filtros, saida)
+
+class _SemFechar(io.RawIOBase):
+    # Arquivo do chamador visto pelo Arrow: fechar o stream comprimido não fecha o arquivo
+    def __init__(self, arquivo):
+        self._arquivo = arquivo
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        return self._arquivo.write(dados)
+
+def escrever_csv_zstd(df, indice, filtros, ag, arquivo):
+    with pa.CompressedOutputStream(pa.PythonFile(_SemFechar(arquivo), mode='w'), 'zstd') as saida:
+        _csv_em_blocos(df, indice, filtros, saida)
+
+def _tipado(bloco, indice):
+    # Colunas de baixa cardinalidade viram dicionário com as categorias do dataset
+    # inteiro, para todos os row groups compartilharem o mesmo schema
+    return bloco.assign(
+        Cidade_Limpa=pd.Categorical(bloco['Cidade_Limpa'], categories=indice.cidades),
+        Tipo_Grupo=pd.Categorical(bloco['Tipo_Grupo'], categories=indice.grupos),
+    )
+
+def escrever_parquet(df, indice, filtros, ag, arquivo):
+    # Schema inferido de uma linha (a coluna Data é de objetos date e vazia não tem tipo)
+    esquema = pa.Schema.from_pandas(_tipado(df.iloc[:1], indice), preserve_index=False)
+    with pq.ParquetWriter(arquivo, esquema, compression='zstd') as saida:
+        for bloco in blocos(df, indice, filtros):
+            saida.write_table(pa.Table.from_pandas(_tipado(bloco, indice), schema=esquema, preserve_index=False))
+
+def _planilha(wb, titulo, tabela):
+    ws = wb.create_sheet(titulo)
+    tabela = tabela.reset_index()
+    ws.append([str(c) for c in tabela.columns])
+    for linha in tabela.itertuples(index=False):
+        ws.append([None if pd.isna(v) else v for v in linha])
+
+def escrever_xlsx(df, indice, filtros, ag, arquivo):
+    # Modo write_only: as linhas vão para o arquivo à medida que são anexadas
+    wb = openpyxl.Workbook(write_only=True)
+    resumo = pd.Series({
+        'Fluxo Total': ag.total_visitantes,
+        'Visitantes Únicos (estimativa)': ag.visitantes_unicos,
+        'Público Adulto': ag.total_adultos,
+        'Público Infantil': ag.total_criancas,
+        'Internacionais': ag.total_estrangeiros,
+        'Idade Mediana': ag.idade_mediana,
+        'Idade P90': ag.idade_p90,
+    }, name='Valor').rename_axis('Indicador')
+    _planilha(wb, 'Resumo', resumo)
+    _planilha(wb, 'Tipologia', ag.tipologia.rename('Registros'))
+    _planilha(wb, 'Diário', ag.diario)
+    _planilha(wb, 'Dia da Semana', ag.media_dia_semana.rename('Média'))
+    _planilha(wb, 'Top Municípios', ag.top_cidades.rename('Registros'))
+    _planilha(wb, 'Internacionais', ag.top_estrangeiros.rename('Registros'))
+    _planilha(wb, 'Matriz de Calor', ag.calor)
+    _planilha(wb, 'Faixas Etárias', ag.faixas.rename('Registros'))
+    _planilha(wb, 'Tamanho de Grupo', ag.tamanhos_grupo.rename('Registros'))
+
+    # Registros brutos, quebrados em várias abas acima do limite de linhas do Excel;
+    # sem frame (modo só agregados, ver parciais.py) o arquivo tem só as tabelas acima
+    if df is None:
+        wb.save(arquivo)
+        return
+    ws, linhas, abas = None, LIMITE_LINHAS_XLSX, 0
+    for bloco in blocos(df, indice, filtros):
+        bloco = bloco.astype(object).where(bloco.notna(), None)
+        for linha in bloco.itertuples(index=False):
+            if linhas == LIMITE_LINHAS_XLSX:
+                abas += 1
+                ws = wb.create_sheet('Registros' if abas == 1 else f'Registros ({abas})')
+                ws.append(list(df.columns))
+                linhas = 0
+            ws.append(list(linha))
+            linhas += 1
+    if ws is None:
+        wb.create_sheet('Registros').append(list(df.columns))
+    wb.save(arquivo)
+
+@dataclass(frozen=True)
+class Formato:
+    rotulo: str
+    extensao: str
+    mime: str
+    escrever: Callable
+
+FORMATOS = {
+    'csv': Formato('CSV', '.csv', 'text/csv', escrever_csv),
+    'csv.gz': Formato('CSV (gzip)', '.csv.gz', 'application/gzip', escrever_csv_gzip),
+    'csv.zst': Formato('CSV (zstd)', '.csv.zst', 'application/zstd', escrever_csv_zstd),
+    'parquet': Formato('Parquet', '.parquet', 'application/vnd.apache.parquet', escrever_parquet),
+    'xlsx': Formato('Excel (XLSX)', '.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', escrever_xlsx),
+}
+
+class CacheExportacoes:
+    def __init__(self, diretorio=None, limite_disco=0):
+        self.diretorio = diretorio
+        self.limite_disco = limite_disco
+
+    def obter(self, chave, extensao, escrever):
+        if not self.diretorio or not self.limite_disco:
+            with tempfile.TemporaryFile() as f:
+                escrever(f)
+                f.seek(0)
+                return f.read()
+        caminho = os.path.join(self.diretorio, chave + extensao)
+        try:
+            with open(caminho, 'rb') as f:
+                dados = f.read()
+            os.utime(caminho)
+            return dados
+        except OSError:
+            pass
+        os.makedirs(self.diretorio, exist_ok=True)
+
+        def gravar(temporario):
+            with open(temporario, 'wb') as f:
+                escrever(f)
+
+        gravar_atomico(caminho, gravar)
+        with open(caminho, 'rb') as f:
+            dados = f.read()
+        despejar_lru(self.diretorio, tuple(f.extensao for f in FORMATOS.values()), self.limite_disco)
+        return dados
+
+CACHE = CacheExportacoes(
+    diretorio=os.path.join(config.DIR_CACHE, 'exportacoes') if config.DIR_CACHE else None,
+    limite_disco=config.CACHE_EXPORTACOES_MB * 1024 * 1024,
+)
+
+def exportar(formato, versao_dados, df, indice, filtros, ag):
+    # Função para o data= do st.download_button: só roda quando o usuário clica
+    f = FORMATOS[formato]
+    chave = chave_exportacao(versao_dados, filtros, formato if df is not None else f"{formato}:agregados")
+    def gerar():
+        return CACHE.obter(
+            chave, f.extensao,
+            lambda arquivo: f.escrever(df, indice, filtros, ag, arquivo),
+        )
+    return gerar
@@ -0,0 +1,301 @@
+import fcntl
+import glob
+import os
+import threading
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import config
+from armazem import gravar_ipc
+
+# ==========================================
+# ÍNDICE DE VISITANTES (FIDELIDADE)
+# ==========================================
+# Uma linha por telefone: primeiro dia visto, último dia visto e visitas (dias
+# distintos com registro), de todas as cargas. O telefone é o hash de 48 bits
+# do número em E.164 (o número não é guardado).
+#
+# Para saber se um dia já foi contado, cada par (telefone, dia) é uma chave de
+# 64 bits: os bits altos são o hash do telefone e os BITS_DIA baixos, o dia. As
+# chaves ficam num registro particionado por mês (dias/AAAA-MM.arrow, ordenado).
+# Uma carga, ou cada bloco do modo só agregados, lê só os meses que toca, acha
+# por busca binária as chaves ausentes, regrava esses meses e passa adiante só
+# as novas. Repetir uma carga, sobrepor períodos ou enviar trimestres fora de
+# ordem não conta duas vezes um dia já visto.
+#
+# As visitas novas, reduzidas por telefone, entram na tabela como um arquivo
+# delta (telefones.NNNNNN.arrow). Quando os deltas somam mais de 1/FATOR_COMPACTACAO
+# das linhas da tabela principal (telefones.arrow), ou passam de DELTAS_MAXIMOS
+# arquivos, são fundidos nela. Cada carga regrava só os meses que toca e um delta
+# do tamanho das suas visitas novas; a fusão lê a tabela inteira, mas só depois
+# que os deltas somam uma fração dela. Nada em memória cresce com o número de
+# visitas do histórico. Resumo e consultas por telefone (historico) leem a tabela
+# mais os deltas; o resumo só é refeito quando esses arquivos mudam.
+#
+# Com 48 bits por telefone a chance de colisão é desprezível (~0,2 par em 10
+# milhões de telefones); o dia é guardado módulo 2^BITS_DIA (~179 anos a partir
+# de 1970). Arquivos Arrow IPC em SIT_DIR_CACHE/visitantes, fora do despejo LRU
+# do armazém. Atualizações de processos diferentes (Streamlit e lote.py) são
+# serializadas por um flock no arquivo de trava; leituras tomam a trava compartilhada.
+
+BITS_DIA = 16
+_MASCARA_DIA = np.uint64((1 << BITS_DIA) - 1)
+
+FATOR_COMPACTACAO = 4
+DELTAS_MAXIMOS = 32
+
+@dataclass(frozen=True)
+class Fidelidade:
+    visitantes: int        # telefones distintos no histórico
+    recorrentes: int       # com mais de uma visita
+    visitas: int
+    primeira_visita: Optional[date] = None
+    ultima_visita: Optional[date] = None
+
+    @property
+    def taxa_retorno(self):
+        return self.recorrentes / self.visitantes if self.visitantes else 0.0
+
+    @property
+    def visitas_por_visitante(self):
+        return self.visitas / self.visitantes if self.visitantes else 0.0
+
+@dataclass(frozen=True)
+class TabelaTelefones:
+    # Ordenada por telefone, sem repetições
+    telefones: np.ndarray  # uint64, hash de 48 bits
+    primeira: np.ndarray   # int32, dias desde 1970-01-01
+    ultima: np.ndarray     # int32
+    visitas: np.ndarray    # uint32, dias distintos
+
+    def __len__(self):
+        return len(self.telefones)
+
+_VAZIA = TabelaTelefones(*(np.array([], dtype=t) for t in (np.uint64, np.int32, np.int32, np.uint32)))
+
+def _hash_telefones(telefones):
+    return pd.util.hash_array(np.asarray(telefones, dtype=object)) >> np.uint64(BITS_DIA)
+
+def visitas_da_carga(data_hora, telefones):
+    # Chaves (telefone, dia) distintas e ordenadas; telefones ausentes não contam
+    validos = telefones.notna().to_numpy()
+    hashes = _hash_telefones(telefones.to_numpy()[validos])
+    dias = data_hora.to_numpy()[validos].astype('datetime64[D]').astype(np.int64).astype(np.uint64)
+    return np.unique((hashes << np.uint64(BITS_DIA)) | (dias & _MASCARA_DIA))
+
+def novas_visitas(indice, visitas):
+    # Chaves (ordenadas) de visitas que ainda não estão no índice
+    pos = np.searchsorted(indice, visitas)
+    conhecida = pos < len(indice)
+    conhecida[conhecida] = indice[pos[conhecida]] == visitas[conhecida]
+    return visitas[~conhecida]
+
+def _dias(chaves):
+    return (chaves & _MASCARA_DIA).astype(np.int32)
+
+def por_telefone(visitas):
+    # Tabela das chaves ordenadas: as de um telefone são contíguas e em ordem de dia
+    telefones = visitas >> np.uint64(BITS_DIA)
+    inicios = np.flatnonzero(np.r_[True, telefones[1:] != telefones[:-1]])
+    fins = np.r_[inicios[1:], len(visitas)]
+    dias = _dias(visitas)
+    return TabelaTelefones(telefones[inicios], dias[inicios], dias[fins - 1], np.diff(np.r_[inicios, len(visitas)]).astype(np.uint32))
+
+def fundir(tabelas):
+    # Uma linha por telefone: menor primeira, maior última e soma das visitas (as
+    # visitas de cada tabela são dias diferentes, pela deduplicação do registro)
+    tabelas = [t for t in tabelas if len(t)]
+    if len(tabelas) <= 1:
+        return tabelas[0] if tabelas else _VAZIA
+    telefones = np.concatenate([t.telefones for t in tabelas])
+    ordem = np.argsort(telefones, kind='stable')
+    telefones = telefones[ordem]
+    inicios = np.flatnonzero(np.r_[True, telefones[1:] != telefones[:-1]])
+
+    def reduzir(campo, operacao):
+        return operacao.reduceat(np.concatenate([getattr(t, campo) for t in tabelas])[ordem], inicios)
+
+    return TabelaTelefones(telefones[inicios], reduzir('primeira', np.minimum), reduzir('ultima', np.maximum), reduzir('visitas', np.add))
+
+def resumir(tabela):
+    # Fidelidade de uma tabela de telefones, ou None se vazia
+    if not len(tabela):
+        return None
+    return Fidelidade(
+        visitantes=len(tabela),
+        recorrentes=int(np.count_nonzero(tabela.visitas > 1)),
+        visitas=int(tabela.visitas.sum(dtype=np.int64)),
+        primeira_visita=pd.Timestamp(np.datetime64(int(tabela.primeira.min()), 'D')).date(),
+        ultima_visita=pd.Timestamp(np.datetime64(int(tabela.ultima.max()), 'D')).date(),
+    )
+
+def _ler(caminho):
+    # Tabela Arrow mapeada do arquivo, ou None se ausente/ilegível
+    try:
+        return pa.ipc.open_file(pa.memory_map(caminho)).read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+def _linhas(caminho):
+    tabela = _ler(caminho)
+    return 0 if tabela is None else tabela.num_rows
+
+def _coluna(tabela, nome, tipo=None):
+    coluna = tabela.column(nome).combine_chunks()
+    return (coluna if tipo is None else coluna.cast(tipo)).to_numpy()
+
+class IndiceVisitantes:
+    def __init__(self, diretorio=None):
+        self.diretorio = diretorio
+        self._lock = threading.Lock()
+        self._resumo = None  # (identidade dos arquivos, Fidelidade)
+
+    @property
+    def ativo(self):
+        return bool(self.diretorio)
+
+    # --- registro de dias, particionado por mês ---
+    def _caminho_mes(self, mes):
+        return os.path.join(self.diretorio, 'dias', f'{mes}.arrow')
+
+    def _registrar_mes(self, mes, visitas):
+        # Grava as chaves ausentes da partição do mês e devolve só elas
+        tabela = _ler(self._caminho_mes(mes))
+        particao = np.array([], dtype=np.uint64) if tabela is None else _coluna(tabela, 'chave')
+        novas = novas_visitas(particao, visitas)
+        if len(novas):
+            chaves = np.insert(particao, np.searchsorted(particao, novas), novas)
+            os.makedirs(os.path.dirname(self._caminho_mes(mes)), exist_ok=True)
+            gravar_ipc(self._caminho_mes(mes), pa.table({'chave': pa.array(chaves, type=pa.uint64())}))
+        return novas
+
+    # --- tabela de telefones: principal + deltas ---
+    @property
+    def _caminho_tabela(self):
+        return os.path.join(self.diretorio, 'telefones.arrow')
+
+    def _deltas(self):
+        return sorted(glob.glob(os.path.join(self.diretorio, 'telefones.*[0-9].arrow')))
+
+    def _ler_tabela(self, caminho):
+        tabela = _ler(caminho)
+        if tabela is None:
+            return _VAZIA
+        return TabelaTelefones(
+            _coluna(tabela, 'telefone'),
+            _coluna(tabela, 'primeira', pa.int32()),
+            _coluna(tabela, 'ultima', pa.int32()),
+            _coluna(tabela, 'visitas'),
+        )
+
+    def _gravar_tabela(self, caminho, tabela):
+        gravar_ipc(caminho, pa.table({
+            'telefone': pa.array(tabela.telefones, type=pa.uint64()),
+            'primeira': pa.array(tabela.primeira, type=pa.int32()).cast(pa.date32()),
+            'ultima': pa.array(tabela.ultima, type=pa.int32()).cast(pa.date32()),
+            'visitas': pa.array(tabela.visitas, type=pa.uint32()),
+        }))
+
+    def _tabelas(self):
+        return [self._ler_tabela(self._caminho_tabela)] + [self._ler_tabela(c) for c in self._deltas()]
+
+    def _acrescentar(self, delta):
+        deltas = self._deltas()
+        sequencia = int(deltas[-1].rsplit('.', 2)[1]) + 1 if deltas else 1
+        deltas.append(os.path.join(self.diretorio, f'telefones.{sequencia:06d}.arrow'))
+        self._gravar_tabela(deltas[-1], delta)
+        linhas_deltas = sum(_linhas(c) for c in deltas)
+        if len(deltas) > DELTAS_MAXIMOS or linhas_deltas * FATOR_COMPACTACAO > _linhas(self._caminho_tabela):
+            self._gravar_tabela(self._caminho_tabela, fundir(self._tabelas()))
+            for caminho in deltas:
+                os.remove(caminho)
+
+    def _travar(self, modo):
+        os.makedirs(self.diretorio, exist_ok=True)
+        trava = open(os.path.join(self.diretorio, 'indice.lock'), 'w')
+        fcntl.flock(trava, modo)
+        return trava
+
+    def registrar(self, visitas):
+        # Junta ao índice as chaves de visitas_da_carga; devolve quantas eram novas
+        if not self.ativo or not len(visitas):
+            return 0
+        try:
+            with self._lock, self._travar(fcntl.LOCK_EX):
+                meses = _dias(visitas).astype('datetime64[D]').astype('datetime64[M]')
+                # Subconjuntos das chaves ordenadas continuam ordenados
+                novas = [self._registrar_mes(mes, visitas[meses == mes]) for mes in np.unique(meses)]
+                novas = np.sort(np.concatenate(novas))
+                if len(novas):
+                    self._acrescentar(por_telefone(novas))
+                return len(novas)
+        except OSError:
+            # Sem disco o painel continua; só a fidelidade deixa de ser atualizada
+            return 0
+
+    def resumo(self):
+        # Fidelidade do histórico acumulado (todas as cargas, sem filtros), ou None se
+        # não há índice; refeita só quando os arquivos da tabela mudam
+        if not self.ativo:
+            return None
+        try:
+            with self._travar(fcntl.LOCK_SH):
+                identidade = []
+                for caminho in [self._caminho_tabela] + self._deltas():
+                    if os.path.exists(caminho):
+                        info = os.stat(caminho)
+                        identidade.append((caminho, info.st_ino, info.st_mtime_ns, info.st_size))
+                identidade = tuple(identidade)
+                cache = self._resumo
+                if cache is not None and cache[0] == identidade:
+                    return cache[1]
+                fidelidade = resumir(fundir(self._tabelas()))
+        except OSError:
+            return None
+        self._resumo = (identidade, fidelidade)
+        return fidelidade
+
+    def historico(self, telefones):
+        # Primeira visita, última visita e visitas de cada telefone (E.164), na ordem
+        # recebida; NaT e 0 para telefones ausentes ou nunca vistos
+        telefones = pd.Series(telefones)
+        validos = telefones.notna().to_numpy()
+        hashes = _hash_telefones(telefones.to_numpy()[validos])
+        primeira = np.full(len(hashes), np.iinfo(np.int32).max, dtype=np.int32)
+        ultima = np.full(len(hashes), np.iinfo(np.int32).min, dtype=np.int32)
+        visitas = np.zeros(len(hashes), dtype=np.uint32)
+        if self.ativo and len(hashes):
+            try:
+                with self._travar(fcntl.LOCK_SH):
+                    tabelas = self._tabelas()
+            except OSError:
+                tabelas = []
+            for tabela in tabelas:
+                if not len(tabela):
+                    continue
+                pos = np.minimum(np.searchsorted(tabela.telefones, hashes), len(tabela) - 1)
+                achado = tabela.telefones[pos] == hashes
+                np.minimum(primeira, np.where(achado, tabela.primeira[pos], primeira), out=primeira)
+                np.maximum(ultima, np.where(achado, tabela.ultima[pos], ultima), out=ultima)
+                visitas += np.where(achado, tabela.visitas[pos], 0).astype(np.uint32)
+        vistos = visitas > 0
+
+        def datas(dias):
+            saida = np.full(len(telefones), np.datetime64('NaT'), dtype='datetime64[ns]')
+            saida[np.flatnonzero(validos)[vistos]] = dias[vistos].astype('datetime64[D]')
+            return saida
+
+        contagem = np.zeros(len(telefones), dtype=np.int64)
+        contagem[validos] = visitas
+        return pd.DataFrame({
+            'Primeira_Visita': datas(primeira),
+            'Ultima_Visita': datas(ultima),
+            'Visitas': contagem,
+        }, index=telefones.index)
+
+INDICE = IndiceVisitantes(os.path.join(config.DIR_CACHE, 'visitantes') if config.DIR_CACHE else None)
@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# FILTROS INDEXADOS
+# ==========================================
+# O frame processado vem ordenado por Data_Hora (ver pipeline.processar), então o
+# período vira uma fatia por searchsorted. Tipologias têm um bitmap pré-calculado
+# por categoria; cidades são testadas por pertinência do código categórico. Todos
+# os filtros são combinados numa única máscara, sem cópias intermediárias do frame.
+
+# Até este número de cidades, comparações por igualdade saem mais baratas que o gather
+LIMITE_COMPARACOES = 8
+
+@dataclass(frozen=True)
+class Filtros:
+    inicio: Optional[date] = None
+    fim: Optional[date] = None
+    cidades: tuple = ()
+    grupos: tuple = ()
+    apenas_estrangeiros: bool = False
+
+@dataclass(frozen=True)
+class IndiceFiltros:
+    data_hora: np.ndarray
+    cidades: pd.Index
+    codigos_cidade: np.ndarray
+    grupos: pd.Index
+    bitmaps_grupo: tuple
+    estrangeiro: np.ndarray
+
+    def __len__(self):
+        return len(self.data_hora)
+
+    def bytes_em_heap(self):
+        return bytes_proprios(self.data_hora, self.codigos_cidade, self.estrangeiro, *self.bitmaps_grupo)
+
+def bytes_proprios(*vetores):
+    # Só vetores com buffer próprio: views de colunas do frame já contam no frame, e
+    # as do arquivo mapeado do armazém estão no page cache
+    return int(sum(v.nbytes for v in vetores if v.base is None))
+
+def _codificar(serie):
+    codigos, categorias = pd.factorize(serie, sort=True)
+    tipo = np.int8 if len(categorias) < 127 else np.int16 if len(categorias) < 32767 else np.int32
+    return codigos.astype(tipo), pd.Index(categorias)
+
+def construir_indice(df, coluna_tempo='Data_Hora'):
+    data_hora = df[coluna_tempo].to_numpy()
+    if len(data_hora) > 1 and not (data_hora[1:] >= data_hora[:-1]).all():
+        raise ValueError(f"O índice de filtros exige o frame ordenado por {coluna_tempo}")
+    codigos_cidade, cidades = _codificar(df['Cidade_Limpa'])
+    codigos_grupo, grupos = _codificar(df['Tipo_Grupo'])
+    bitmaps_grupo = tuple(codigos_grupo == i for i in range(len(grupos)))
+    estrangeiro = df['Estrangeiro'].to_numpy(dtype=bool)
+    for arr in (data_hora, codigos_cidade, estrangeiro) + bitmaps_grupo:
+        arr.flags.writeable = False
+    return IndiceFiltros(data_hora, cidades, codigos_cidade, grupos, bitmaps_grupo, estrangeiro)
+
+def _limite(indice, dia, lado):
+    valor = np.datetime64(dia, 'D').astype(indice.data_hora.dtype)
+    return int(np.searchsorted(indice.data_hora, valor, side=lado))
+
+def _pertence(codigos, categorias, selecionadas):
+    posicoes = categorias.get_indexer(list(selecionadas))
+    posicoes = posicoes[posicoes >= 0]
+    if len(posicoes) <= LIMITE_COMPARACOES:
+        mascara = np.zeros(len(codigos), dtype=bool)
+        for p in posicoes:
+            mascara |= codigos == p
+        return mascara
+    # Bitmap sobre o dicionário de categorias; código -1 (ausente) lê a última posição, sempre False
+    bitmap = np.zeros(len(categorias) + 1, dtype=bool)
+    bitmap[posicoes] = True
+    return bitmap.take(codigos)
+
+def _uniao(bitmaps, categorias, selecionadas, ini, fim):
+    mascara = np.zeros(fim - ini, dtype=bool)
+    for p in categorias.get_indexer(list(selecionadas)):
+        if p >= 0:
+            mascara |= bitmaps[p][ini:fim]
+    return mascara
+
+def selecionar(indice, filtros):
+    # Retorna um slice (sem filtros de atributo) ou as posições das linhas selecionadas
+    ini, fim = 0, len(indice)
+    if filtros.inicio is not None:
+        ini = _limite(indice, filtros.inicio, 'left')
+    if filtros.fim is not None:
+        fim = _limite(indice, np.datetime64(filtros.fim, 'D') + 1, 'left')
+    fim = max(ini, fim)
+
+    mascara = None
+    if filtros.cidades:
+        mascara = _pertence(indice.codigos_cidade[ini:fim], indice.cidades, filtros.cidades)
+    if filtros.grupos:
+        m = _uniao(indice.bitmaps_grupo, indice.grupos, filtros.grupos, ini, fim)
+        mascara = m if mascara is None else np.logical_and(mascara, m, out=mascara)
+    if filtros.apenas_estrangeiros:
+        m = indice.estrangeiro[ini:fim]
+        mascara = m.copy() if mascara is None else np.logical_and(mascara, m, out=mascara)
+
+    if mascara is None:
+        return slice(ini, fim)
+    return ini + np.flatnonzero(mascara)
+
+def aplicar_filtros(df, indice, filtros):
+    return df.iloc[selecionar(indice, filtros)]
@@ -0,0 +1,154 @@
+import io
+from contextlib import contextmanager
+
+import matplotlib.dates as mdates
+import seaborn as sns
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# ==========================================
+# RENDERIZAÇÃO DOS GRÁFICOS (PNG)
+# ==========================================
+# Cada gráfico recebe os Agregados e devolve o PNG pronto para exibição, o que
+# permite servi-lo do cache (ver cache_graficos.py) sem tocar no matplotlib.
+# Nada aqui usa pyplot nem altera rcParams: cada figura é um Figure explícito
+# com canvas Agg, recebe o tema diretamente nos seus Axes e é limpa ao final,
+# então sessões em threads diferentes podem renderizar ao mesmo tempo.
+
+TEMA = 'civic-dark'
+VERSAO_GRAFICOS = 5
+
+# Paleta "Civic Dark" (mesma do CSS do app)
+COR_FUNDO = '#161B22'
+COR_TEXTO = '#F9FAFB'
+COR_SECUNDARIA = '#9CA3AF'
+COR_GRADE = '#30363D'
+COR_APAGADA = '#4B5563'
+
+def _estilizar(ax):
+    ax.set_facecolor(COR_FUNDO)
+    ax.tick_params(colors=COR_SECUNDARIA, labelsize=11)
+    ax.xaxis.label.set_color(COR_SECUNDARIA)
+    ax.yaxis.label.set_color(COR_SECUNDARIA)
+    for spine in ax.spines.values():
+        spine.set_color(COR_GRADE)
+
+def _titulo(ax, texto):
+    ax.set_title(texto, fontweight='bold', fontsize=12, color=COR_TEXTO)
+
+@contextmanager
+def _figura(figsize, nrows=1, ncols=1, **kwargs):
+    fig = Figure(figsize=figsize, facecolor=COR_FUNDO)
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(nrows, ncols, squeeze=False, **kwargs)
+    for ax in axes.flat:
+        _estilizar(ax)
+    try:
+        yield fig, axes
+    finally:
+        fig.clear()
+
+def _png(fig):
+    # Mesmos parâmetros que o st.pyplot usa por padrão
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight', dpi=200)
+    return buf.getvalue()
+
+def _pizza(ax, valores, rotulos, cores, **kwargs):
+    ax.pie(valores, labels=rotulos, autopct='%1.1f%%', colors=cores, startangle=90,
+           textprops={'color': COR_TEXTO}, **kwargs)
+
+def _barras_horizontais(ax, serie, paleta):
+    sns.barplot(x=serie.values, y=serie.index.astype(str), hue=serie.index.astype(str), palette=paleta, legend=False, ax=ax)
+
+# --- Visão Estratégica: seis painéis independentes, exibidos em grade 2 x 3 ---
+TAMANHO_PAINEL = (7.3, 6.5)
+
+# Acima disto a série vira só linha: marcadores por ponto não se distinguem mais
+LIMITE_MARCADORES = 60
+
+def segmentacao_etaria(ag):
+    with _figura(TAMANHO_PAINEL) as (fig, axes):
+        ax = axes[0, 0]
+        _pizza(ax, [ag.total_adultos, ag.total_criancas], ['Adultos', 'Crianças'], ['#1D4ED8', '#EAB308'], explode=(0.05, 0))
+        _titulo(ax, 'Segmentação Etária')
+        return _png(fig)
+
+def tipologia(ag):
+    with _figura(TAMANHO_PAINEL) as (fig, axes):
+        ax = axes[0, 0]
+        _pizza(ax, ag.tipologia.values, ag.tipologia.index, ['#10B981', '#6366F1'])
+        _titulo(ax, 'Tipologia dos Visitantes')
+        return _png(fig)
+
+def tendencia_diaria(ag):
+    tendencia = ag.tendencia
+    with _figura(TAMANHO_PAINEL) as (fig, axes):
+        ax = axes[0, 0]
+        serie = tendencia.serie
+        marcador = 'o' if len(serie) <= LIMITE_MARCADORES else None
+        ax.plot(serie.index, serie.values, marker=marcador, color='#EAB308', linewidth=2.5, label='Visitantes')
+        ax.plot(tendencia.media_movel.index, tendencia.media_movel.values, color=COR_SECUNDARIA, linewidth=1.5,
+                linestyle='--', label=f'Média móvel ({tendencia.janela})')
+        localizador = mdates.AutoDateLocator()
+        ax.xaxis.set_major_locator(localizador)
+        ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(localizador))
+        ax.set_xlabel('Data')
+        ax.legend(facecolor=COR_FUNDO, edgecolor=COR_GRADE, labelcolor=COR_SECUNDARIA)
+        _titulo(ax, f'Tendência {tendencia.granularidade}')
+        ax.grid(True, alpha=0.1, color=COR_GRADE)
+        return _png(fig)
+
+def media_dia_semana(ag):
+    with _figura(TAMANHO_PAINEL) as (fig, axes):
+        ax = axes[0, 0]
+        dias = ag.media_dia_semana.index.astype(str)
+        sns.barplot(x=dias, y=ag.media_dia_semana.values, hue=dias, palette="rocket", legend=False, ax=ax)
+        _titulo(ax, 'Média por Dia da Semana')
+        return _png(fig)
+
+def top_cidades(ag):
+    with _figura(TAMANHO_PAINEL) as (fig, axes):
+        ax = axes[0, 0]
+        _barras_horizontais(ax, ag.top_cidades, "mako")
+        _titulo(ax, 'Top 10 Municípios de Origem')
+        return _png(fig)
+
+def origens_internacionais(ag):
+    with _figura(TAMANHO_PAINEL) as (fig, axes):
+        ax = axes[0, 0]
+        if ag.total_estrangeiros > 0:
+            _barras_horizontais(ax, ag.top_estrangeiros, "flare")
+            _titulo(ax, 'Origens Internacionais')
+        else:
+            ax.text(0.5, 0.5, "Sem registros internacionais", ha='center', va='center', color=COR_APAGADA)
+            ax.axis('off')
+        return _png(fig)
+
+# --- Análise Tática ---
+def matriz_calor(ag):
+    with _figura((20, 6)) as (fig, axes):
+        ax7 = axes[0, 0]
+        # Heatmap Dark Mode: Magma ou Inferno scale funciona melhor no escuro
+        sns.heatmap(ag.calor, cmap="inferno", annot=True, fmt='g', linewidths=.5, linecolor=COR_FUNDO, ax=ax7)
+        ax7.collections[0].colorbar.ax.tick_params(colors=COR_SECUNDARIA)
+        _titulo(ax7, 'Matriz de Calor Operacional')
+        return _png(fig)
+
+def demografia(ag):
+    with _figura((10, 6)) as (fig, axes):
+        ax8 = axes[0, 0]
+        _barras_horizontais(ax8, ag.faixas.drop('Não Informado'), "viridis")
+        for container in ax8.containers: ax8.bar_label(container, padding=5, color=COR_TEXTO)
+        _titulo(ax8, 'Demografia Detalhada')
+        return _png(fig)
+
+def tamanho_grupo(ag):
+    with _figura((10, 6)) as (fig, axes):
+        ax9 = axes[0, 0]
+        tamanhos = ag.tamanhos_grupo
+        sns.histplot(x=tamanhos.index, weights=tamanhos.values, discrete=True, color="#1D4ED8", ax=ax9, alpha=0.6)
+        # Curva de densidade pré-calculada sobre as contagens (ver agregacao._kde_contagens)
+        ax9.plot(ag.kde_tamanhos.index, ag.kde_tamanhos.values, color="#1D4ED8")
+        _titulo(ax9, 'Distribuição de Tamanho de Grupo')
+        return _png(fig)
@@ -0,0 +1,125 @@
+import altair as alt
+import pandas as pd
+
+from graficos import COR_APAGADA, COR_FUNDO, COR_GRADE, COR_SECUNDARIA, COR_TEXTO, LIMITE_MARCADORES
+from pipeline import DIAS_SEMANA
+
+# ==========================================
+# GRÁFICOS INTERATIVOS (VEGA-LITE / ALTAIR)
+# ==========================================
+# Modo alternativo aos PNGs: só as séries agregadas (alguns KB de JSON) vão para
+# o navegador, que desenha os gráficos. Tooltips, zoom e filtro pela legenda
+# acontecem no cliente, sem rerun e sem CPU do servidor.
+
+ALTURA_PAINEL = 320
+
+def _tema(grafico, titulo):
+    return (
+        grafico.properties(title=titulo, background=COR_FUNDO, height=ALTURA_PAINEL)
+        .configure_view(strokeWidth=0)
+        .configure_title(color=COR_TEXTO, fontWeight='bold', anchor='middle')
+        .configure_axis(labelColor=COR_SECUNDARIA, titleColor=COR_SECUNDARIA, gridColor=COR_GRADE, domainColor=COR_GRADE)
+        .configure_legend(labelColor=COR_SECUNDARIA, titleColor=COR_SECUNDARIA)
+    )
+
+def _serie(serie, coluna):
+    return serie.rename(coluna).rename_axis(serie.index.name or 'Categoria').reset_index()
+
+def _pizza(dados, campo, valor, cores, titulo):
+    legenda = alt.selection_point(fields=[campo], bind='legend')
+    grafico = alt.Chart(dados).mark_arc(innerRadius=40).encode(
+        theta=alt.Theta(f'{valor}:Q'),
+        color=alt.Color(f'{campo}:N', scale=alt.Scale(range=cores)),
+        opacity=alt.condition(legenda, alt.value(1), alt.value(0.2)),
+        tooltip=[f'{campo}:N', alt.Tooltip(f'{valor}:Q', format=',')],
+    ).add_params(legenda)
+    return _tema(grafico, titulo)
+
+def _barras(serie, valor, paleta, titulo, horizontal=True, ordenar='-x'):
+    dados = _serie(serie, valor)
+    categoria = dados.columns[0]
+    eixo_cat = alt.Y(f'{categoria}:N', sort=ordenar, title=None) if horizontal else alt.X(f'{categoria}:N', sort=list(dados[categoria]), title=None)
+    eixo_val = alt.X(f'{valor}:Q') if horizontal else alt.Y(f'{valor}:Q')
+    grafico = alt.Chart(dados).mark_bar().encode(
+        eixo_cat, eixo_val,
+        color=alt.Color(f'{categoria}:N', scale=alt.Scale(scheme=paleta), legend=None),
+        tooltip=[f'{categoria}:N', alt.Tooltip(f'{valor}:Q', format=',.1f' if dados[valor].dtype.kind == 'f' else ',')],
+    )
+    return _tema(grafico, titulo)
+
+def segmentacao_etaria(ag):
+    dados = pd.DataFrame({'Público': ['Adultos', 'Crianças'], 'Visitantes': [ag.total_adultos, ag.total_criancas]})
+    return _pizza(dados, 'Público', 'Visitantes', ['#1D4ED8', '#EAB308'], 'Segmentação Etária')
+
+def tipologia(ag):
+    return _pizza(_serie(ag.tipologia, 'Registros'), 'Tipo_Grupo', 'Registros', ['#10B981', '#6366F1'], 'Tipologia dos Visitantes')
+
+def tendencia_diaria(ag):
+    tendencia = ag.tendencia
+    dados = pd.DataFrame({'Visitantes': tendencia.serie, 'Média móvel': tendencia.media_movel}).rename_axis('Data').reset_index()
+    formato = '%d/%m/%Y' if tendencia.granularidade != 'Mensal' else '%m/%Y'
+    zoom = alt.selection_interval(encodings=['x'], bind='scales')
+    base = alt.Chart(dados).encode(x=alt.X('Data:T'))
+    linha = base.mark_line(point=len(dados) <= LIMITE_MARCADORES, color='#EAB308', strokeWidth=2.5).encode(
+        y=alt.Y('Visitantes:Q'),
+        tooltip=[alt.Tooltip('Data:T', format=formato), alt.Tooltip('Visitantes:Q', format=','),
+                 alt.Tooltip('Média móvel:Q', format=',.1f', title=f'Média móvel ({tendencia.janela})')],
+    ).add_params(zoom)
+    media = base.mark_line(color=COR_SECUNDARIA, strokeWidth=1.5, strokeDash=[6, 4]).encode(y='Média móvel:Q')
+    return _tema(linha + media, f'Tendência {tendencia.granularidade}')
+
+def media_dia_semana(ag):
+    return _barras(ag.media_dia_semana, 'Média', 'magma', 'Média por Dia da Semana', horizontal=False)
+
+def top_cidades(ag):
+    return _barras(ag.top_cidades, 'Registros', 'tealblues', 'Top 10 Municípios de Origem')
+
+def origens_internacionais(ag):
+    if ag.total_estrangeiros == 0:
+        aviso = alt.Chart(pd.DataFrame({'texto': ["Sem registros internacionais"]})).mark_text(color=COR_APAGADA, fontSize=14).encode(text='texto:N')
+        return _tema(aviso, 'Origens Internacionais')
+    return _barras(ag.top_estrangeiros, 'Registros', 'orangered', 'Origens Internacionais')
+
+def matriz_calor(ag):
+    dados = ag.calor.rename_axis(index='Dia_Semana', columns='Hora').stack().rename('Visitantes').reset_index()
+    base = alt.Chart(dados).encode(
+        x=alt.X('Hora:O'), y=alt.Y('Dia_Semana:N', sort=DIAS_SEMANA, title=None),
+    )
+    celulas = base.mark_rect().encode(
+        color=alt.Color('Visitantes:Q', scale=alt.Scale(scheme='inferno')),
+        tooltip=['Dia_Semana:N', 'Hora:O', alt.Tooltip('Visitantes:Q', format=',')],
+    )
+    rotulos = base.mark_text(fontSize=10).encode(
+        text='Visitantes:Q',
+        color=alt.condition(alt.datum.Visitantes > dados['Visitantes'].max() / 2, alt.value('black'), alt.value('white')),
+    )
+    return _tema(celulas + rotulos, 'Matriz de Calor Operacional')
+
+def demografia(ag):
+    return _barras(ag.faixas.drop('Não Informado'), 'Registros', 'viridis', 'Demografia Detalhada', ordenar=None)
+
+def tamanho_grupo(ag):
+    dados = _serie(ag.tamanhos_grupo, 'Registros')
+    # Barras de largura 1 centradas em cada tamanho, no mesmo eixo contínuo da curva
+    barras = alt.Chart(dados).transform_calculate(
+        ini='datum.Total_Visitantes_Linha - 0.5', fim='datum.Total_Visitantes_Linha + 0.5',
+    ).mark_bar(color='#1D4ED8', opacity=0.6).encode(
+        x=alt.X('ini:Q', title='Tamanho do grupo'), x2='fim:Q', y=alt.Y('Registros:Q'),
+        tooltip=[alt.Tooltip('Total_Visitantes_Linha:Q', title='Tamanho do grupo'), alt.Tooltip('Registros:Q', format=',')],
+    )
+    curva = alt.Chart(_serie(ag.kde_tamanhos, 'Densidade')).mark_line(color='#1D4ED8').encode(
+        x='Total_Visitantes_Linha:Q', y='Densidade:Q',
+    )
+    return _tema(barras + curva, 'Distribuição de Tamanho de Grupo')
+
+PAINEIS = {
+    'segmentacao_etaria': segmentacao_etaria,
+    'tipologia': tipologia,
+    'tendencia_diaria': tendencia_diaria,
+    'media_dia_semana': media_dia_semana,
+    'top_cidades': top_cidades,
+    'origens_internacionais': origens_internacionais,
+    'matriz_calor': matriz_calor,
+    'demografia': demografia,
+    'tamanho_grupo': tamanho_grupo,
+}
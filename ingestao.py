@@ -0,0 +1,117 @@
+import hashlib
+import io
+import os
+
+import pandas as pd
+
+import armazem
+import parciais
+from fidelidade import INDICE, visitas_da_carga
+from consultas import ConsultasPandas
+from pipeline import padronizar_colunas, processar_dataset
+from registro import REGISTRO
+
+# ==========================================
+# INGESTÃO DOS UPLOADS
+# ==========================================
+# Leitura das planilhas e pipeline de sanitização como uma única tarefa (ver
+# tarefas.py). Recebe o conteúdo já copiado dos uploads (nome, bytes), então
+# não toca em objetos do Streamlit fora da thread do script. O frame processado
+# vai para o armazém em disco (armazem.py) e para o registro compartilhado do
+# processo (registro.py); os telefones atualizam o índice de visitantes
+# (fidelidade.py). Também usado pelo processamento em lote (lote.py).
+
+# Parte da barra de progresso reservada à leitura dos arquivos; o restante é do pipeline
+PESO_LEITURA = 0.3
+
+def ler_arquivo(nome, conteudo):
+    if nome.endswith('.csv'):
+        try: df = pd.read_csv(io.BytesIO(conteudo))
+        except: df = pd.read_csv(io.BytesIO(conteudo), encoding='latin1', sep=';')
+    else:
+        df = pd.read_excel(io.BytesIO(conteudo))
+
+    return padronizar_colunas(df)
+
+def versao_arquivos(arquivos):
+    # Versão do dataset: hash dos nomes e do conteúdo dos arquivos carregados
+    h = hashlib.sha1()
+    for nome, conteudo in arquivos:
+        h.update(nome.encode('utf-8'))
+        h.update(conteudo)
+    return h.hexdigest()
+
+def versao_caminhos(caminhos, tamanho_leitura=1 << 20):
+    # Mesmo hash de versao_arquivos para arquivos em disco, lidos em partes (nome = nome do arquivo)
+    h = hashlib.sha1()
+    for caminho in caminhos:
+        h.update(os.path.basename(caminho).encode('utf-8'))
+        with open(caminho, 'rb') as f:
+            while parte := f.read(tamanho_leitura):
+                h.update(parte)
+    return h.hexdigest()
+
+def processar_arquivos(versao_dados, arquivos, informar):
+    # Devolve (frame processado ou None, erros por arquivo); informar(etapa, fração) a cada passo
+    dataframes, erros = [], []
+    for i, (nome, conteudo) in enumerate(arquivos):
+        informar(f"Lendo {nome}", PESO_LEITURA * i / len(arquivos))
+        try:
+            df = ler_arquivo(nome, conteudo)
+            if df is not None:
+                dataframes.append(df)
+        except Exception as e:
+            erros.append(f"Erro no arquivo {nome}: {e}")
+
+    if not dataframes:
+        return None, erros
+
+    informar("Consolidando registros", PESO_LEITURA)
+    df_raw = pd.concat(dataframes, ignore_index=True)
+
+    def progresso(etapa, concluidas, total):
+        informar(f"Sanitizando: {etapa}", PESO_LEITURA + (1 - PESO_LEITURA) * concluidas / total)
+
+    df = processar_dataset(df_raw, progresso)
+    informar("Atualizando índice de visitantes", 1.0)
+    INDICE.registrar(visitas_da_carga(df['Data_Hora'], df['Telefone']))
+    informar("Gravando no armazém", 1.0)
+    return armazem.guardar_dataset(versao_dados, df), erros
+
+def abrir_dataset(versao_dados):
+    # Referência a um dataset já processado: registro do processo ou armazém em disco
+    referencia = REGISTRO.abrir(versao_dados)
+    if referencia is None:
+        df = armazem.abrir_dataset(versao_dados)
+        if df is not None:
+            referencia = REGISTRO.registrar(versao_dados, df)
+    return referencia
+
+def carregar(tarefa, versao_dados, arquivos):
+    # Tarefa de segundo plano: devolve (Referencia ao dataset registrado ou None, erros por arquivo)
+    df, erros = processar_arquivos(versao_dados, arquivos, tarefa.informar)
+    return (None if df is None else REGISTRO.registrar(versao_dados, df)), erros
+
+def abrir_agregados(versao_dados):
+    # Consultas sobre os cubos e esboços já gravados no armazém (sem registros), ou None
+    cubos, esbocos = armazem.abrir_cubos(versao_dados, agregados=True), armazem.abrir_esbocos(versao_dados)
+    if cubos is None or esbocos is None:
+        return None
+    return ConsultasPandas(None, cubos=cubos, esbocos=esbocos)
+
+def agregar_em_blocos(versao_dados, fontes, informar, linhas=None):
+    # fontes: [(nome, abrir)] (ver parciais.agregar_arquivos). Devolve (ConsultasPandas sobre os cubos ou None, erros)
+    # Os pares telefone x dia entram no índice de visitantes bloco a bloco
+    parcial, erros = parciais.agregar_arquivos(fontes, informar, linhas, INDICE.registrar)
+    if parcial is None:
+        return None, erros
+    informar("Consolidando agregados", 1.0)
+    cubos = parciais.consolidar(parcial)
+    armazem.guardar_cubos(versao_dados, cubos, agregados=True)
+    armazem.guardar_esbocos(versao_dados, parcial.esbocos)
+    return ConsultasPandas(None, cubos=cubos, esbocos=parcial.esbocos), erros
+
+def agregar(tarefa, versao_dados, arquivos):
+    # Tarefa do modo só agregados sobre o conteúdo dos uploads
+    fontes = [(nome, lambda conteudo=conteudo: io.BytesIO(conteudo)) for nome, conteudo in arquivos]
+    return agregar_em_blocos(versao_dados, fontes, tarefa.informar)
@@ -0,0 +1,103 @@
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import armazem
+from consultas import abrir_consultas
+from exportacao import FORMATOS
+from filtros import Filtros
+from ingestao import abrir_agregados, agregar_em_blocos, processar_arquivos, versao_caminhos
+
+# ==========================================
+# PROCESSAMENTO EM LOTE (CLI)
+# ==========================================
+# Mesmo caminho do painel sem o Streamlit: lê as planilhas, processa (ou mapeia
+# do armazém, se algum processo já processou o mesmo conteúdo), aplica os
+# filtros e grava o arquivo no formato pedido pela extensão da saída.
+# Com --so-agregados os arquivos são lidos em blocos e reduzidos aos cubos (ver
+# parciais.py), para históricos maiores que a memória; a saída é o resumo .xlsx.
+#   python lote.py visitas_2024.xlsx visitas_2025.csv --saida relatorio.xlsx --inicio 2025-01-01
+
+def _formato(caminho):
+    # Extensão mais longa primeiro: .csv.gz antes de .csv
+    for nome, f in sorted(FORMATOS.items(), key=lambda item: -len(item[1].extensao)):
+        if caminho.endswith(f.extensao):
+            return nome
+    raise ValueError(f"Formato de saída não reconhecido: {caminho} (extensões: {', '.join(f.extensao for f in FORMATOS.values())})")
+
+def _informar(etapa, fracao):
+    print(f"[{fracao:4.0%}] {etapa}", file=sys.stderr, flush=True)
+
+def _abrir_dataset(caminhos, versao_dados):
+    df = armazem.abrir_dataset(versao_dados)
+    if df is None:
+        arquivos = []
+        for caminho in caminhos:
+            with open(caminho, 'rb') as f:
+                arquivos.append((os.path.basename(caminho), f.read()))
+        df, erros = processar_arquivos(versao_dados, arquivos, _informar)
+        for erro in erros:
+            print(erro, file=sys.stderr)
+    return df
+
+def _abrir_agregados(caminhos, versao_dados, linhas):
+    # Fora da memória: os arquivos são lidos em blocos direto do disco (ver parciais.py)
+    consultas = abrir_agregados(versao_dados)
+    if consultas is None:
+        fontes = [(os.path.basename(c), lambda c=c: open(c, 'rb')) for c in caminhos]
+        consultas, erros = agregar_em_blocos(versao_dados, fontes, _informar, linhas)
+        for erro in erros:
+            print(erro, file=sys.stderr)
+    return consultas
+
+def executar(caminhos, saida, filtros, so_agregados=False, linhas=None):
+    formato = _formato(saida)
+    if so_agregados and formato != 'xlsx':
+        raise ValueError("No modo só agregados a saída é o resumo .xlsx (não há registros para exportar)")
+    versao_dados = versao_caminhos(caminhos)
+
+    t = time.perf_counter()
+    if so_agregados:
+        df, indice = None, None
+        consultas = _abrir_agregados(caminhos, versao_dados, linhas)
+        if consultas is None:
+            raise SystemExit("Nenhuma planilha válida.")
+        print(f"Dataset {versao_dados[:12]}: {len(consultas.cubo):,} células em {time.perf_counter() - t:.2f} s", file=sys.stderr)
+    else:
+        df = _abrir_dataset(caminhos, versao_dados)
+        if df is None:
+            raise SystemExit("Nenhuma planilha válida.")
+        print(f"Dataset {versao_dados[:12]}: {len(df):,} registros em {time.perf_counter() - t:.2f} s", file=sys.stderr)
+        indice = armazem.obter_indice(versao_dados, df)
+        consultas = abrir_consultas(df, versao_dados=versao_dados)
+
+    ag = consultas.agregados(filtros)
+    with open(saida, 'wb') as arquivo:
+        FORMATOS[formato].escrever(df, indice, filtros, ag, arquivo)
+    return ag
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Processa planilhas de visitantes e exporta o resultado filtrado.")
+    parser.add_argument('planilhas', nargs='+')
+    parser.add_argument('--saida', required=True, help="arquivo de saída (.csv, .csv.gz, .csv.zst, .parquet ou .xlsx)")
+    parser.add_argument('--inicio', type=date.fromisoformat)
+    parser.add_argument('--fim', type=date.fromisoformat)
+    parser.add_argument('--cidade', action='append', default=[])
+    parser.add_argument('--grupo', action='append', default=[])
+    parser.add_argument('--estrangeiros', action='store_true')
+    parser.add_argument('--so-agregados', action='store_true', help="lê em blocos e guarda só os cubos (arquivos maiores que a memória)")
+    parser.add_argument('--linhas-por-bloco', type=int, help="linhas por bloco no modo só agregados")
+    args = parser.parse_args()
+
+    filtros = Filtros(
+        inicio=args.inicio,
+        fim=args.fim,
+        cidades=tuple(sorted(args.cidade)),
+        grupos=tuple(sorted(args.grupo)),
+        apenas_estrangeiros=args.estrangeiros,
+    )
+    ag = executar(args.planilhas, args.saida, filtros, args.so_agregados, args.linhas_por_bloco)
+    print(f"Fluxo Total: {ag.total_visitantes:,} | Adultos: {ag.total_adultos:,} | "
+          f"Crianças: {ag.total_criancas:,} | Internacionais: {ag.total_estrangeiros:,}")
@@ -0,0 +1,203 @@
+import itertools
+from dataclasses import dataclass, replace
+
+import openpyxl
+import pandas as pd
+
+import config
+from cubo import DIMENSOES, DIMENSOES_GRUPOS, agregar_celulas, cubo_de_celulas, somar_celulas
+from esbocos import EsbocosDiarios, combinar_esbocos, esbocos_diarios
+from fidelidade import visitas_da_carga
+from pipeline import (
+    ETAPAS, GRUPO_FAMILIA, GRUPO_INDIVIDUAL, LIMITE_CRIANCAS, OUTRAS_ORIGENS,
+    padronizar_colunas, process_criancas, processar,
+)
+from tarefas import Cancelada
+
+# ==========================================
+# AGREGAÇÃO FORA DA MEMÓRIA (MAP-REDUCE)
+# ==========================================
+# Para arquivos maiores que a RAM: cada planilha é lida em blocos, cada bloco
+# passa pelo pipeline e é reduzido a uma Parcial (células dos dois cubos e
+# esboços diários de telefones e idades, ver esbocos.py), e as parciais são
+# somadas à medida que chegam. Os pares telefone x dia de cada bloco vão direto
+# para o índice de visitantes (fidelidade.py), que lê só os meses do bloco e
+# descarta os pares já vistos: nada deles fica na parcial. Nenhuma linha bruta sobrevive ao bloco: a memória fica limitada
+# pelo bloco mais o tamanho das células.
+#
+# A única regra global do pipeline é a troca das crianças acima de
+# LIMITE_CRIANCAS pela média do dataset inteiro. No bloco essas linhas entram
+# marcadas (dimensão Acima_Limite) e sem crianças, e a parcial acumula soma e
+# contagem das demais; consolidar aplica a média final às células marcadas. O
+# resultado é idêntico ao cubo do frame processado de uma vez.
+#
+# As origens são texto livre: além das cidades conhecidas, cada grafia que o
+# fuzzy não reconhece vira uma cidade, e a cauda cresce com o histórico. Cada
+# parcial guarda no máximo CAPACIDADE_ORIGENS cidades, as de mais adultos; as
+# demais são somadas em OUTRAS_ORIGENS, como num resumo de heavy hitters
+# combinável (Misra-Gries/Space-Saving): a cada corte, a maior contagem
+# descartada entra no erro_origens, limite de quanto qualquer cidade pode estar
+# abaixo do real. Com menos origens que a capacidade nada muda e o erro é zero.
+
+DIMENSOES_PARCIAL = DIMENSOES + ('Acima_Limite',)
+DIMENSOES_GRUPOS_PARCIAL = DIMENSOES_GRUPOS + ('Acima_Limite',)
+
+@dataclass(frozen=True)
+class Parcial:
+    celulas: pd.DataFrame          # DIMENSOES_PARCIAL + medidas
+    celulas_grupos: pd.DataFrame   # DIMENSOES_GRUPOS_PARCIAL + medidas
+    soma_criancas: int             # crianças nas linhas dentro do limite
+    linhas_no_limite: int
+    esbocos: EsbocosDiarios        # telefones distintos e idades por dia
+    erro_origens: int = 0          # adultos que uma cidade pode ter perdido para OUTRAS_ORIGENS
+
+def _etapa_criancas_bruta(df):
+    return df['Qtd_Criancas'].apply(process_criancas)
+
+# Pipeline do bloco: crianças só convertidas; a troca dos valores acima do limite fica para consolidar
+ETAPAS_BLOCO = [replace(e, funcao=_etapa_criancas_bruta) if e.nome == 'Qtd_Criancas' else e for e in ETAPAS]
+
+def _celulas(df, dimensoes):
+    # Texto em vez de categorias: blocos diferentes têm dicionários diferentes
+    return agregar_celulas(df, dimensoes).astype({'Cidade_Limpa': 'str', 'Tipo_Grupo': 'str'})
+
+def limitar_origens(parcial, capacidade=None):
+    # Mantém as `capacidade` cidades com mais adultos; as outras viram OUTRAS_ORIGENS nas duas tabelas
+    capacidade = capacidade or config.CAPACIDADE_ORIGENS
+    adultos = parcial.celulas.groupby('Cidade_Limpa', sort=False)['Adultos'].sum()
+    if len(adultos) <= capacidade:
+        return parcial
+    ordem = adultos.sort_values(ascending=False, kind='stable')
+    mantidas = ordem.index[:capacidade]
+    descartadas = ordem.iloc[capacidade:]
+    descartadas = descartadas[descartadas.index != OUTRAS_ORIGENS]
+
+    def agrupar(celulas, dimensoes):
+        cidade = celulas['Cidade_Limpa'].where(celulas['Cidade_Limpa'].isin(mantidas), OUTRAS_ORIGENS)
+        return somar_celulas(celulas.assign(Cidade_Limpa=cidade), dimensoes)
+
+    return replace(
+        parcial,
+        celulas=agrupar(parcial.celulas, DIMENSOES_PARCIAL),
+        celulas_grupos=agrupar(parcial.celulas_grupos, DIMENSOES_GRUPOS_PARCIAL),
+        erro_origens=parcial.erro_origens + (int(descartadas.iloc[0]) if len(descartadas) else 0),
+    )
+
+def mapear(df_raw, registrar_visitas=None):
+    # registrar_visitas(chaves) recebe os pares (telefone, dia) do bloco (ver fidelidade.py)
+    df = processar(df_raw, ETAPAS_BLOCO, memorizar=False)
+    if registrar_visitas is not None:
+        registrar_visitas(visitas_da_carga(df['Data_Hora'], df['Telefone']))
+    acima = (df['Qtd_Criancas'] > LIMITE_CRIANCAS).to_numpy()
+    no_limite = df['Qtd_Criancas'][~acima]
+    df = df.assign(Acima_Limite=acima, Qtd_Criancas=df['Qtd_Criancas'].mask(acima, 0))
+    df['Total_Visitantes_Linha'] = 1 + df['Qtd_Criancas']
+    return limitar_origens(Parcial(
+        celulas=_celulas(df, DIMENSOES_PARCIAL),
+        celulas_grupos=_celulas(df, DIMENSOES_GRUPOS_PARCIAL),
+        soma_criancas=int(no_limite.sum()),
+        linhas_no_limite=len(no_limite),
+        esbocos=esbocos_diarios(df),
+    ))
+
+def combinar(a, b):
+    # Associativa; None é a parcial vazia
+    if a is None or b is None:
+        return b if a is None else a
+    return limitar_origens(Parcial(
+        celulas=somar_celulas(pd.concat([a.celulas, b.celulas], ignore_index=True), DIMENSOES_PARCIAL),
+        celulas_grupos=somar_celulas(pd.concat([a.celulas_grupos, b.celulas_grupos], ignore_index=True), DIMENSOES_GRUPOS_PARCIAL),
+        soma_criancas=a.soma_criancas + b.soma_criancas,
+        linhas_no_limite=a.linhas_no_limite + b.linhas_no_limite,
+        esbocos=combinar_esbocos(a.esbocos, b.esbocos),
+        erro_origens=a.erro_origens + b.erro_origens,
+    ))
+
+def _resolver(celulas, dimensoes, media, erro_origens):
+    # Células acima do limite: cada adulto passa a ter `media` crianças, como em pipeline._etapa_criancas
+    acima = celulas['Acima_Limite'].to_numpy()
+    adultos = celulas['Adultos']
+    celulas = celulas.assign(
+        Criancas=celulas['Criancas'].mask(acima, media * adultos),
+        Visitantes=celulas['Visitantes'].mask(acima, (1 + media) * adultos),
+        Tipo_Grupo=celulas['Tipo_Grupo'].mask(acima, GRUPO_FAMILIA if media > 0 else GRUPO_INDIVIDUAL),
+    )
+    if 'Total_Visitantes_Linha' in dimensoes:
+        celulas['Total_Visitantes_Linha'] = celulas['Total_Visitantes_Linha'].mask(acima, 1 + media)
+    celulas = celulas.assign(
+        Cidade_Limpa=celulas['Cidade_Limpa'].astype('category'),
+        Tipo_Grupo=celulas['Tipo_Grupo'].astype('category'),
+    )
+    return cubo_de_celulas(somar_celulas(celulas, dimensoes), erro_origens)
+
+def consolidar(parcial):
+    # (cubo, cubo_grupos) equivalentes a cubo.construir_cubo sobre o frame inteiro
+    media = int(round(parcial.soma_criancas / parcial.linhas_no_limite)) if parcial.linhas_no_limite else 0
+    return (
+        _resolver(parcial.celulas, DIMENSOES, media, parcial.erro_origens),
+        _resolver(parcial.celulas_grupos, DIMENSOES_GRUPOS, media, parcial.erro_origens),
+    )
+
+# --- leitura em blocos ---
+def _blocos_csv(abrir, linhas, **opcoes):
+    with abrir() as f:
+        yield from pd.read_csv(f, chunksize=linhas, **opcoes)
+
+def _blocos_xlsx(abrir, linhas):
+    # Modo read_only do openpyxl: as linhas saem do XML à medida que são lidas
+    with abrir() as f:
+        wb = openpyxl.load_workbook(f, read_only=True, data_only=True)
+        try:
+            valores = wb.worksheets[0].iter_rows(values_only=True)
+            cabecalho = next(valores, None)
+            if cabecalho is None:
+                return
+            while lote := list(itertools.islice(valores, linhas)):
+                yield pd.DataFrame(lote, columns=range(len(cabecalho)))
+        finally:
+            wb.close()
+
+def _parcial_arquivo(nome, abrir, linhas, informar, registrar_visitas):
+    # Mesmo critério de ingestao.ler_arquivo: CSV que falha em UTF-8/vírgula é relido
+    # inteiro em latin1/ponto e vírgula, descartando o que já tinha sido somado
+    if nome.endswith('.csv'):
+        leituras = [lambda: _blocos_csv(abrir, linhas), lambda: _blocos_csv(abrir, linhas, encoding='latin1', sep=';')]
+    else:
+        leituras = [lambda: _blocos_xlsx(abrir, linhas)]
+
+    for tentativa, ler in enumerate(leituras):
+        parcial, blocos = None, ler()
+        for n in itertools.count(1):
+            try:
+                bloco = next(blocos, None)
+            except Exception:
+                if tentativa == len(leituras) - 1:
+                    raise
+                break
+            if bloco is None:
+                return parcial
+            bloco = padronizar_colunas(bloco)
+            if bloco is None:
+                return None
+            parcial = combinar(parcial, mapear(bloco, registrar_visitas))
+            informar(nome, n)
+
+def agregar_arquivos(arquivos, informar, linhas=None, registrar_visitas=None):
+    # arquivos: [(nome, abrir)], abrir() devolve um arquivo binário novo a cada chamada.
+    # informar(etapa, fração); registrar_visitas como em mapear, bloco a bloco.
+    # Devolve (Parcial de todos os arquivos ou None, erros por arquivo)
+    linhas = linhas or config.LINHAS_BLOCO_AGREGACAO
+    total, erros = None, []
+    for i, (nome, abrir) in enumerate(arquivos):
+        informar(f"Lendo {nome}", i / len(arquivos))
+        def por_bloco(nome, n, i=i):
+            informar(f"{nome}: bloco {n} ({n * linhas:,} linhas)", i / len(arquivos))
+        try:
+            parcial = _parcial_arquivo(nome, abrir, linhas, por_bloco, registrar_visitas)
+        except Cancelada:
+            raise
+        except Exception as e:
+            erros.append(f"Erro no arquivo {nome}: {e}")
+            continue
+        total = combinar(total, parcial)
+    return total, erros
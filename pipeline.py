@@ -0,0 +1,388 @@
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import process, utils
+
+import config
+
+# ==========================================
+# LISTA DE REFERÊNCIA (MT + CAPITAIS)
+# ==========================================
+CIDADES_REFERENCIA = [
+    "Cuiabá", "Várzea Grande", "Rondonópolis", "Sinop", "Sorriso", "Tangará da Serra",
+    "Cáceres", "Primavera do Leste", "Lucas do Rio Verde", "Barra do Garças",
+    "Alta Floresta", "Pontes e Lacerda", "Juína", "Guarantã do Norte", "Poconé",
+    "Nova Mutum", "Campo Novo do Parecis", "Barra do Bugres", "Colniza", "Vila Rica",
+    "Peixoto de Azevedo", "Água Boa", "Juara", "Colíder", "Diamantino", "Canarana",
+    "Campo Verde", "Aripuanã", "Nova Xavantina", "Sapezal", "Poxoréu", "Jaciara",
+    "Brasnorte", "Paranatinga", "Pedra Preta", "Guiratinga", "Nova Bandeirantes",
+    "São José do Rio Claro", "Araputanga", "Matupá", "Nobres", "Alto Araguaia",
+    "Vila Bela da Santíssima Trindade", "Campinápolis", "Juruena", "Porto Alegre do Norte",
+    "Cláudia", "Comodoro", "Vera", "Denise", "Rosário Oeste", "Nossa Senhora do Livramento",
+    "São Paulo", "Rio de Janeiro", "Brasília", "Salvador", "Fortaleza", "Belo Horizonte",
+    "Manaus", "Curitiba", "Recife", "Porto Alegre", "Belém", "Goiânia", "Guarulhos",
+    "Campinas", "São Luís", "Maceió", "Duque de Caxias", "Campo Grande", "Natal",
+    "Teresina", "São Bernardo do Campo", "João Pessoa", "Osasco", "Santo André",
+    "Jaboatão dos Guararapes", "Uberlândia", "Contagem", "Sorocaba", "Ribeirão Preto",
+    "Aracaju", "Feira de Santana", "Joinville", "Aparecida de Goiânia",
+    "Londrina", "Ananindeua", "Porto Velho", "Serra", "Niterói", "Belford Roxo",
+    "Caxias do Sul", "Campos dos Goytacazes", "Macapá", "Florianópolis", "Boa Vista",
+    "Rio Branco", "Vitória", "Palmas"
+]
+
+MAPEAMENTO_ESTRANGEIRO = {
+    r'\b(usa|eua|united states|texas|florida|miami|new york|orlando)\b': "Estados Unidos",
+    r'\b(france|franca|paris)\b': "França",
+    r'\b(belgium|belgica|brussels|bruxelas)\b': "Bélgica",
+    r'\b(czech|tcheca|prague)\b': "República Tcheca",
+    r'\b(argentina|buenos aires|cordoba|rosario)\b': "Argentina",
+    r'\b(bolivia|la paz|santa cruz|sucre)\b': "Bolívia",
+    r'\b(paraguay|paraguai|asuncion|assuncao)\b': "Paraguai",
+    r'\b(chile|santiago|valparaiso)\b': "Chile",
+    r'\b(uruguay|uruguai|montevideo|punta del este)\b': "Uruguai",
+    r'\b(colombia|bogota|medellin|cartagena)\b': "Colômbia",
+    r'\b(peru|lima|cusco|machu picchu)\b': "Peru",
+    r'\b(venezuela|caracas|maracaibo)\b': "Venezuela",
+    r'\b(ecuador|equador|quito|guayaquil)\b': "Equador",
+    r'\b(mexico|cancun|mexico city)\b': "México",
+    r'\b(portugal|lisboa|porto)\b': "Portugal",
+    r'\b(spain|espanha|madrid|barcelona)\b': "Espanha",
+    r'\b(italy|italia|rome|roma|milano)\b': "Itália",
+    r'\b(germany|alemanha|berlin|munich)\b': "Alemanha",
+    r'\b(japan|japao|tokyo|toquio)\b': "Japão",
+    r'\b(china|beijing|shanghai)\b': "China",
+    r'\b(uk|reino unido|london|londres|england|inglaterra)\b': "Reino Unido"
+}
+
+SIGLAS_CIDADES = {
+    r'\bcba\b': "Cuiabá", r'\bvg\b': "Várzea Grande", r'\bsp\b': "São Paulo", r'\bbh\b': "Belo Horizonte",
+    r'\brj\b': "Rio de Janeiro", r'\bcgr\b': "Campo Grande", r'\bcur\b': "Curitiba", r'\bgyn\b': "Goiânia"
+}
+
+DIAS_SEMANA = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+
+# Faixas (0-12], (12-17], (17-35], (35-59], (59+); idade ausente -> "Não Informado"
+FAIXAS_ETARIAS = ["Criança (0-12)", "Adolescente (13-17)", "Jovem Adulto (18-35)", "Adulto (36-59)", "Idoso (60+)", "Não Informado"]
+FAIXAS_LIMITES = [0, 12, 17, 35, 59, np.inf]
+
+LIMITE_CRIANCAS = 40
+
+GRUPO_FAMILIA = 'Família/Grupo'
+GRUPO_INDIVIDUAL = 'Individual/Adultos'
+
+# DDDs em uso no Brasil (Anatel); número sem DDD é tratado como local (Cuiabá)
+DDDS = tuple(str(d) for d in (
+    11, 12, 13, 14, 15, 16, 17, 18, 19, 21, 22, 24, 27, 28, 31, 32, 33, 34, 35, 37, 38,
+    41, 42, 43, 44, 45, 46, 47, 48, 49, 51, 53, 54, 55, 61, 62, 63, 64, 65, 66, 67, 68, 69,
+    71, 73, 74, 75, 77, 79, 81, 82, 83, 84, 85, 86, 87, 88, 89, 91, 92, 93, 94, 95, 96, 97, 98, 99,
+))
+DDD_PADRAO = '65'
+
+# Origens raras somadas num único valor quando os cubos limitam as cidades (ver parciais.py)
+OUTRAS_ORIGENS = 'Outras Origens'
+
+# Colunas das planilhas do formulário, na ordem em que chegam
+COLUNAS_ENTRADA = ['Data_Hora', 'Nome', 'Cidade_Origem', 'Whatsapp', 'Idade', 'Qtd_Criancas', 'Obs']
+
+def padronizar_colunas(df):
+    # Planilha com menos de 6 colunas não é do formulário (None); as 7 primeiras recebem os nomes padrão
+    if df.shape[1] < 6:
+        return None
+    df = df.iloc[:, 0:7]
+    df.columns = COLUNAS_ENTRADA
+    return df
+
+# ==========================================
+# PIPELINE DE SANITIZAÇÃO
+# ==========================================
+
+@lru_cache(maxsize=1000)
+def fuzzy_match_cidade(nome_sujo):
+    if not nome_sujo: return ""
+    result = process.extractOne(nome_sujo, CIDADES_REFERENCIA, processor=utils.default_process)
+    if result and result[1] >= 80:
+        return result[0]
+    return nome_sujo.title()
+
+def remover_acentos(texto):
+    if pd.isna(texto): return ""
+    texto = str(texto).lower().strip()
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto)
+                  if unicodedata.category(c) != 'Mn')
+
+def sanitizar_pipeline(cidade_origem):
+    if pd.isna(cidade_origem): return "Não Informado", False
+
+    texto_raw = str(cidade_origem).strip()
+    texto_lower = texto_raw.lower()
+
+    # STAGE 1: TRADUTOR DE ESTRANGEIROS
+    for regex, pais in MAPEAMENTO_ESTRANGEIRO.items():
+        if re.search(regex, texto_lower):
+            return pais, True
+
+    # STAGE 2: REGEX VASSOURA & LIMPEZA DE PONTUAÇÃO
+    c_limpa = texto_raw
+    regex_ufs = r'\b(AC|AL|AP|AM|BA|CE|DF|ES|GO|MA|MT|MS|MG|PA|PB|PR|PE|PI|RJ|RN|RS|RO|RR|SC|SP|SE|TO)\b'
+    c_limpa = re.sub(regex_ufs, ' ', c_limpa, flags=re.IGNORECASE)
+    regex_lixo = r'\b(brasil|mato grosso|cidade|estado|municipio)\b'
+    c_limpa = re.sub(regex_lixo, ' ', c_limpa, flags=re.IGNORECASE)
+    c_limpa = re.sub(r'[^a-zA-ZÀ-ÿ\s]', ' ', c_limpa)
+    c_limpa = re.sub(r'\s+', ' ', c_limpa).strip()
+
+    if not c_limpa or len(c_limpa) < 2:
+        return "Não Informado", False
+
+    c_temp_norm = remover_acentos(c_limpa)
+    for sigla_re, nome_oficial in SIGLAS_CIDADES.items():
+        if re.search(sigla_re, c_temp_norm):
+            return nome_oficial, False
+
+    # STAGE 3: FUZZY MATCHING
+    return fuzzy_match_cidade(c_limpa), False
+
+def process_criancas(val):
+    if pd.isna(val): return 0
+    s = str(val).lower().strip()
+    if any(term in s for term in ["nenhum", "nenhuma", "não", "nao", "zero"]): return 0
+    match = re.search(r'(\d+)', s)
+    return int(match.group(1)) if match else 0
+
+def process_idade(val):
+    if pd.isna(val): return np.nan
+    match = re.search(r'(\d+)', str(val))
+    if match:
+        idade = int(match.group(1))
+        return idade if 1 <= idade <= 120 else np.nan
+    return np.nan
+
+# ==========================================
+# ETAPAS DE ENRIQUECIMENTO (DAG DECLARATIVO)
+# ==========================================
+# Cada etapa declara as colunas que lê e as que produz. Uma entrada com o mesmo
+# nome de uma saída da própria etapa refere-se à coluna de origem (ex.: Idade
+# bruta -> Idade numérica). O resultado de cada etapa é memorizado pela impressão
+# digital das entradas + versão + parâmetros, então alterar as faixas etárias
+# recalcula só Faixa_Etaria, e alterar o mapa de cidades só Cidade_Limpa.
+
+@dataclass(frozen=True)
+class Etapa:
+    nome: str
+    entradas: tuple
+    saidas: tuple
+    funcao: Callable
+    versao: int = 1
+    parametros: tuple = field(default=(), repr=False)
+
+def _etapa_data(df):
+    return df['Data_Hora'].dt.date
+
+def _etapa_hora(df):
+    return df['Data_Hora'].dt.hour.fillna(0).astype(int)
+
+def _etapa_dia_semana(df):
+    # dayofweek: 0 = segunda ... 6 = domingo (independe do locale do servidor)
+    dias = pd.Categorical.from_codes(df['Data_Hora'].dt.dayofweek, categories=DIAS_SEMANA, ordered=True)
+    return pd.Series(dias, index=df.index)
+
+def _etapa_criancas(df):
+    qtd = df['Qtd_Criancas'].apply(process_criancas)
+    med_cr = qtd[qtd <= LIMITE_CRIANCAS].mean()
+    return qtd.mask(qtd > LIMITE_CRIANCAS, int(round(med_cr)) if not np.isnan(med_cr) else 0)
+
+def _etapa_idade(df):
+    return df['Idade'].apply(process_idade)
+
+def _etapa_faixa_etaria(df):
+    faixa = pd.cut(df['Idade'], bins=FAIXAS_LIMITES, labels=FAIXAS_ETARIAS[:-1], ordered=True)
+    return faixa.cat.add_categories(FAIXAS_ETARIAS[-1]).fillna(FAIXAS_ETARIAS[-1])
+
+def normalizar_telefones(serie):
+    # Whatsapp em E.164, vetorizado: +55 + DDD + assinante para números brasileiros,
+    # "+" + dígitos para números com código de outro país; inválido fica ausente.
+    # Remove máscara, o ".0" de números lidos do Excel, o 00/+55 internacional e o
+    # 0 + operadora da discagem interurbana; sem DDD assume DDD_PADRAO; celular no
+    # formato antigo de 8 dígitos (começando em 6-9) ganha o nono dígito.
+    texto = serie.astype('str').str.strip()
+    internacional = texto.str.startswith('+') | texto.str.startswith('00')
+    digitos = texto.str.replace(r'\.0+$', '', regex=True).str.replace(r'\D', '', regex=True)
+    digitos = digitos.where(~texto.str.startswith('00'), digitos.str[2:])
+    outro_pais = internacional & ~digitos.str.startswith('55')
+
+    nacional = digitos.where(~(digitos.str.startswith('55') & (internacional | digitos.str.len().isin([12, 13]))), digitos.str[2:])
+    tamanho, zero = nacional.str.len(), nacional.str.startswith('0')
+    nacional = nacional.where(~(zero & tamanho.isin([13, 14])), nacional.str[3:])
+    nacional = nacional.where(~(zero & tamanho.isin([11, 12])), nacional.str[1:])
+    nacional = nacional.where(~nacional.str.len().isin([8, 9]), DDD_PADRAO + nacional)
+
+    ddd, assinante = nacional.str[:2], nacional.str[2:]
+    assinante = assinante.where(~((assinante.str.len() == 8) & assinante.str[:1].isin(['6', '7', '8', '9'])), '9' + assinante)
+    celular = (assinante.str.len() == 9) & assinante.str.startswith('9')
+    fixo = (assinante.str.len() == 8) & assinante.str[:1].isin(['2', '3', '4', '5'])
+    brasil = ('+55' + ddd + assinante).where(ddd.isin(DDDS) & (celular | fixo))
+    return brasil.where(~outro_pais, ('+' + digitos).where(digitos.str.len().between(8, 15)))
+
+def _etapa_telefone(df):
+    return normalizar_telefones(df['Whatsapp'])
+
+def _etapa_cidade(df):
+    # Mapa de resolução: sanitiza cada valor distinto uma única vez e faz o join
+    # pelos códigos. Código -1 (ausente) cai no último item, o resultado de None.
+    codigos, valores = pd.factorize(df['Cidade_Origem'])
+    resolvidos = [sanitizar_pipeline(v) for v in valores] + [sanitizar_pipeline(None)]
+    cidades = np.array([r[0] for r in resolvidos], dtype=object)[codigos]
+    estrangeiros = np.array([r[1] for r in resolvidos], dtype=bool)[codigos]
+    return {
+        'Cidade_Limpa': pd.Series(cidades, index=df.index),
+        'Estrangeiro': pd.Series(estrangeiros, index=df.index),
+    }
+
+def _etapa_total(df):
+    return 1 + df['Qtd_Criancas']
+
+def _etapa_tipo_grupo(df):
+    return pd.Series(np.where(df['Qtd_Criancas'] > 0, GRUPO_FAMILIA, GRUPO_INDIVIDUAL), index=df.index)
+
+ETAPAS = [
+    Etapa('Data', ('Data_Hora',), ('Data',), _etapa_data),
+    Etapa('Hora', ('Data_Hora',), ('Hora',), _etapa_hora),
+    Etapa('Dia_Semana', ('Data_Hora',), ('Dia_Semana',), _etapa_dia_semana, parametros=(DIAS_SEMANA,)),
+    Etapa('Qtd_Criancas', ('Qtd_Criancas',), ('Qtd_Criancas',), _etapa_criancas, parametros=(LIMITE_CRIANCAS,)),
+    Etapa('Idade', ('Idade',), ('Idade',), _etapa_idade),
+    Etapa('Faixa_Etaria', ('Idade',), ('Faixa_Etaria',), _etapa_faixa_etaria, parametros=(FAIXAS_LIMITES, FAIXAS_ETARIAS)),
+    Etapa('Cidade_Limpa', ('Cidade_Origem',), ('Cidade_Limpa', 'Estrangeiro'), _etapa_cidade,
+          parametros=(CIDADES_REFERENCIA, MAPEAMENTO_ESTRANGEIRO, SIGLAS_CIDADES)),
+    Etapa('Total_Visitantes_Linha', ('Qtd_Criancas',), ('Total_Visitantes_Linha',), _etapa_total),
+    Etapa('Tipo_Grupo', ('Qtd_Criancas',), ('Tipo_Grupo',), _etapa_tipo_grupo),
+    Etapa('Telefone', ('Whatsapp',), ('Telefone',), _etapa_telefone, versao=2, parametros=(DDDS, DDD_PADRAO)),
+]
+
+# ==========================================
+# EXECUÇÃO COM MEMOIZAÇÃO POR ETAPA
+# ==========================================
+# Teto em bytes (memory_usage deep das saídas guardadas); conta também no teto do
+# registro de datasets, que despeja frames até caberem os dois (ver registro.py)
+LIMITE_CACHE_ETAPAS = config.CACHE_ETAPAS_MB * 1024 * 1024
+_cache_etapas = OrderedDict()  # chave -> (saídas, bytes)
+_bytes_cache_etapas = 0
+_cache_lock = threading.Lock()
+
+def _hash(*partes):
+    h = hashlib.sha1()
+    for p in partes:
+        h.update(str(p).encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+def impressao_coluna(serie):
+    valores = pd.util.hash_pandas_object(serie, index=True).to_numpy()
+    return _hash(serie.name, serie.dtype, hashlib.sha1(valores.tobytes()).hexdigest())
+
+def _tamanho(saidas):
+    return int(sum(serie.memory_usage(index=False, deep=True) for serie in saidas.values()))
+
+def _memorizar(chave, calcular):
+    global _bytes_cache_etapas
+    with _cache_lock:
+        if chave in _cache_etapas:
+            _cache_etapas.move_to_end(chave)
+            return _cache_etapas[chave][0]
+    resultado = calcular()
+    tamanho = _tamanho(resultado)
+    if tamanho > LIMITE_CACHE_ETAPAS:
+        return resultado
+    with _cache_lock:
+        if chave not in _cache_etapas:
+            _cache_etapas[chave] = (resultado, tamanho)
+            _bytes_cache_etapas += tamanho
+        while _bytes_cache_etapas > LIMITE_CACHE_ETAPAS:
+            _bytes_cache_etapas -= _cache_etapas.popitem(last=False)[1][1]
+    return resultado
+
+def bytes_cache_etapas():
+    with _cache_lock:
+        return _bytes_cache_etapas
+
+def ordenar_etapas(etapas):
+    produtor = {s: e for e in etapas for s in e.saidas}
+    ordem, visitadas = [], set()
+
+    def visitar(etapa, pilha):
+        if etapa.nome in visitadas: return
+        if etapa.nome in pilha:
+            raise ValueError(f"Ciclo no pipeline na etapa '{etapa.nome}'")
+        for entrada in etapa.entradas:
+            dep = produtor.get(entrada)
+            if dep is not None and dep is not etapa:
+                visitar(dep, pilha | {etapa.nome})
+        visitadas.add(etapa.nome)
+        ordem.append(etapa)
+
+    for etapa in etapas:
+        visitar(etapa, frozenset())
+    return ordem
+
+def impressao_etapas(etapas=ETAPAS):
+    # Identifica as regras do pipeline: muda com a versão ou os parâmetros de qualquer etapa
+    return _hash(*(f"{e.nome}:{e.versao}:{e.parametros!r}" for e in ordenar_etapas(etapas)))
+
+def executar_etapas(df, etapas=ETAPAS, progresso=None, memorizar=True):
+    # progresso(etapa, concluídas, total) é chamado antes de cada etapa; se levantar
+    # exceção (ex.: tarefa cancelada), a execução para ali. memorizar=False não guarda
+    # nada no cache de etapas (blocos de um arquivo lido em partes, ver parciais.py)
+    df = df.copy()
+    impressoes = {}
+    ordem = ordenar_etapas(etapas)
+    for i, etapa in enumerate(ordem):
+        if progresso is not None:
+            progresso(etapa.nome, i, len(ordem))
+        for entrada in etapa.entradas:
+            if entrada not in impressoes:
+                if entrada not in df.columns:
+                    raise KeyError(f"Etapa '{etapa.nome}' depende da coluna ausente '{entrada}'")
+                impressoes[entrada] = impressao_coluna(df[entrada])
+        chave = _hash(etapa.nome, etapa.versao, repr(etapa.parametros), *(impressoes[e] for e in etapa.entradas))
+
+        def calcular(etapa=etapa):
+            saida = etapa.funcao(df)
+            return saida if isinstance(saida, dict) else {etapa.saidas[0]: saida}
+
+        saidas = _memorizar(chave, calcular) if memorizar else calcular()
+        for nome, serie in saidas.items():
+            df[nome] = serie
+            impressoes[nome] = _hash(chave, nome)
+    return df
+
+def processar(df_raw, etapas=ETAPAS, progresso=None, memorizar=True):
+    # Parse de Data_Hora também memorizado: linhas sem data válida são descartadas
+    if progresso is not None:
+        progresso('Data_Hora', 0, 1)
+    if memorizar:
+        chave = _hash('Data_Hora', impressao_coluna(df_raw['Data_Hora']))
+        data_hora = _memorizar(chave, lambda: {'Data_Hora': pd.to_datetime(df_raw['Data_Hora'], errors='coerce')})['Data_Hora']
+    else:
+        data_hora = pd.to_datetime(df_raw['Data_Hora'], errors='coerce')
+    validas = data_hora.notna()
+    df = df_raw.loc[validas].copy()
+    df['Data_Hora'] = data_hora[validas]
+    # Ordenado por Data_Hora: o período vira uma fatia contígua (ver filtros.py)
+    return executar_etapas(df, etapas, progresso, memorizar).sort_values('Data_Hora', kind='stable', ignore_index=True)
+
+PIPELINES = ('pandas', 'polars')
+
+def processar_dataset(df_raw, progresso=None):
+    # Implementação escolhida por SIT_PIPELINE; a versão Polars (pipeline_polars.py) produz o mesmo frame
+    if config.PIPELINE not in PIPELINES:
+        raise ValueError(f"Pipeline desconhecido: {config.PIPELINE} (opções: {', '.join(PIPELINES)})")
+    if config.PIPELINE == 'polars':
+        from pipeline_polars import processar as processar_polars
+        return processar_polars(df_raw, progresso)
+    return processar(df_raw, progresso=progresso)
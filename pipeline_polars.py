@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+import polars as pl
+from pandas.tseries.api import guess_datetime_format
+
+from pipeline import (
+    DIAS_SEMANA, FAIXAS_ETARIAS, FAIXAS_LIMITES, GRUPO_FAMILIA, GRUPO_INDIVIDUAL, LIMITE_CRIANCAS,
+    normalizar_telefones, sanitizar_pipeline,
+)
+
+# ==========================================
+# PIPELINE DE SANITIZAÇÃO EM POLARS (API LAZY)
+# ==========================================
+# Mesmo resultado de pipeline.processar, com as etapas escritas como expressões
+# Polars num único plano lazy: o motor executa as colunas em paralelo e sem
+# objetos Python por linha. Só a resolução de cidades continua em Python, uma
+# vez por valor distinto, e volta ao plano como tabela de join. As colunas que
+# a sanitização não toca (Nome, Whatsapp, Obs...) não passam pelo Polars: são
+# reordenadas pela mesma permutação da ordenação por Data_Hora.
+
+_TERMOS_ZERO = ["nenhum", "nenhuma", "não", "nao", "zero"]
+
+# Textos que o pandas pula ao escolher o valor de onde infere o formato das datas
+_SEM_DATA = {'', 'now', 'today', 'NaT', 'nat', 'NAT', 'nan', 'NaN', 'NAN'}
+
+def _formato_pandas(serie):
+    # Formato que pd.to_datetime infere: o do primeiro valor preenchido (None = sem formato único)
+    primeiro = next((v for v in serie if isinstance(v, str) and v not in _SEM_DATA), None)
+    return None if primeiro is None else guess_datetime_format(primeiro)
+
+def _data_hora(serie):
+    # Texto vai para o parser do Polars com o formato que o pandas inferiria (a inferência
+    # do Polars pode trocar dia e mês ou anular o que o pandas aceita); datas já
+    # tipadas (Excel), objetos mistos ou texto sem formato inferível ficam com o pandas
+    formato = None
+    if pd.api.types.is_string_dtype(serie) and pd.api.types.infer_dtype(serie, skipna=True) == 'string':
+        formato = _formato_pandas(serie)
+    if formato is None:
+        return pd.to_datetime(serie, errors='coerce')
+    textos = pl.from_pandas(serie)
+    datas = textos.str.to_datetime(format=formato, strict=False, time_unit='us')
+    # O Polars também aceita o que o pandas recusa (espaços nas pontas, ano de 2 dígitos
+    # em %Y): só vale a data que, formatada de volta, reproduz o texto. O resto (falhas
+    # do Polars, valores sem zeros à esquerda) passa pelo pandas com o mesmo formato
+    conferidas = (datas.dt.to_string(formato) == textos).fill_null(False).to_numpy()
+    convertida = datas.to_pandas().rename(serie.name).set_axis(serie.index)
+    refazer = ~conferidas & serie.notna().to_numpy()
+    if refazer.any():
+        convertida[refazer] = pd.to_datetime(serie[refazer], format=formato, errors='coerce')
+    return convertida
+
+def _texto(serie):
+    # Equivalente a str(valor) célula a célula, com ausentes como null
+    if pd.api.types.is_numeric_dtype(serie) or pd.api.types.infer_dtype(serie, skipna=True) in ('string', 'empty'):
+        return pl.from_pandas(serie).cast(pl.String)
+    return pl.Series(serie.name, [None if pd.isna(v) else str(v) for v in serie], dtype=pl.String)
+
+def _numero(texto):
+    # Primeiro grupo de dígitos; sequência longa demais para Int64 conta como valor enorme
+    digitos = texto.str.extract(r'(\d+)', 1)
+    numero = digitos.cast(pl.Int64, strict=False)
+    return pl.when(digitos.is_not_null() & numero.is_null()).then(pl.lit(np.iinfo(np.int64).max)).otherwise(numero)
+
+def _criancas(coluna):
+    texto = coluna.cast(pl.String).str.strip_chars().str.to_lowercase()
+    zero = pl.any_horizontal([texto.str.contains(t, literal=True) for t in _TERMOS_ZERO])
+    return pl.when(texto.is_null() | zero).then(0).otherwise(_numero(texto).fill_null(0))
+
+def _criancas_sem_outliers(qtd):
+    # Valores acima do limite viram a média (arredondada) dos demais; qtd já materializada
+    media = qtd.filter(qtd <= LIMITE_CRIANCAS).mean().round(0).fill_nan(0).fill_null(0).cast(pl.Int64)
+    return pl.when(qtd > LIMITE_CRIANCAS).then(media).otherwise(qtd)
+
+def _idade(coluna):
+    idade = _numero(coluna.cast(pl.String))
+    return pl.when(idade.is_between(1, 120)).then(idade).cast(pl.Float64)
+
+def _faixa(idade):
+    # Códigos de pd.cut(bins=FAIXAS_LIMITES) (intervalos fechados à direita); ausente -> "Não Informado"
+    expr = pl.lit(len(FAIXAS_ETARIAS) - 1, dtype=pl.Int8)
+    for codigo, limite in reversed(list(enumerate(FAIXAS_LIMITES[1:]))):
+        expr = pl.when(idade.is_not_null() & (idade > FAIXAS_LIMITES[0]) & (idade <= limite)).then(pl.lit(codigo, dtype=pl.Int8)).otherwise(expr)
+    return expr
+
+def _mapa_cidades(cidades):
+    valores = cidades.drop_nulls().unique(maintain_order=True)
+    resolvidos = [sanitizar_pipeline(v) for v in valores.to_list()]
+    return pl.DataFrame({
+        'Cidade_Origem_txt': valores,
+        'Cidade_Limpa': [r[0] for r in resolvidos],
+        'Estrangeiro': [r[1] for r in resolvidos],
+    }, schema={'Cidade_Origem_txt': pl.String, 'Cidade_Limpa': pl.String, 'Estrangeiro': pl.Boolean})
+
+def _processar(df_raw):
+    data_hora = _data_hora(df_raw['Data_Hora'])
+    validas = data_hora.notna().to_numpy()
+    base = df_raw.loc[validas]
+
+    entrada = pl.DataFrame({
+        '__linha': np.arange(len(base)),
+        'Data_Hora': pl.from_pandas(data_hora[validas]).cast(pl.Datetime('us')),
+        'Idade': _texto(base['Idade']),
+        'Qtd_Criancas': _texto(base['Qtd_Criancas']),
+        'Cidade_Origem_txt': _texto(base['Cidade_Origem']),
+    })
+    nao_informado, _ = sanitizar_pipeline(None)
+
+    plano = (
+        entrada.lazy()
+        .with_columns(
+            Hora=pl.col('Data_Hora').dt.hour().cast(pl.Int64),
+            Dia_Semana=(pl.col('Data_Hora').dt.weekday() - 1).cast(pl.Int8),
+            Qtd_Criancas=_criancas(pl.col('Qtd_Criancas')),
+            Idade=_idade(pl.col('Idade')),
+        )
+        .with_columns(
+            Qtd_Criancas=_criancas_sem_outliers(pl.col('Qtd_Criancas')),
+            Faixa_Etaria=_faixa(pl.col('Idade')),
+        )
+        .with_columns(
+            Total_Visitantes_Linha=1 + pl.col('Qtd_Criancas'),
+            Tipo_Grupo=pl.when(pl.col('Qtd_Criancas') > 0).then(pl.lit(GRUPO_FAMILIA)).otherwise(pl.lit(GRUPO_INDIVIDUAL)),
+        )
+        .join(_mapa_cidades(entrada['Cidade_Origem_txt']).lazy(), on='Cidade_Origem_txt', how='left', nulls_equal=False)
+        .with_columns(
+            Cidade_Limpa=pl.col('Cidade_Limpa').fill_null(nao_informado),
+            Estrangeiro=pl.col('Estrangeiro').fill_null(False),
+        )
+        # Ordenado por Data_Hora, estável como o sort_values do pandas
+        .sort(['Data_Hora', '__linha'])
+    )
+    res = plano.collect()
+
+    ordem = res['__linha'].to_numpy()
+    df = base.iloc[ordem].reset_index(drop=True)
+    df['Data_Hora'] = res['Data_Hora'].to_pandas()
+    df['Idade'] = res['Idade'].to_numpy()
+    df['Qtd_Criancas'] = res['Qtd_Criancas'].to_numpy()
+    df['Data'] = df['Data_Hora'].dt.date
+    df['Hora'] = res['Hora'].to_numpy()
+    df['Dia_Semana'] = pd.Categorical.from_codes(res['Dia_Semana'].to_numpy(), categories=DIAS_SEMANA, ordered=True)
+    df['Faixa_Etaria'] = pd.Categorical.from_codes(res['Faixa_Etaria'].to_numpy(), categories=FAIXAS_ETARIAS, ordered=True)
+    df['Cidade_Limpa'] = pd.Series(res['Cidade_Limpa'].to_numpy(), dtype='str')
+    df['Estrangeiro'] = res['Estrangeiro'].to_numpy()
+    df['Total_Visitantes_Linha'] = res['Total_Visitantes_Linha'].to_numpy()
+    df['Tipo_Grupo'] = pd.Series(res['Tipo_Grupo'].to_numpy(), dtype='str')
+    df['Telefone'] = normalizar_telefones(df['Whatsapp'])
+    return df
+
+def processar(df_raw, progresso=None):
+    # O plano roda inteiro no motor do Polars: uma única etapa para o progresso. Sem
+    # memoização do frame inteiro: o cache de etapas guarda colunas, não datasets
+    if progresso is not None:
+        progresso('Plano Polars', 0, 1)
+    return _processar(df_raw)
@@ -0,0 +1,121 @@
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+import config
+from armazem import bytes_em_heap
+from pipeline import bytes_cache_etapas
+
+# ==========================================
+# REGISTRO DE DATASETS COMPARTILHADOS
+# ==========================================
+# Um frame processado por conteúdo (versao_dados), guardado uma única vez por
+# processo. As sessões guardam só uma Referencia; com copy-on-write (pandas 3)
+# nenhuma sessão altera o frame compartilhado, qualquer escrita gera cópia
+# local. Cada Referencia viva conta como uso do dataset: acima do teto de
+# memória, o despejo LRU só descarta datasets que nenhuma sessão referencia.
+# O teto inclui o cache de etapas do pipeline, que mantém colunas fora dos frames,
+# e conta só memória do processo: páginas de frames mapeados do armazém não entram.
+# Objetos calculados do frame (índice de filtros, motor de consultas) ficam no
+# próprio Dataset: somam no tamanho dele e saem junto no despejo.
+
+@dataclass
+class Dataset:
+    versao: str
+    df: pd.DataFrame
+    bytes: int             # frame + derivados, em memória do processo
+    derivados: dict = field(default_factory=dict)
+    # Por dataset: montar um derivado (ex.: tabela do DuckDB) não bloqueia o registro
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+class Referencia:
+    # Handle de uma sessão para um dataset; ao ser coletada libera o uso no registro
+    def __init__(self, dataset, registro):
+        self.dataset = dataset
+        self._registro = registro
+
+    @property
+    def versao(self):
+        return self.dataset.versao
+
+    @property
+    def df(self):
+        return self.dataset.df
+
+    def derivado(self, nome, construir):
+        # construir(df) uma vez por dataset; o objeto precisa de bytes_em_heap()
+        return self._registro.derivado(self.dataset, nome, construir)
+
+class RegistroDatasets:
+    def __init__(self, limite_bytes=0):
+        self.limite_bytes = limite_bytes
+        self._datasets = OrderedDict()
+        self._referencias = {}
+        self._bytes = 0
+        # RLock: a liberação de uma Referencia pode ocorrer na coleta de lixo dentro de um trecho com a trava
+        self._lock = threading.RLock()
+
+    def abrir(self, versao):
+        # Referência para um dataset já registrado, ou None
+        with self._lock:
+            dataset = self._datasets.get(versao)
+            if dataset is None:
+                return None
+            self._datasets.move_to_end(versao)
+            return self._referenciar(dataset)
+
+    def registrar(self, versao, df):
+        # Se outra sessão registrou o mesmo conteúdo antes, o frame novo é descartado
+        with self._lock:
+            dataset = self._datasets.get(versao)
+            if dataset is None:
+                dataset = Dataset(versao, df, bytes_em_heap(df))
+                self._datasets[versao] = dataset
+                self._bytes += dataset.bytes
+            self._datasets.move_to_end(versao)
+            referencia = self._referenciar(dataset)
+            self._despejar()
+            return referencia
+
+    def _referenciar(self, dataset):
+        referencia = Referencia(dataset, self)
+        self._referencias[dataset.versao] = self._referencias.get(dataset.versao, 0) + 1
+        weakref.finalize(referencia, self._liberar, dataset.versao)
+        return referencia
+
+    def derivado(self, dataset, nome, construir):
+        with dataset.lock:
+            objeto = dataset.derivados.get(nome)
+            if objeto is None:
+                objeto = construir(dataset.df)
+                tamanho = objeto.bytes_em_heap()
+                with self._lock:
+                    dataset.derivados[nome] = objeto
+                    dataset.bytes += tamanho
+                    if self._datasets.get(dataset.versao) is dataset:
+                        self._bytes += tamanho
+                    self._despejar()
+            return objeto
+
+    def _liberar(self, versao):
+        with self._lock:
+            restantes = self._referencias.get(versao, 0) - 1
+            if restantes > 0:
+                self._referencias[versao] = restantes
+            else:
+                self._referencias.pop(versao, None)
+            self._despejar()
+
+    def _despejar(self):
+        # Do menos recente ao mais recente, pulando os datasets em uso
+        for versao in list(self._datasets):
+            if self._bytes + bytes_cache_etapas() <= self.limite_bytes:
+                break
+            if self._referencias.get(versao):
+                continue
+            self._bytes -= self._datasets.pop(versao).bytes
+
+REGISTRO = RegistroDatasets(limite_bytes=config.REGISTRO_DATASETS_MB * 1024 * 1024)
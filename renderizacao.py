@@ -0,0 +1,64 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+import graficos
+from cache_graficos import CACHE
+
+# ==========================================
+# RENDERIZAÇÃO PARALELA DOS PAINÉIS
+# ==========================================
+# Cada painel é um job independente num pool de processos (a rasterização do
+# Agg segura a GIL, então threads não escalam). O pool é único por processo e
+# compartilhado pelas sessões; os workers recebem só os Agregados, que são
+# pequenos. Painéis já presentes no cache não são enviados ao pool.
+
+PAINEIS_ESTRATEGICOS = [
+    ('segmentacao_etaria', graficos.segmentacao_etaria),
+    ('tipologia', graficos.tipologia),
+    ('tendencia_diaria', graficos.tendencia_diaria),
+    ('media_dia_semana', graficos.media_dia_semana),
+    ('top_cidades', graficos.top_cidades),
+    ('origens_internacionais', graficos.origens_internacionais),
+]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None and config.WORKERS_GRAFICOS > 0:
+            # spawn: o processo do Streamlit tem threads, fork não é seguro
+            _pool = ProcessPoolExecutor(config.WORKERS_GRAFICOS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+def _descartar_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def renderizar_paineis(paineis, ag, chave_de):
+    # paineis: [(nome, função)]; devolve os PNGs na mesma ordem
+    chaves = [chave_de(nome) for nome, _ in paineis]
+    pngs = [CACHE.ler(chave) for chave in chaves]
+    pendentes = [i for i, png in enumerate(pngs) if png is None]
+
+    pool = _executor() if len(pendentes) > 1 else None
+    if pool is not None:
+        try:
+            futuros = {i: pool.submit(paineis[i][1], ag) for i in pendentes}
+            for i, futuro in futuros.items():
+                pngs[i] = futuro.result()
+        except BrokenProcessPool:
+            _descartar_pool()
+
+    for i in pendentes:
+        if pngs[i] is None:
+            pngs[i] = paineis[i][1](ag)
+        CACHE.gravar(chaves[i], pngs[i])
+    return pngs
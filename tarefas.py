@@ -0,0 +1,83 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+# ==========================================
+# TAREFAS EM SEGUNDO PLANO
+# ==========================================
+# Leitura e sanitização de uploads grandes rodam num pool de threads único por
+# processo, fora da thread do script: a sessão guarda só a Tarefa em
+# st.session_state e acompanha o progresso. O cancelamento é cooperativo: a
+# função da tarefa informa cada etapa por Tarefa.informar, que interrompe a
+# execução ali se o cancelamento foi pedido.
+
+FILA, EXECUTANDO, CONCLUIDA, ERRO, CANCELADA = 'fila', 'executando', 'concluida', 'erro', 'cancelada'
+
+class Cancelada(Exception):
+    pass
+
+class Tarefa:
+    def __init__(self, chave):
+        self.chave = chave
+        self.estado = FILA
+        self.etapa = 'Na fila'
+        self.fracao = 0.0
+        self.resultado = None
+        self.erro = None
+        self._cancelar = threading.Event()
+        self._lock = threading.Lock()
+        self._futuro = None
+
+    @property
+    def finalizada(self):
+        return self.estado in (CONCLUIDA, ERRO, CANCELADA)
+
+    def informar(self, etapa, fracao):
+        # Chamado pela thread da tarefa; ponto de parada do cancelamento
+        if self._cancelar.is_set():
+            raise Cancelada()
+        with self._lock:
+            self.etapa, self.fracao = etapa, min(max(fracao, 0.0), 1.0)
+
+    def cancelar(self):
+        self._cancelar.set()
+        with self._lock:
+            if not self.finalizada:
+                self.estado = CANCELADA
+        if self._futuro is not None:
+            self._futuro.cancel()
+
+    def _executar(self, funcao, args):
+        with self._lock:
+            if self._cancelar.is_set():
+                return
+            self.estado = EXECUTANDO
+        try:
+            resultado = funcao(self, *args)
+        except Cancelada:
+            return
+        except Exception as e:
+            with self._lock:
+                if self.estado != CANCELADA:
+                    self.erro, self.estado = e, ERRO
+            return
+        with self._lock:
+            if self.estado != CANCELADA:
+                self.resultado, self.fracao, self.estado = resultado, 1.0, CONCLUIDA
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max(config.WORKERS_PROCESSAMENTO, 1), thread_name_prefix='sit-tarefa')
+        return _pool
+
+def submeter(chave, funcao, *args):
+    # funcao(tarefa, *args) roda no pool; o retorno fica em tarefa.resultado
+    tarefa = Tarefa(chave)
+    tarefa._futuro = _executor().submit(tarefa._executar, funcao, args)
+    return tarefa
@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Módulos na raiz do repositório; caches em disco num diretório temporário, para
+# os testes não lerem nem gravarem em ~/.cache/sit (config lê SIT_* na importação)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['SIT_DIR_CACHE'] = tempfile.mkdtemp(prefix='sit-testes-')
+
+CIDADES = ['Cuiabá', 'cba', 'Sinop', 'Várzea Grande', 'Buenos Aires', 'Lima', 'xx', None]
+IDADES = ['35', '12 anos', None, '70', '150', 'abc']
+CRIANCAS = ['0', 'nenhum', '1', '2', None, '99']
+
+def gerar_planilha(linhas=3000, semente=0, formato_data='%Y-%m-%d %H:%M:%S', telefones=500,
+                   sem_telefone=0.0, ordenada=False, **colunas):
+    # Planilha do formulário como chega no upload: carimbos em minutos aleatórios de
+    # 2024, origens, idades e crianças com os valores sujos que o pipeline trata e
+    # Whats de um grupo de `telefones` números (uma fração `sem_telefone` em branco).
+    # Outras colunas (Cidade, Idade, Criancas...) podem ser trocadas por argumento
+    rng = np.random.default_rng(semente)
+    minutos = rng.integers(0, 366 * 24 * 60, linhas)
+    carimbos = pd.Timestamp('2024-01-01') + pd.to_timedelta(np.sort(minutos) if ordenada else minutos, unit='min')
+    whats = pd.Series([f'(65) 99999-{i:04d}' for i in rng.integers(0, telefones, linhas)], dtype=object)
+    whats[rng.random(linhas) < sem_telefone] = None
+    df = pd.DataFrame({
+        'Carimbo': carimbos.strftime(formato_data),
+        'Nome': 'x',
+        'Cidade': rng.choice(CIDADES, linhas),
+        'Whats': whats,
+        'Idade': rng.choice(IDADES, linhas),
+        'Criancas': rng.choice(CRIANCAS, linhas),
+        'Obs': '',
+    })
+    return df.assign(**colunas)
+
+@pytest.fixture
+def planilha():
+    return gerar_planilha
@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agregacao import _kde_contagens
+
+def test_kde_contagens_igual_ao_gaussian_kde_das_observacoes():
+    stats = pytest.importorskip('scipy.stats')
+    rng = np.random.default_rng(7)
+    for linhas in (40, 5_000):
+        contagens = pd.Series(rng.integers(1, 12, linhas)).value_counts().sort_index()
+        kde = _kde_contagens(contagens)
+        observacoes = np.repeat(contagens.index.to_numpy(dtype=float), contagens.to_numpy())
+        esperado = stats.gaussian_kde(observacoes)(kde.index.to_numpy()) * linhas
+        # Núcleo truncado em 4 desvios: diferença relativa da ordem de 1e-4
+        np.testing.assert_allclose(kde.to_numpy(), esperado, rtol=0, atol=1e-3 * esperado.max())
+
+def test_kde_contagens_vazio_com_um_registro():
+    assert _kde_contagens(pd.Series([1, 0], index=[1, 2])).empty
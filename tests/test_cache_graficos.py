@@ -0,0 +1,17 @@
+import os
+
+from cache_graficos import CacheGraficos
+
+def test_gravacao_que_falha_nao_deixa_temporario(tmp_path, monkeypatch):
+    cache = CacheGraficos(str(tmp_path), limite_memoria=1 << 20, limite_disco=1 << 20)
+    cache.gravar('a', b'png')
+    assert os.listdir(tmp_path) == ['a.png']
+
+    def falhar(origem, destino):
+        raise OSError('disco cheio')
+
+    monkeypatch.setattr(os, 'replace', falhar)
+    cache.gravar('b', b'png')
+    assert os.listdir(tmp_path) == ['a.png']
+    # A camada em memória continua servindo o gráfico
+    assert cache.ler('b') == b'png'
@@ -0,0 +1,99 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import armazem
+from esbocos import (
+    PERCENTIS_IDADE, combinar_idades, combinar_unicos, esbocos_diarios, idades_diarias, unicos_diarios,
+)
+
+# Erro anunciado no painel ("erro ~1%"); o desvio padrão do HyperLogLog é ~0,8%
+ERRO_HLL = 0.01
+
+def _registros(linhas=200_000, telefones=60_000, semente=0):
+    # Um ano de registros com telefones (parte em branco) e idades (parte ausente)
+    rng = np.random.default_rng(semente)
+    telefone = pd.Series([f'+5565{i:09d}' for i in rng.integers(0, telefones, linhas)], dtype=object)
+    telefone[rng.random(linhas) < 0.05] = None
+    idade = pd.Series(rng.integers(1, 90, linhas), dtype='Float64')
+    idade[rng.random(linhas) < 0.1] = None
+    return pd.DataFrame({
+        'Data_Hora': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 366 * 24 * 3600, linhas)), unit='s'),
+        'Telefone': telefone,
+        'Idade': idade,
+    })
+
+def _distintos(df, inicio=None, fim=None):
+    dia = df['Data_Hora'].dt.normalize()
+    selecao = df[(dia >= pd.Timestamp(inicio or date.min)) & (dia <= pd.Timestamp(fim or date.max))]
+    return selecao['Telefone'].nunique()
+
+@pytest.mark.parametrize('inicio, fim', [
+    (None, None),
+    (date(2024, 3, 1), date(2024, 3, 31)),
+    (date(2024, 6, 15), None),
+    (None, date(2024, 1, 10)),
+    (date(2024, 5, 5), date(2024, 5, 5)),
+])
+def test_estimar_dentro_do_erro_do_hyperloglog(inicio, fim):
+    df = _registros()
+    esperado = _distintos(df, inicio, fim)
+    assert unicos_diarios(df['Data_Hora'], df['Telefone']).estimar(inicio, fim) == pytest.approx(esperado, rel=ERRO_HLL)
+
+def test_periodo_sem_registros_estima_zero():
+    df = _registros(1000)
+    assert unicos_diarios(df['Data_Hora'], df['Telefone']).estimar(date(2030, 1, 1), None) == 0
+
+def test_combinar_unicos_igual_a_uma_passada():
+    df = _registros(50_000)
+    # Partes sorteadas por linha: as duas têm registros dos mesmos dias
+    parte = np.random.default_rng(1).random(len(df)) < 0.5
+    a, b = df[parte], df[~parte]
+    combinado = combinar_unicos(unicos_diarios(a['Data_Hora'], a['Telefone']), unicos_diarios(b['Data_Hora'], b['Telefone']))
+    unico = unicos_diarios(df['Data_Hora'], df['Telefone'])
+    np.testing.assert_array_equal(combinado.dias, unico.dias)
+    np.testing.assert_array_equal(combinado.registradores, unico.registradores)
+
+def test_esbocos_gravados_no_armazem_mantem_as_estimativas():
+    df = _registros(50_000)
+    esbocos = esbocos_diarios(df)
+    armazem.guardar_esbocos('teste-esbocos', esbocos)
+
+    lidos = armazem.abrir_esbocos('teste-esbocos')
+
+    assert lidos is not None
+    np.testing.assert_array_equal(lidos.unicos.dias, esbocos.unicos.dias)
+    for inicio, fim in [(None, None), (date(2024, 2, 1), date(2024, 2, 29))]:
+        assert lidos.unicos.estimar(inicio, fim) == esbocos.unicos.estimar(inicio, fim)
+        assert lidos.idades.percentis(inicio=inicio, fim=fim) == esbocos.idades.percentis(inicio=inicio, fim=fim)
+
+@pytest.mark.parametrize('inicio, fim', [
+    (None, None),
+    (date(2024, 3, 1), date(2024, 3, 31)),
+    (date(2024, 5, 5), date(2024, 5, 5)),
+    (date(2024, 11, 20), None),
+])
+def test_percentis_iguais_ao_quantile(inicio, fim):
+    df = _registros(20_000)
+    dia = df['Data_Hora'].dt.normalize()
+    idades = df['Idade'][(dia >= pd.Timestamp(inicio or date.min)) & (dia <= pd.Timestamp(fim or date.max))].dropna()
+    esperado = tuple(idades.astype(float).quantile(list(PERCENTIS_IDADE)))
+    obtido = idades_diarias(df['Data_Hora'], df['Idade']).percentis(PERCENTIS_IDADE, inicio, fim)
+    assert obtido == pytest.approx(esperado)
+
+def test_percentis_sem_idades_no_periodo_sao_none():
+    df = _registros(1000)
+    idades = idades_diarias(df['Data_Hora'], df['Idade'])
+    assert idades.percentis(PERCENTIS_IDADE, date(2030, 1, 1), date(2030, 12, 31)) == (None, None)
+    assert idades_diarias(df['Data_Hora'], df['Idade'] * pd.NA).percentis(PERCENTIS_IDADE) == (None, None)
+
+def test_combinar_idades_igual_a_uma_passada():
+    df = _registros(50_000)
+    parte = np.random.default_rng(2).random(len(df)) < 0.3
+    a, b = df[parte], df[~parte]
+    combinado = combinar_idades(idades_diarias(a['Data_Hora'], a['Idade']), idades_diarias(b['Data_Hora'], b['Idade']))
+    unico = idades_diarias(df['Data_Hora'], df['Idade'])
+    np.testing.assert_array_equal(combinado.dias, unico.dias)
+    np.testing.assert_array_equal(combinado.contagens, unico.contagens)
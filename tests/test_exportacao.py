@@ -0,0 +1,48 @@
+import gzip
+import io
+
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import exportacao
+from consultas import ConsultasPandas
+from exportacao import FORMATOS, CacheExportacoes, exportar
+from filtros import Filtros, construir_indice
+from pipeline import padronizar_colunas, processar
+
+def _ler(formato, dados):
+    # Registros do arquivo exportado, como frame
+    if formato == 'csv':
+        return pd.read_csv(io.BytesIO(dados))
+    if formato == 'csv.gz':
+        return pd.read_csv(io.BytesIO(gzip.decompress(dados)))
+    if formato == 'csv.zst':
+        return pd.read_csv(io.BytesIO(pa.CompressedInputStream(pa.BufferReader(dados), 'zstd').read()))
+    if formato == 'parquet':
+        return pq.read_table(io.BytesIO(dados)).to_pandas()
+    ws = openpyxl.load_workbook(io.BytesIO(dados), read_only=True)['Registros']
+    cabecalho, *linhas = ws.iter_rows(values_only=True)
+    return pd.DataFrame(linhas, columns=cabecalho)
+
+@pytest.mark.parametrize('cache_em_disco', [True, False])
+@pytest.mark.parametrize('formato', list(FORMATOS))
+def test_exporta_todos_os_formatos_com_e_sem_cache(planilha, tmp_path, monkeypatch, formato, cache_em_disco):
+    monkeypatch.setattr(exportacao, 'CACHE', CacheExportacoes(str(tmp_path) if cache_em_disco else None, 1 << 30))
+    df = processar(padronizar_colunas(planilha(500)), memorizar=False)
+    filtros = Filtros(cidades=('Cuiabá', 'Sinop'))
+    esperado = df[df['Cidade_Limpa'].isin(filtros.cidades)]
+    ag = ConsultasPandas(df).agregados(filtros)
+
+    gerar = exportar(formato, 'v1', df, construir_indice(df), filtros, ag)
+    dados = gerar()
+
+    lido = _ler(formato, dados)
+    assert len(lido) == len(esperado)
+    assert lido['Cidade_Limpa'].astype(str).tolist() == esperado['Cidade_Limpa'].astype(str).tolist()
+    # Com o cache em disco o segundo clique é servido do arquivo gravado
+    assert len(list(tmp_path.iterdir())) == (1 if cache_em_disco else 0)
+    if cache_em_disco:
+        assert gerar() == dados
@@ -0,0 +1,88 @@
+import io
+
+import pandas as pd
+
+import fidelidade
+import parciais
+from fidelidade import IndiceVisitantes, visitas_da_carga
+from pipeline import padronizar_colunas, processar
+
+def _visitas(planilha, linhas=6000):
+    # Um ano de visitas de 1500 telefones (normalizados para E.164 pelo pipeline), parte sem telefone
+    df = processar(padronizar_colunas(planilha(linhas, telefones=1500, sem_telefone=0.05)), memorizar=False)
+    return df[['Data_Hora', 'Telefone']]
+
+def _esperado(df):
+    dias = df.dropna(subset=['Telefone']).groupby('Telefone')['Data_Hora'].agg(lambda d: d.dt.normalize().nunique())
+    return len(dias), int((dias > 1).sum()), int(dias.sum())
+
+def _resumo(indice):
+    r = indice.resumo()
+    return r.visitantes, r.recorrentes, r.visitas
+
+def _registrar(indice, df):
+    return indice.registrar(visitas_da_carga(df['Data_Hora'], df['Telefone']))
+
+def test_trimestres_fora_de_ordem_contam_como_uma_carga(planilha, tmp_path):
+    df = _visitas(planilha)
+    trimestre = df['Data_Hora'].dt.quarter
+    indice = IndiceVisitantes(str(tmp_path))
+    # Q2 preenche o buraco entre Q1 e Q3: os dias dele também são visitas novas
+    for q in (1, 3, 2, 4):
+        _registrar(indice, df[trimestre == q])
+    assert _resumo(indice) == _esperado(df)
+
+def test_cargas_repetidas_e_sobrepostas_nao_somam_de_novo(planilha, tmp_path):
+    df = _visitas(planilha)
+    indice = IndiceVisitantes(str(tmp_path))
+    assert _registrar(indice, df[df['Data_Hora'] < '2024-07-01']) > 0
+    _registrar(indice, df)
+    antes = _resumo(indice)
+    assert _registrar(indice, df) == 0
+    assert _registrar(indice, df[df['Data_Hora'] >= '2024-03-01']) == 0
+    assert _resumo(indice) == antes == _esperado(df)
+
+def test_modo_so_agregados_registra_bloco_a_bloco(planilha, tmp_path):
+    bruta = planilha(2000, telefones=1500, sem_telefone=0.05)
+    df = processar(padronizar_colunas(bruta), memorizar=False)
+    csv = bruta.to_csv(index=False).encode()
+    indice = IndiceVisitantes(str(tmp_path))
+    parcial, erros = parciais.agregar_arquivos([('a.csv', lambda: io.BytesIO(csv))], lambda *a: None, 300, indice.registrar)
+    assert erros == [] and not hasattr(parcial, 'visitas')
+    assert _resumo(indice) == _esperado(df)
+
+def test_historico_por_telefone(planilha, tmp_path):
+    df = _visitas(planilha)
+    indice = IndiceVisitantes(str(tmp_path))
+    for q in (4, 2, 1, 3):
+        _registrar(indice, df[df['Data_Hora'].dt.quarter == q])
+    dias = df.dropna(subset=['Telefone']).assign(Dia=df['Data_Hora'].dt.normalize()).groupby('Telefone')['Dia']
+    esperado = pd.DataFrame({'Primeira_Visita': dias.min(), 'Ultima_Visita': dias.max(), 'Visitas': dias.nunique()})
+    telefones = pd.Series(list(esperado.index) + ['+5511999999999', None])
+
+    historico = indice.historico(telefones)
+
+    pd.testing.assert_frame_equal(historico.iloc[:-2].set_axis(esperado.index), esperado, check_dtype=False, check_names=False)
+    assert historico['Visitas'].iloc[-2:].tolist() == [0, 0] and historico['Primeira_Visita'].iloc[-2:].isna().all()
+    r = indice.resumo()
+    assert (r.primeira_visita, r.ultima_visita) == (esperado['Primeira_Visita'].min().date(), esperado['Ultima_Visita'].max().date())
+
+def test_bloco_regrava_so_os_meses_que_toca_e_a_fusao_nao_muda_o_resumo(planilha, tmp_path, monkeypatch):
+    monkeypatch.setattr(fidelidade, 'DELTAS_MAXIMOS', 2)
+    df = _visitas(planilha)
+    indice = IndiceVisitantes(str(tmp_path))
+    _registrar(indice, df[df['Data_Hora'] < '2024-12-01'])
+    particoes = {p.name: p.stat().st_mtime_ns for p in (tmp_path / 'dias').iterdir()}
+    assert len(particoes) == 11
+
+    _registrar(indice, df[df['Data_Hora'] >= '2024-12-01'])
+    depois = {p.name: p.stat().st_mtime_ns for p in (tmp_path / 'dias').iterdir()}
+    assert set(depois) - set(particoes) == {'2024-12.arrow'}
+    assert all(depois[nome] == mtime for nome, mtime in particoes.items())
+
+    # Um telefone por carga: deltas pequenos até passar de DELTAS_MAXIMOS arquivos
+    for telefone in df['Telefone'].dropna().unique()[:5]:
+        _registrar(indice, df[df['Telefone'] == telefone].assign(Data_Hora=pd.Timestamp('2025-01-15')))
+    assert len(list(tmp_path.glob('telefones.*[0-9].arrow'))) <= fidelidade.DELTAS_MAXIMOS
+    visitantes, recorrentes, visitas = _esperado(df)
+    assert _resumo(indice) == (visitantes, recorrentes, visitas + 5)
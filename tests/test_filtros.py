@@ -0,0 +1,62 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from filtros import Filtros, construir_indice, selecionar
+
+def _frame(linhas=5000, semente=0):
+    # Ordenado por Data_Hora, com horários exatamente à meia-noite para testar as bordas dos dias
+    rng = np.random.default_rng(semente)
+    segundos = rng.integers(0, 90 * 24 * 3600, linhas)
+    segundos[:200] = rng.integers(0, 90, 200) * 24 * 3600
+    return pd.DataFrame({
+        'Data_Hora': pd.Timestamp('2024-03-01') + pd.to_timedelta(np.sort(segundos), unit='s'),
+        'Cidade_Limpa': rng.choice(['Cuiabá', 'Sinop', 'Lima', 'Não Informado'], linhas),
+        'Tipo_Grupo': rng.choice(['Família/Grupo', 'Individual/Adultos'], linhas),
+        'Estrangeiro': rng.random(linhas) < 0.1,
+    })
+
+def _mascara(df, filtros):
+    dia = df['Data_Hora'].dt.normalize()
+    mascara = pd.Series(True, index=df.index)
+    if filtros.inicio is not None:
+        mascara &= dia >= pd.Timestamp(filtros.inicio)
+    if filtros.fim is not None:
+        mascara &= dia <= pd.Timestamp(filtros.fim)
+    if filtros.cidades:
+        mascara &= df['Cidade_Limpa'].isin(filtros.cidades)
+    if filtros.grupos:
+        mascara &= df['Tipo_Grupo'].isin(filtros.grupos)
+    if filtros.apenas_estrangeiros:
+        mascara &= df['Estrangeiro']
+    return np.flatnonzero(mascara.to_numpy())
+
+@pytest.mark.parametrize('filtros', [
+    Filtros(),
+    Filtros(inicio=date(2024, 3, 10), fim=date(2024, 3, 10)),
+    Filtros(inicio=date(2024, 3, 10), fim=date(2024, 4, 2)),
+    Filtros(inicio=date(2024, 4, 15)),
+    Filtros(fim=date(2024, 3, 20)),
+    Filtros(inicio=date(2024, 1, 1), fim=date(2024, 12, 31)),
+    Filtros(cidades=('Cuiabá', 'Lima')),
+    Filtros(cidades=('Inexistente',)),
+    Filtros(cidades=('Cuiabá', 'Inexistente')),
+    Filtros(cidades=tuple(f'Cidade {i}' for i in range(12)) + ('Sinop',)),
+    Filtros(grupos=('Família/Grupo',)),
+    Filtros(grupos=('Outro',)),
+    Filtros(apenas_estrangeiros=True),
+    Filtros(inicio=date(2024, 3, 5), fim=date(2024, 5, 1), cidades=('Sinop',), grupos=('Individual/Adultos',), apenas_estrangeiros=True),
+    Filtros(inicio=date(2024, 4, 2), fim=date(2024, 4, 1)),
+    Filtros(inicio=date(2025, 1, 1)),
+])
+def test_selecionar_igual_a_mascara_booleana(filtros):
+    df = _frame()
+    selecao = selecionar(construir_indice(df), filtros)
+    posicoes = np.arange(len(df))[selecao] if isinstance(selecao, slice) else selecao
+    np.testing.assert_array_equal(posicoes, _mascara(df, filtros))
+
+def test_indice_exige_frame_ordenado():
+    with pytest.raises(ValueError):
+        construir_indice(_frame().iloc[::-1])
@@ -0,0 +1,66 @@
+import io
+import itertools
+
+import numpy as np
+import pandas as pd
+
+import armazem
+import config
+from agregacao import agregar
+from consultas import ConsultasPandas
+from cubo import DIMENSOES_GRUPOS, construir_cubo
+from filtros import Filtros
+from ingestao import abrir_agregados, agregar_em_blocos, processar_arquivos, versao_arquivos
+from pipeline import OUTRAS_ORIGENS
+
+def _xlsx(df):
+    saida = io.BytesIO()
+    df.to_excel(saida, index=False)
+    return saida.getvalue()
+
+def test_planilha_com_whatsapp_numerico_e_texto_vai_para_o_armazem():
+    # O Excel guarda números digitados sem máscara como células numéricas: a coluna
+    # chega ao pandas com int e str misturados
+    planilha = pd.DataFrame({
+        'Carimbo': pd.date_range('2024-03-01 09:00', periods=6, freq='h'),
+        'Nome': ['Ana', 'Bia', 'Caio', 12345, 'Edu', None],
+        'Cidade': ['Cuiabá', 'Sinop', 'cba', 'Lima', None, 'Sinop'],
+        'Whats': [65999990001, '(65) 99999-0002', 65999990003, '99999-0004', None, 5565999990006],
+        'Idade': [35, '12 anos', None, 70, 22, 'abc'],
+        'Criancas': [0, 'nenhum', 2, None, 1, 3],
+        'Obs': [None, 'ok', 7, None, None, 'x'],
+    })
+    arquivos = [('visitas.xlsx', _xlsx(planilha))]
+    versao = versao_arquivos(arquivos)
+
+    df, erros = processar_arquivos(versao, arquivos, lambda etapa, fracao: None)
+
+    assert erros == []
+    assert len(df) == len(planilha)
+    guardado = armazem.abrir_dataset(versao)
+    assert guardado is not None
+    assert guardado['Telefone'].tolist() == df['Telefone'].tolist()
+    assert guardado['Whatsapp'].iloc[0] == '65999990001'
+
+def test_cubo_cortado_do_modo_so_agregados_nao_serve_ao_modo_completo(planilha, monkeypatch):
+    # Mais origens que a capacidade: os cubos do modo só agregados somam as raras em OUTRAS_ORIGENS
+    monkeypatch.setattr(config, 'CAPACIDADE_ORIGENS', 20)
+    rng = np.random.default_rng(3)
+    origens = [f'{a}{b}{c}{b}{a}x' for a, b, c in itertools.islice(itertools.product('bdfgjklmnpqrtvz', 'aeiou', 'bdfgjklmnpqrtvz'), 60)]
+    linhas, pesos = 2000, np.linspace(2, 1, len(origens))
+    conteudo = planilha(linhas, semente=3, Cidade=rng.choice(origens, linhas, p=pesos / pesos.sum())).to_csv(index=False).encode()
+    arquivos = [('origens.csv', conteudo)]
+    versao = versao_arquivos(arquivos)
+
+    agregados, erros = agregar_em_blocos(versao, [('origens.csv', lambda: io.BytesIO(conteudo))], lambda *a: None, 500)
+    assert erros == [] and agregados.cubo.erro_origens > 0
+    assert OUTRAS_ORIGENS in agregados.cidades
+
+    df, _ = processar_arquivos(versao, arquivos, lambda *a: None)
+    completo = ConsultasPandas(df, versao_dados=versao)
+    ag = completo.agregados(Filtros())
+    assert ag.erro_origens == 0 and OUTRAS_ORIGENS not in completo.cidades
+    esperado = agregar(construir_cubo(df).celulas, construir_cubo(df, DIMENSOES_GRUPOS).celulas)
+    pd.testing.assert_series_equal(ag.top_cidades, esperado.top_cidades)
+    # E o modo só agregados continua lendo os seus cubos
+    assert abrir_agregados(versao).cubo.erro_origens == agregados.cubo.erro_origens
@@ -0,0 +1,26 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+import parciais
+from cubo import DIMENSOES_GRUPOS, construir_cubo
+from ingestao import ler_arquivo
+from pipeline import LIMITE_CRIANCAS, process_criancas, processar
+
+def test_consolidar_igual_ao_cubo_do_frame_inteiro(planilha):
+    bruta = planilha(ordenada=True)
+    conteudo = bruta.to_csv(index=False).encode()
+    linhas = 250
+    # A média que substitui as linhas acima do limite depende de todos os blocos
+    acima = bruta['Criancas'].map(process_criancas) > LIMITE_CRIANCAS
+    assert len(np.unique(np.flatnonzero(acima) // linhas)) > 5
+    df = processar(ler_arquivo('visitas.csv', conteudo), memorizar=False)
+
+    parcial, erros = parciais.agregar_arquivos([('visitas.csv', lambda: io.BytesIO(conteudo))], lambda *a: None, linhas)
+    assert erros == []
+    cubo, cubo_grupos = parciais.consolidar(parcial)
+
+    pd.testing.assert_frame_equal(cubo.celulas, construir_cubo(df).celulas)
+    pd.testing.assert_frame_equal(cubo_grupos.celulas, construir_cubo(df, DIMENSOES_GRUPOS).celulas)
+    assert cubo.erro_origens == 0
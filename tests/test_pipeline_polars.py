@@ -0,0 +1,27 @@
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('polars')
+
+import pipeline
+import pipeline_polars
+from ingestao import ler_arquivo
+
+def _planilha(planilha, formato_data):
+    # CSV do formulário lido como no upload. No fim (o formato sai da primeira linha):
+    # texto que nenhum parser aceita, vazio e um valor com espaço e sem zeros à
+    # esquerda, que o Polars aceitaria e o pandas não
+    df = planilha(formato_data=formato_data)
+    df.loc[len(df) - 3:, 'Carimbo'] = ['lixo', '', ' 1/2/2024 7:05']
+    return ler_arquivo('visitas.csv', df.to_csv(index=False).encode())
+
+@pytest.mark.parametrize('formato_data', ['%m/%d/%Y %H:%M', '%d/%m/%Y %H:%M', '%Y-%m-%d %H:%M:%S'])
+def test_processar_igual_ao_pipeline_pandas(planilha, formato_data):
+    df_raw = _planilha(planilha, formato_data)
+    esperado = pipeline.processar(df_raw, memorizar=False)
+    pd.testing.assert_frame_equal(pipeline_polars.processar(df_raw), esperado)
+
+def test_datas_americanas_nao_sao_descartadas(planilha):
+    df_raw = _planilha(planilha, '%m/%d/%Y %H:%M')
+    assert len(pipeline_polars.processar(df_raw)) == len(df_raw) - 3
@@ -0,0 +1,43 @@
+import gc
+
+import numpy as np
+import pandas as pd
+
+from armazem import bytes_em_heap
+from consultas import ConsultasPandas
+from filtros import construir_indice
+from registro import RegistroDatasets
+
+def _frame(linhas=20_000, semente=0):
+    rng = np.random.default_rng(semente)
+    return pd.DataFrame({
+        'Data_Hora': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 365 * 24 * 3600, linhas)), unit='s'),
+        'Cidade_Limpa': rng.choice(['Cuiabá', 'Sinop', 'Lima'], linhas),
+        'Tipo_Grupo': rng.choice(['Família/Grupo', 'Individual/Adultos'], linhas),
+        'Estrangeiro': rng.random(linhas) < 0.1,
+    })
+
+def test_derivados_contam_no_teto_e_saem_com_o_dataset():
+    df = _frame()
+    registro = RegistroDatasets(limite_bytes=1 << 40)
+    referencia = registro.registrar('a', df)
+    indice = referencia.derivado('indice', construir_indice)
+    assert referencia.derivado('indice', construir_indice) is indice
+    # Data_Hora e Estrangeiro são views do frame; códigos e bitmaps são do índice
+    assert 0 < indice.bytes_em_heap() < bytes_em_heap(df)
+    assert registro._bytes == bytes_em_heap(df) + indice.bytes_em_heap()
+
+    del referencia, indice
+    gc.collect()
+    registro.limite_bytes = 0
+    em_uso = registro.registrar('b', _frame(10, semente=1))
+    assert list(registro._datasets) == ['b']
+    assert registro._bytes == bytes_em_heap(em_uso.df)
+
+def test_consultas_medem_cubos_e_esbocos():
+    df = _frame().assign(
+        Dia_Semana=0, Hora=12, Faixa_Etaria='Adulto', Total_Visitantes_Linha=1, Qtd_Criancas=0,
+        Telefone='+5565999990000', Idade=30.0,
+    )
+    consultas = ConsultasPandas(df)
+    assert consultas.bytes_em_heap() >= bytes_em_heap(consultas.cubo.celulas)
@@ -0,0 +1,42 @@
+import threading
+import time
+
+from tarefas import CANCELADA, CONCLUIDA, ERRO, submeter
+
+def test_cancelar_tarefa_em_execucao_interrompe_no_proximo_informar():
+    iniciou, saiu = threading.Event(), threading.Event()
+    etapas = []
+
+    def trabalhar(tarefa):
+        iniciou.set()
+        try:
+            for i in range(10_000):
+                tarefa.informar(f"etapa {i}", i / 10_000)
+                etapas.append(i)
+                time.sleep(0.001)
+            return 'terminou'
+        finally:
+            saiu.set()
+
+    tarefa = submeter('a', trabalhar)
+    assert iniciou.wait(5)
+    tarefa.cancelar()
+    assert saiu.wait(5)
+    tarefa._futuro.result(timeout=5)
+    assert tarefa.estado == CANCELADA and tarefa.finalizada
+    assert tarefa.resultado is None and len(etapas) < 10_000
+
+def test_erro_na_tarefa_fica_registrado():
+    def falhar(tarefa, valor):
+        tarefa.informar("lendo", 0.5)
+        raise ValueError(f"planilha inválida: {valor}")
+
+    tarefa = submeter('b', falhar, 7)
+    tarefa._futuro.result(timeout=5)
+    assert tarefa.estado == ERRO and tarefa.finalizada
+    assert isinstance(tarefa.erro, ValueError) and str(tarefa.erro) == "planilha inválida: 7"
+
+def test_tarefa_concluida_guarda_o_resultado():
+    tarefa = submeter('c', lambda tarefa, a, b: a + b, 2, 3)
+    tarefa._futuro.result(timeout=5)
+    assert (tarefa.estado, tarefa.resultado, tarefa.fracao) == (CONCLUIDA, 5, 1.0)